@@ -9,11 +9,9 @@ class Cart:
         Инициализация корзины
         """
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            # сохранить пустую корзину в сессии
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
+        # Пустая корзина не записывается в сессию до первого изменения (save),
+        # чтобы просмотр страниц не создавал сессию каждому анонимному посетителю
+        self.cart = self.session.get(settings.CART_SESSION_ID) or {}
 
     def add(self, item, item_type='service', quantity=1, override_quantity=False):
         """
@@ -1,4 +1,8 @@
+from main.lazy_context import lazy_context
+
 from .cart import Cart
 
+
 def cart(request):
-    return {'cart': Cart(request)}
+    """Корзина из сессии; сессия читается только при обращении шаблона к cart"""
+    return lazy_context(request, cart=lambda: Cart(request))
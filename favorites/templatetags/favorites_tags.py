@@ -15,8 +15,15 @@ def is_favorite(obj, user):
     if not user or not user.is_authenticated:
         return False
     from favorites.models import Favorite
+    from main.request_cache import memoize
     ct = ContentType.objects.get_for_model(obj)
-    return Favorite.objects.filter(user=user, content_type=ct, object_id=obj.pk).exists()
+    # Все избранное пользователя загружается одним запросом на страницу
+    favorites = memoize(
+        ("favorites", user.pk),
+        lambda: set(Favorite.objects.filter(user=user).values_list("content_type_id", "object_id")),
+        depends_on=[Favorite],
+    )
+    return (ct.pk, obj.pk) in favorites
 
 
 @register.filter
@@ -1,6 +1,12 @@
 from django.shortcuts import render, get_object_or_404
+
+from main.conditional import conditional_view
+from main.slug_registry import known_slug_required
+from main.view_counters import views_counted
+
 from .models import Category, Article
 
+@conditional_view(lambda request: Article.objects.filter(is_published=True))
 def index(request):
     categories = Category.objects.all()
     recent_articles = Article.objects.filter(is_published=True).order_by('-created_at')[:5]
@@ -28,12 +34,15 @@ def category_detail(request, slug):
     }
     return render(request, 'knowledge_base/category.html', context)
 
+@known_slug_required(Article)
+@conditional_view(lambda request, slug: Article.objects.filter(slug=slug, is_published=True))
 def article_detail(request, slug):
     article = get_object_or_404(Article, slug=slug, is_published=True)
     
     # Увеличиваем просмотры
-    article.views += 1
-    article.save(update_fields=['views'])
+    if views_counted():
+        article.views += 1
+        article.save(update_fields=['views'])
     
     context = {
         'article': article,
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.contrib.admin.models import LogEntry
-from .models import SiteSettings, Page, AnalyticsScript
+from .models import SiteSettings, Page, AnalyticsScript, MediaBlob
+from .thumbnails import thumbnail_url
 
 
 # ... (LogEntryAdmin)
@@ -157,7 +158,7 @@ class SiteSettingsAdmin(admin.ModelAdmin):
         if image:
             return format_html(
                 '<img src="{}" style="width: 30px; height: 30px; object-fit: contain;" />', 
-                image.url
+                thumbnail_url(image, 60)
             )
         return format_html('<span style="color: #999;">нет иконки</span>')
 
@@ -230,7 +231,7 @@ class PageAdmin(admin.ModelAdmin):
     def logo_preview(self, obj):
         if obj.logo:
             return format_html(
-                '<img src="{}" style="width: 50px; height: auto;" />', obj.logo.url
+                '<img src="{}" style="width: 50px; height: auto;" />', thumbnail_url(obj.logo, 100)
             )
         return "Нет логотипа"
 
@@ -239,4 +240,19 @@ class PageAdmin(admin.ModelAdmin):
     class Media:
         css = {
             "all": ("main/css/pages.css",),
-        }
\ No newline at end of file
+        }
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    """Файлы хранилища по хешу (main/media_storage.py) — только просмотр."""
+    list_display = ["name", "size", "refcount", "created_at"]
+    search_fields = ["digest", "name"]
+    readonly_fields = ["digest", "name", "size", "refcount", "created_at"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        # Файл удаляется вместе с последней ссылкой, а не вручную
+        return False
@@ -8,3 +8,11 @@ class MainConfig(AppConfig):
 
     def ready(self):
         import main.signals
+
+        from .cache_tags import install_queryset_tracking
+        from .lazy_context import install_template_tracking, tracking_enabled
+
+        install_queryset_tracking()
+
+        if tracking_enabled():
+            install_template_tracking()
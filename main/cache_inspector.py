@@ -0,0 +1,138 @@
+"""
+Модуль cache_inspector.py приложения main
+
+Данные для страницы «Кэш» в админке (/admin/dashboard/cache/).
+
+Счетчики ведет бэкенд mysite.cache_backends.TwoTierCache по группам ключей
+(key_group: "page", "og_image", "template.cache.homepage_news", "latest_news"...):
+попадания, промахи, записи и их размер, удаления, время вычисления
+значений (single_flight и {% cache_tagged %}). Счетчики каждого воркера
+периодически сохраняются в L2, поэтому отчет собирается по всем процессам.
+Объем памяти и крупнейшие ключи — по текущему содержимому L2.
+
+Очистка: удаление всех ключей группы (из L2 и L1 всех воркеров) или смена
+версии тега модели (все значения, зависящие от нее, устаревают).
+"""
+
+import datetime
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .cache_tags import bump_tags, get_tag_versions, tracked_tags
+from .single_flight import get_stats as get_single_flight_stats
+
+# Сколько крупнейших ключей показывать
+TOP_KEYS = 25
+
+GROUP_FIELDS = (
+    "hits", "misses", "sets", "set_bytes", "deletes", "computes", "compute_ms",
+    "original_bytes", "stored_bytes",
+)
+
+
+def is_available():
+    """Поддерживает ли текущий бэкенд кэша инспекцию (TwoTierCache)."""
+    return hasattr(cache, "collect_stats") and hasattr(cache, "entries")
+
+
+def _tag_rows():
+    rows = []
+    for tag, version in get_tag_versions(tracked_tags()):
+        changed = None
+        if version:
+            changed = datetime.datetime.fromtimestamp(version / 1e9, tz=datetime.timezone.utc)
+        rows.append({"tag": tag, "changed": changed})
+    return rows
+
+
+def build_report():
+    """
+    Собирает отчет по кэшу.
+
+    Returns:
+        dict: available, processes, levels, groups (по убыванию объема),
+        top_keys, total_entries, total_bytes, tags, single_flight
+    """
+    report = {"available": is_available(), "tags": _tag_rows(), "single_flight": get_single_flight_stats()}
+    if not report["available"]:
+        return report
+
+    processes = cache.collect_stats()
+    levels = {}
+    groups = {}
+    for snapshot in processes:
+        for name, value in snapshot["levels"].items():
+            levels[name] = levels.get(name, 0) + value
+        for group, counters in snapshot["groups"].items():
+            row = groups.setdefault(group, dict.fromkeys(GROUP_FIELDS, 0))
+            for field in GROUP_FIELDS:
+                row[field] += counters.get(field, 0)
+
+    try:
+        entries = cache.entries()
+    except NotImplementedError:
+        entries = []
+    for key, group, size, expires in entries:
+        row = groups.setdefault(group, dict.fromkeys(GROUP_FIELDS, 0))
+        row["entries"] = row.get("entries", 0) + 1
+        row["bytes"] = row.get("bytes", 0) + size
+
+    for name, row in groups.items():
+        row["name"] = name
+        row.setdefault("entries", 0)
+        row.setdefault("bytes", 0)
+        lookups = row["hits"] + row["misses"]
+        row["hit_percent"] = 100 * row["hits"] / lookups if lookups else None
+        row["avg_set_bytes"] = row["set_bytes"] // row["sets"] if row["sets"] else 0
+        row["avg_compute_ms"] = row["compute_ms"] / row["computes"] if row["computes"] else None
+        # Экономия компактной сериализации (main/cache_serialization.py)
+        row["saved_bytes"] = row["original_bytes"] - row["stored_bytes"]
+        # Записывается, но не читается — кандидат на удаление из кэша
+        row["never_hit"] = row["sets"] > 0 and row["hits"] == 0
+
+    top_keys = sorted(entries, key=lambda entry: entry[2], reverse=True)[:TOP_KEYS]
+    report.update(
+        processes=[
+            {
+                "pid": snapshot["pid"],
+                "updated": datetime.datetime.fromtimestamp(snapshot["updated"], tz=datetime.timezone.utc),
+                "levels": snapshot["levels"],
+            }
+            for snapshot in processes
+        ],
+        levels=levels,
+        groups=sorted(groups.values(), key=lambda row: (-row["bytes"], row["name"])),
+        top_keys=[
+            {
+                "key": key,
+                "group": group,
+                "size": size,
+                "expires": (
+                    datetime.datetime.fromtimestamp(expires, tz=datetime.timezone.utc)
+                    if expires else None
+                ),
+            }
+            for key, group, size, expires in top_keys
+        ],
+        total_entries=len(entries),
+        total_bytes=sum(entry[2] for entry in entries),
+        generated=timezone.now(),
+    )
+    return report
+
+
+def purge_group(group):
+    """Удаляет все ключи группы; возвращает их число."""
+    return cache.delete_group(group)
+
+
+def purge_tag(tag):
+    """Делает устаревшими все значения, зависящие от тега модели."""
+    if tag not in tracked_tags():
+        raise ValueError("Неизвестный тег кэша: %s" % tag)
+    bump_tags(tag)
+
+
+def reset_stats():
+    cache.reset_stats()
@@ -0,0 +1,151 @@
+"""
+Модуль cache_serialization.py приложения main
+
+Компактное хранение списков объектов моделей в кэше.
+
+Раньше «последние новости/работы/отзывы» кэшировались списками полных
+объектов: pickle экземпляра модели несет все поля (у новости — HTML
+content), состояние _state и ссылку на класс. Такие значения велики,
+медленно распаковываются и ломаются, когда между деплоями меняется модель.
+
+Projection описывает, какие поля нужны шаблонам. В кэш попадает только
+плотная таблица значений (кортежи простых типов) в формате pack():
+pickle, а при размере больше CACHE_COMPRESS_THRESHOLD — zlib, если он
+действительно уменьшает объем. При чтении строки превращаются обратно в
+экземпляры модели (Model.from_db): методы (get_absolute_url, image.url)
+работают, а обращение к непроецированному полю не ошибается, а
+догружает его из БД как отложенное поле (.only()).
+
+Ключ кэша включает подпись проекции — после изменения набора полей
+старые значения просто не читаются.
+
+Экономия (размер pickle полных объектов против сохраненного) учитывается
+по группам ключей в TwoTierCache и видна в инспекторе кэша.
+
+Использование:
+    LATEST = Projection(News, ["title", "slug", "news_date"],
+                        related={"category": Projection(NewsCategory, ["name", "slug"])},
+                        annotations=["events_count"])
+    get_or_set_projected("latest_news", build, LATEST, depends_on=[News])
+"""
+
+import hashlib
+import pickle
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_tags import get_or_set_tagged
+
+# Первый байт упакованного значения
+FORMAT_PICKLE = b"p"
+FORMAT_ZLIB = b"z"
+
+
+def pack(value, threshold=None):
+    """Упаковывает значение простых типов в bytes (со сжатием больших значений)."""
+    if threshold is None:
+        threshold = getattr(settings, "CACHE_COMPRESS_THRESHOLD", 1024)
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    if len(data) > threshold:
+        compressed = zlib.compress(data)
+        if len(compressed) < len(data):
+            return FORMAT_ZLIB + compressed
+    return FORMAT_PICKLE + data
+
+
+def unpack(data):
+    fmt, payload = data[:1], data[1:]
+    if fmt == FORMAT_ZLIB:
+        payload = zlib.decompress(payload)
+    elif fmt != FORMAT_PICKLE:
+        raise ValueError("Неизвестный формат значения кэша: %r" % fmt)
+    return pickle.loads(payload)
+
+
+class Projection:
+    """
+    Набор полей модели для кэша.
+
+    Args:
+        model: класс модели
+        fields (list): имена полей (первичный ключ добавляется сам;
+            для ForeignKey хранится id)
+        related (dict | None): поле ForeignKey -> Projection связанной модели
+            (как select_related)
+        annotations (list): имена аннотаций queryset (events_count...)
+    """
+
+    def __init__(self, model, fields, related=None, annotations=()):
+        self.model = model
+        self.related = related or {}
+        pk_name = model._meta.pk.attname
+        names = [pk_name] + [name for name in fields if name != pk_name]
+        for name in self.related:
+            attname = model._meta.get_field(name).attname
+            if attname not in names:
+                names.append(attname)
+        attnames = {model._meta.get_field(name).attname for name in names}
+        # Порядок полей модели — его ожидает Model.from_db()
+        self.attnames = [f.attname for f in model._meta.concrete_fields if f.attname in attnames]
+        self.annotations = list(annotations)
+
+    @property
+    def signature(self):
+        """Короткая подпись набора полей (часть ключа кэша)."""
+        parts = [self.model._meta.label_lower, *self.attnames, "|", *self.annotations]
+        for name, projection in sorted(self.related.items()):
+            parts += [name, projection.signature]
+        return hashlib.md5(",".join(parts).encode()).hexdigest()[:8]
+
+    def dump(self, obj):
+        """Объект -> кортеж простых значений."""
+        if obj is None:
+            return None
+        values = [getattr(obj, attname) for attname in self.attnames]
+        # Файловые поля хранятся именем файла
+        values = [getattr(value, "name", value) for value in values]
+        values += [getattr(obj, name) for name in self.annotations]
+        values += [projection.dump(getattr(obj, name)) for name, projection in self.related.items()]
+        return tuple(values)
+
+    def load(self, row):
+        """Кортеж -> экземпляр модели с отложенными непроецированными полями."""
+        if row is None:
+            return None
+        count = len(self.attnames)
+        obj = self.model.from_db(None, self.attnames, row[:count])
+        for name, value in zip(self.annotations, row[count:count + len(self.annotations)]):
+            setattr(obj, name, value)
+        related_rows = row[count + len(self.annotations):]
+        for (name, projection), related_row in zip(self.related.items(), related_rows):
+            self.model._meta.get_field(name).set_cached_value(obj, projection.load(related_row))
+        return obj
+
+
+def get_or_set_projected(key, build, projection, depends_on, timeout=None, stale_ttl=0):
+    """
+    Как get_or_set_tagged для списка объектов: в кэше — упакованная проекция.
+
+    Args:
+        build (callable): возвращает список объектов модели
+        projection (Projection): какие поля хранить
+
+    Returns:
+        list: экземпляры модели
+    """
+
+    def compute():
+        objects = list(build())
+        packed = pack([projection.dump(obj) for obj in objects])
+        # Экономия относительно pickle полных объектов — для инспектора кэша
+        record = getattr(cache, "record_serialization", None)
+        if record is not None:
+            record(key, len(pickle.dumps(objects, pickle.HIGHEST_PROTOCOL)), len(packed))
+        return packed
+
+    packed = get_or_set_tagged(
+        "%s:%s" % (key, projection.signature), compute, depends_on, timeout=timeout, stale_ttl=stale_ttl
+    )
+    return [projection.load(row) for row in unpack(packed)]
@@ -0,0 +1,234 @@
+"""
+Модуль cache_tags.py приложения main
+
+Инвалидация кэша по тегам зависимостей.
+
+Кэшированное значение или фрагмент шаблона объявляет, от каких моделей
+оно зависит (тег — метка модели, например "news.news"). У каждого тега
+есть версия в кэше; вместе со значением сохраняются версии его тегов на
+момент вычисления. Сохранение или удаление объекта только меняет версию
+тега своей модели (одна запись в кэш), а значения с устаревшими версиями
+считаются промахом при следующем чтении. Список ключей для удаления
+вручную больше не нужен — ни «штормов» удалений, ни забытых ключей.
+
+Версии меняются автоматически сигналами post_save, post_delete и
+m2m_changed для моделей приложений из settings.CACHE_TAG_APPS
+(см. main/signals.py). Массовые QuerySet.update()/bulk_create() сигналов
+не отправляют — после них нужно вызвать bump_tags() вручную.
+
+Использование:
+    get_or_set_tagged("latest_news", build, depends_on=[News, NewsCategory])
+
+    {% load tagged_cache %}
+    {% cache_tagged 1800 homepage_news depends_on "news.News" "news.NewsCategory" %}
+        ...
+    {% endcache_tagged %}
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Manager, Model, QuerySet
+
+# Префикс ключей с версиями тегов
+TAG_VERSION_PREFIX = "cache_tag:"
+
+# Теги, прочитанные при построении текущего ответа (см. record_dependencies)
+_recorded_tags = ContextVar("recorded_cache_tags", default=None)
+
+
+@contextmanager
+def record_dependencies():
+    """
+    Собирает теги всего, что было прочитано внутри блока: значений из кэша
+    с тегами, объектов моделей, созданных из БД (сигнал post_init), и моделей
+    выполненных QuerySet (в том числе пустых, см. install_queryset_tracking).
+    Используется кэшем страниц, чтобы страница зависела от показанных на ней данных.
+
+    Пример:
+        with record_dependencies() as tags:
+            response = render(...)
+    """
+    tags = set()
+    token = _recorded_tags.set(tags)
+    try:
+        yield tags
+    finally:
+        _recorded_tags.reset(token)
+
+
+def recording_dependencies():
+    """Идет ли сейчас запись зависимостей (record_dependencies)."""
+    return _recorded_tags.get() is not None
+
+
+def note_dependencies(tags):
+    """Добавляет теги в текущую запись record_dependencies() (если она идет)."""
+    recorded = _recorded_tags.get()
+    if recorded is not None:
+        recorded.update(tags)
+
+
+def _model_tag(model):
+    return model._meta.label_lower
+
+
+def _select_related_tags(model, related):
+    """Теги моделей из select_related (словарь вида {"category": {}})."""
+    tags = set()
+    for name, nested in related.items():
+        field = model._meta.get_field(name)
+        tags.add(_model_tag(field.related_model))
+        if nested:
+            tags |= _select_related_tags(field.related_model, nested)
+    return tags
+
+
+def tags_for(*dependencies):
+    """
+    Приводит зависимости к множеству тегов.
+
+    Args:
+        *dependencies: модель, объект модели, QuerySet/Manager
+            (учитываются и модели из select_related) или строка "app.Model"
+
+    Returns:
+        frozenset: теги вида "app_label.model_name"
+    """
+    tags = set()
+    for dependency in dependencies:
+        if isinstance(dependency, str):
+            tags.add(_model_tag(apps.get_model(dependency)))
+        elif isinstance(dependency, (QuerySet, Manager)):
+            queryset = dependency.all() if isinstance(dependency, Manager) else dependency
+            tags.add(_model_tag(queryset.model))
+            if isinstance(queryset.query.select_related, dict):
+                tags |= _select_related_tags(queryset.model, queryset.query.select_related)
+        elif isinstance(dependency, Model) or (
+            isinstance(dependency, type) and issubclass(dependency, Model)
+        ):
+            tags.add(_model_tag(dependency))
+        else:
+            raise TypeError("Неизвестная зависимость кэша: %r" % (dependency,))
+    return frozenset(tags)
+
+
+def get_tag_versions(tags):
+    """
+    Возвращает текущие версии тегов (одно обращение к кэшу).
+    Отсутствующие версии создаются.
+
+    Returns:
+        tuple: пары (тег, версия), отсортированные по тегу
+    """
+    tags = sorted(tags)
+    note_dependencies(tags)
+    keys = [TAG_VERSION_PREFIX + tag for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return tuple((tag, versions[key]) for tag, key in zip(tags, keys))
+
+
+def bump_tags(*tags):
+    """Меняет версии тегов: все значения, зависящие от них, устаревают."""
+    version = time.time_ns()
+    cache.set_many({TAG_VERSION_PREFIX + tag: version for tag in tags}, None)
+
+
+def get_tagged(key, depends_on=None, default=None):
+    """
+    Читает значение, сохраненное set_tagged(), если версии его тегов не менялись.
+
+    Если depends_on передан, значение и версии читаются одним get_many;
+    если None — теги берутся из сохраненного значения (два обращения к кэшу).
+    """
+    if depends_on is None:
+        entry = cache.get(key)
+        if not isinstance(entry, tuple) or len(entry) != 2:
+            return default
+        tags = [tag for tag, _ in entry[0]]
+        tag_keys = [TAG_VERSION_PREFIX + tag for tag in tags]
+        found = cache.get_many(tag_keys)
+    else:
+        tags = sorted(tags_for(*depends_on))
+        tag_keys = [TAG_VERSION_PREFIX + tag for tag in tags]
+        found = cache.get_many([key, *tag_keys])
+        entry = found.get(key)
+        if not isinstance(entry, tuple) or len(entry) != 2:
+            return default
+    note_dependencies(tags)
+    stamp, value = entry
+    current = tuple((tag, found.get(tag_key)) for tag, tag_key in zip(tags, tag_keys))
+    return value if stamp == current else default
+
+
+def set_tagged(key, value, depends_on, timeout=None, versions=None):
+    """
+    Сохраняет значение вместе с версиями тегов.
+
+    Args:
+        versions: версии, прочитанные до вычисления значения; если объект
+            изменится во время вычисления, значение сразу окажется устаревшим
+    """
+    if versions is None:
+        versions = get_tag_versions(tags_for(*depends_on))
+    cache.set(key, (versions, value), timeout)
+
+
+def get_or_set_tagged(key, default, depends_on, timeout=None, stale_ttl=0):
+    """
+    Возвращает значение из кэша или вычисляет default() и сохраняет его.
+    Одновременные промахи вычисляются один раз (main/single_flight.py).
+
+    Args:
+        key (str): ключ кэша
+        default (callable): функция вычисления значения
+        depends_on (iterable): модели, объекты, querysets или строки "app.Model"
+        timeout (int | None): срок жизни в секундах (None — до инвалидации)
+        stale_ttl (int): сколько секунд после timeout отдавать прежнее
+            значение, пока оно обновляется в фоне
+    """
+    from .single_flight import get_or_compute
+
+    return get_or_compute(key, default, timeout, depends_on=depends_on, stale_ttl=stale_ttl)
+
+
+def is_tracked_model(model):
+    """Меняются ли версии тега модели автоматически (приложение в CACHE_TAG_APPS)."""
+    return model._meta.app_label in getattr(settings, "CACHE_TAG_APPS", ())
+
+
+def tracked_tags():
+    """Теги всех моделей, версии которых меняются автоматически."""
+    from django.apps import apps
+
+    return sorted(m._meta.label_lower for m in apps.get_models() if is_tracked_model(m))
+
+
+def install_queryset_tracking():
+    """
+    Запоминает модель каждого выполненного QuerySet, пока идет запись
+    зависимостей. Сигнал post_init срабатывает только для загруженных
+    объектов: пустой список (и values()/values_list()) иначе не зависел бы
+    от своей модели, и первый добавленный объект не сбрасывал бы страницу.
+
+    Подключается из MainConfig.ready().
+    """
+    if getattr(QuerySet._fetch_all, "_cache_tags", False):
+        return
+    original_fetch_all = QuerySet._fetch_all
+
+    def _fetch_all(self):
+        if self._result_cache is None and recording_dependencies() and is_tracked_model(self.model):
+            note_dependencies(tags_for(self))
+        original_fetch_all(self)
+
+    _fetch_all._cache_tags = True
+    QuerySet._fetch_all = _fetch_all
@@ -0,0 +1,198 @@
+"""
+Модуль cache_warmup.py приложения main
+
+Прогрев кэшей после деплоя или перезапуска.
+
+Первые посетители после деплоя платят за холодные шаблоны, фрагменты
+{% cache_tagged %}, latest_news, OG-изображения и пустой кэш страниц.
+warm_up() заранее обходит все URL из карт сайта (main/sitemaps.py ->
+SITEMAPS: страницы, новости, портфолио, услуги, база знаний и их разделы)
+тестовым клиентом от имени анонимного посетителя — так же, как
+статический экспорт, — и заполняет общие кэши (L2).
+
+Порядок — по приоритету: главная, списки разделов, категории и страницы,
+затем детальные страницы. Следующая ступень начинается после завершения
+предыдущей, поэтому общие фрагменты (шапка, последние новости) строятся
+один раз на главной, а не параллельно десятками потоков. Внутри ступени
+URL рендерятся в пуле потоков ограниченного размера.
+
+Каждый URL запрашивается дважды: первый ответ — «холодная» задержка,
+второй — «теплая» (из кэша страниц). Изображение из og:image этого сайта
+(генерируемое /og-image/) запрашивается один раз. Просмотры не учитываются.
+
+Запуск:
+    python manage.py warm_cache [--workers N] [--host HOST]
+    gunicorn -c mysite/gunicorn.conf.py — после старта (CACHE_WARMUP_ON_START=True)
+"""
+
+import html
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+
+from .sitemaps import SITEMAPS
+from .view_counters import uncounted_views
+
+logger = logging.getLogger(__name__)
+
+# Блокировка от одновременных прогревов (несколько воркеров/серверов после деплоя)
+LOCK_KEY = "cache_warmup:lock"
+LOCK_TIMEOUT = 30 * 60
+
+# Ступени прогрева: карта сайта -> приоритет (меньше — раньше).
+# Главная всегда первая; карты, которых нет в списке, — детальные страницы.
+HOME_PRIORITY = 0
+SITEMAP_PRIORITY = {
+    "static": 1,
+    "pages": 2,
+    "news_categories": 2,
+    "portfolio_categories": 2,
+    "service_categories": 2,
+    "knowledge_base_categories": 2,
+}
+DETAIL_PRIORITY = 3
+
+OG_IMAGE_RE = re.compile(rb'<meta property="og:image" content="([^"]+)"')
+
+
+def warmup_paths():
+    """
+    URL для прогрева в порядке приоритета.
+
+    Returns:
+        list: пары (приоритет, путь) без повторов
+    """
+    paths = {}
+    for name, sitemap_class in SITEMAPS.items():
+        sitemap = sitemap_class()
+        sitemap_priority = SITEMAP_PRIORITY.get(name, DETAIL_PRIORITY)
+        for item in sitemap.items():
+            path = sitemap.location(item)
+            priority = HOME_PRIORITY if path == "/" else sitemap_priority
+            paths[path] = min(paths.get(path, priority), priority)
+    return sorted(((priority, path) for path, priority in paths.items()), key=lambda pair: pair[0])
+
+
+def _og_image_path(content, host):
+    """Путь og:image страницы, если изображение генерирует этот сайт (не файл из media/static)."""
+    match = OG_IMAGE_RE.search(content)
+    if not match:
+        return None
+    url = urlsplit(html.unescape(match.group(1).decode()))
+    if url.netloc and url.netloc != host:
+        return None
+    if url.path.startswith((settings.MEDIA_URL, settings.STATIC_URL)):
+        return None
+    return url.path + ("?" + url.query if url.query else "")
+
+
+def _timed_get(client, path):
+    client.cookies.clear()
+    started = time.monotonic()
+    response = client.get(path)
+    if response.streaming:
+        b"".join(response.streaming_content)
+    return response, (time.monotonic() - started) * 1000
+
+
+class _Warmer:
+    """Прогрев в потоках: по одному тестовому клиенту на поток."""
+
+    def __init__(self, host, secure):
+        self.host = host
+        self.secure = secure
+        self.local = threading.local()
+        self.og_seen = set()
+        self.og_lock = threading.Lock()
+
+    def client(self):
+        if not hasattr(self.local, "client"):
+            self.local.client = Client(HTTP_HOST=self.host, secure=self.secure)
+        return self.local.client
+
+    def warm(self, path):
+        """
+        Returns:
+            dict: path, status, cold_ms, warm_ms, og_image, og_ms
+        """
+        client = self.client()
+        # Контекст потоков пула не наследуется — отключаем учет просмотров здесь
+        with uncounted_views():
+            response, cold_ms = _timed_get(client, path)
+            result = {"path": path, "status": response.status_code, "cold_ms": cold_ms, "warm_ms": None}
+            if response.status_code != 200:
+                return result
+            _, result["warm_ms"] = _timed_get(client, path)
+
+            og_path = None if response.streaming else _og_image_path(response.content, self.host)
+            if og_path:
+                with self.og_lock:
+                    if og_path in self.og_seen:
+                        og_path = None
+                    else:
+                        self.og_seen.add(og_path)
+            if og_path:
+                og_response, result["og_ms"] = _timed_get(client, og_path)
+                result["og_image"] = og_path if og_response.status_code == 200 else None
+        return result
+
+    def warm_in_thread(self, path):
+        try:
+            return self.warm(path)
+        except Exception:
+            logger.exception("Ошибка прогрева %s", path)
+            return {"path": path, "status": None, "cold_ms": None, "warm_ms": None}
+        finally:
+            # Соединение с БД открыто потоком пула — закрываем его здесь
+            connection.close()
+
+
+def warm_up(workers=None, host=None, secure=None, log=None):
+    """
+    Прогревает кэши по ступеням приоритета.
+
+    Args:
+        workers (int | None): число потоков (CACHE_WARMUP_WORKERS, по умолчанию 4;
+            1 — в текущем потоке)
+        host (str | None): хост запросов (STATIC_EXPORT_HOST) — от него
+            зависят ключи кэша страниц и адреса og:image
+        log (callable | None): функция вывода прогресса
+
+    Returns:
+        list | None: результаты по URL (path, status, cold_ms, warm_ms, og_image)
+        в порядке прогрева или None, если прогрев уже выполняется
+    """
+    host = host or settings.STATIC_EXPORT_HOST
+    secure = getattr(settings, "STATIC_EXPORT_HTTPS", False) if secure is None else secure
+    if workers is None:
+        workers = getattr(settings, "CACHE_WARMUP_WORKERS", 4)
+    log = log or logger.info
+
+    if not cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+        return None
+    try:
+        warmer = _Warmer(host, secure)
+        tiers = {}
+        for priority, path in warmup_paths():
+            tiers.setdefault(priority, []).append(path)
+
+        results = []
+        for priority in sorted(tiers):
+            paths = tiers[priority]
+            log("Ступень %d: %d URL" % (priority, len(paths)))
+            if workers > 1 and len(paths) > 1:
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cache-warmup") as pool:
+                    results.extend(pool.map(warmer.warm_in_thread, paths))
+            else:
+                results.extend(warmer.warm(path) for path in paths)
+        return results
+    finally:
+        cache.delete(LOCK_KEY)
@@ -0,0 +1,146 @@
+"""
+Модуль compression.py приложения main
+
+Сжатие ответов brotli/gzip (CompressionMiddleware в main/middleware.py,
+заменяет django.middleware.gzip.GZipMiddleware).
+
+- Кодировка выбирается по Accept-Encoding: br (если установлен пакет
+  brotli), иначе gzip.
+- Общие для всех посетителей ответы (страницы из кэша страниц без
+  CSRF-токена, response.compress_shared = True) сжимаются один раз на
+  максимальном уровне: сжатые байты хранятся в кэше рядом со страницей по
+  ключу «кодировка + SHA-1 содержимого», и следующие ответы с тем же HTML
+  берут готовый результат без затрат CPU.
+- Персональные ответы (формы с CSRF-токеном, страницы пользователей)
+  сжимаются заново дешевым уровнем COMPRESSION_DYNAMIC_GZIP_LEVEL и только
+  gzip — со случайной длиной заголовка против BREACH, как в Django.
+- Потоковые ответы (main/streaming.py) сжимаются gzip с flush после
+  каждой части: браузер получает <head> сразу, а не когда наберется
+  буфер компрессора.
+- Изображения, шрифты, архивы и другие уже сжатые форматы не трогаются:
+  сжимаются только текстовые типы (HTML, CSS, JS, JSON, XML, SVG).
+
+Сравнение CPU на запрос: python manage.py bench_compression
+"""
+
+import gzip
+import hashlib
+import re
+import secrets
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.text import StreamingBuffer
+
+try:
+    import brotli
+except ImportError:  # необязательная зависимость: без нее только gzip
+    brotli = None
+
+# Префикс ключей сжатых вариантов общих ответов
+COMPRESSED_PREFIX = "compressed:"
+
+# Короткие ответы не сжимаются (как в GZipMiddleware)
+MIN_LENGTH = 200
+
+# Случайные байты заголовка gzip для персональных ответов (защита от BREACH)
+MAX_RANDOM_BYTES = 100
+
+# Текстовые типы, которые имеет смысл сжимать
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/rss+xml",
+    "application/atom+xml",
+    "application/manifest+json",
+    "image/svg+xml",
+)
+
+_CODING_RE = re.compile(r"\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?")
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding с q > 0."""
+    accepted = set()
+    for part in header.split(","):
+        match = _CODING_RE.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        if quality > 0:
+            accepted.add(match.group(1).lower())
+    return accepted
+
+
+def negotiate(header, shared=True):
+    """Выбирает кодировку ответа: "br", "gzip" или None."""
+    accepted = accepted_encodings(header)
+    if shared and brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def is_compressible(content_type):
+    content_type = content_type.split(";", 1)[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress_shared(content, encoding):
+    """Максимальное сжатие (детерминированное: одинаковый вход — одинаковый выход)."""
+    if encoding == "br":
+        return brotli.compress(content, quality=getattr(settings, "COMPRESSION_SHARED_BROTLI_QUALITY", 11))
+    return gzip.compress(content, getattr(settings, "COMPRESSION_SHARED_GZIP_LEVEL", 9), mtime=0)
+
+
+def compress_dynamic(content):
+    """Дешевое сжатие персонального ответа gzip со случайной длиной заголовка."""
+    data = gzip.compress(content, getattr(settings, "COMPRESSION_DYNAMIC_GZIP_LEVEL", 4), mtime=0)
+    # Тот же прием, что django.utils.text.compress_string: поле FNAME случайной длины
+    header = bytearray(data[:10])
+    header[3] = gzip.FNAME
+    return bytes(header) + b"a" * secrets.randbelow(MAX_RANDOM_BYTES) + b"\x00" + data[10:]
+
+
+def compress_stream(sequence):
+    """
+    Потоковое gzip-сжатие персонального ответа: после каждой части
+    Z_SYNC_FLUSH, чтобы уже отрендеренный HTML не ждал в буфере компрессора.
+    """
+    buf = StreamingBuffer()
+    filename = "a" * secrets.randbelow(MAX_RANDOM_BYTES)
+    with gzip.GzipFile(
+        filename=filename,
+        mode="wb",
+        compresslevel=getattr(settings, "COMPRESSION_DYNAMIC_GZIP_LEVEL", 4),
+        fileobj=buf,
+        mtime=0,
+    ) as zfile:
+        for item in sequence:
+            zfile.write(item)
+            zfile.flush(zlib.Z_SYNC_FLUSH)
+            yield buf.read()
+    yield buf.read()
+
+
+def cached_compress(content, encoding):
+    """
+    Сжатый вариант общего ответа: из кэша или сжатие с сохранением.
+
+    Returns:
+        tuple: (bytes, попадание в кэш)
+    """
+    key = "%s%s:%s" % (COMPRESSED_PREFIX, encoding, hashlib.sha1(content).hexdigest())
+    compressed = cache.get(key)
+    if compressed is not None:
+        return compressed, True
+    compressed = compress_shared(content, encoding)
+    cache.set(key, compressed, getattr(settings, "PAGE_CACHE_TIMEOUT", 600))
+    return compressed, False
@@ -0,0 +1,162 @@
+"""
+Модуль conditional.py приложения main
+
+Условные GET-запросы (ETag / Last-Modified) для страниц контента.
+
+Валидаторы страницы вычисляются без рендера шаблона:
+- максимальный updated_at объектов страницы (один агрегатный запрос);
+- версии тегов моделей, от которых зависит страница, включая обвязку сайта
+  и боковые блоки (main/cache_tags.py, одно обращение к кэшу) — версия тега
+  равна времени последнего изменения модели;
+- текущий сезон (тема оформления, mysite/context_processors.py), как и в
+  ключе кэша страниц (main/page_cache.py).
+
+Last-Modified — наибольшее из этих времен и начала сезона. ETag дополнительно учитывает
+состояние посетителя (пользователь, корзина), поэтому повторный запрос
+браузера, краулера или reverse proxy с If-None-Match/If-Modified-Since
+получает 304 без вызова представления. Просмотр при ответе 304 учитывается
+через main/view_counters.py.
+
+Использование:
+    @conditional_view(lambda request, slug: News.objects.filter(slug=slug, is_active=True),
+                      depends_on=["news.Comment", "news.DailyEvent"])
+    def news_detail(request, slug): ...
+"""
+
+import datetime
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.db.models import Max
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
+
+from mysite.context_processors import season_theme
+
+from .cache_tags import get_tag_versions, tags_for
+from .htmx import is_htmx
+from .site_chrome import SITE_CHROME_DEPENDENCIES
+from .view_counters import count_view
+
+# Модели, которые выводятся на каждой странице (обвязка и боковые блоки)
+SITE_DEPENDENCIES = SITE_CHROME_DEPENDENCIES + (
+    "news.News",
+    "portfolio.Portfolio",
+    "reviews.Review",
+)
+
+
+def visitor_state(request):
+    """Часть ETag, зависящая от посетителя: пользователь и содержимое корзины."""
+    user = getattr(request, "user", None)
+    user_id = user.pk if user is not None and user.is_authenticated else 0
+    session = getattr(request, "session", None)
+    cart = session.get(settings.CART_SESSION_ID) if session is not None else None
+    return "%s|%r" % (user_id, sorted(cart.items()) if cart else None)
+
+
+def is_shared_response(request):
+    """Одинакова ли страница для всех посетителей (аноним с пустой корзиной)."""
+    return visitor_state(request) == "0|None"
+
+
+def season_started(now=None):
+    """Начало текущего сезона (1 декабря, марта, июня или сентября)."""
+    now = now or datetime.datetime.now()
+    month = now.month - now.month % 3
+    if month == 0:
+        return datetime.datetime(now.year - 1, 12, 1)
+    return datetime.datetime(now.year, month, 1)
+
+
+def make_etag(validator, request):
+    """ETag страницы: валидатор контента + состояние посетителя + вариант (блок HTMX)."""
+    variant = "partial" if is_htmx(request) else ""
+    return quote_etag(
+        hashlib.md5(("%s|%s|%s" % (validator, visitor_state(request), variant)).encode()).hexdigest()
+    )
+
+
+def compute_validators(queryset, depends_on=()):
+    """
+    Вычисляет валидаторы контента.
+
+    Returns:
+        tuple | None: (validator, last_modified_timestamp) или None,
+        если объектов нет (страница вернет 404 сама)
+    """
+    updated_at = queryset.aggregate(updated=Max("updated_at"))["updated"]
+    if updated_at is None:
+        return None
+    versions = get_tag_versions(tags_for(queryset, *depends_on, *SITE_DEPENDENCIES))
+    # Смена сезона меняет тему оформления всех страниц без изменения данных
+    season = season_theme(None)["current_season"]
+    last_modified = max(
+        updated_at.timestamp(),
+        season_started().timestamp(),
+        *(version / 1e9 for _, version in versions if version),
+    )
+    validator = hashlib.md5(repr((updated_at.isoformat(), versions, season)).encode()).hexdigest()
+    return validator, int(last_modified)
+
+
+def conditional_response(request, validator, last_modified):
+    """
+    Возвращает 304/412, если валидаторы клиента совпадают, иначе None.
+    Last-Modified сравнивается только для страниц, общих для всех посетителей.
+    """
+    return get_conditional_response(
+        request,
+        etag=make_etag(validator, request),
+        last_modified=last_modified if is_shared_response(request) else None,
+    )
+
+
+def set_validators(response, request, validator, last_modified):
+    """Добавляет к ответу ETag, Last-Modified и требование перепроверки."""
+    response["ETag"] = make_etag(validator, request)
+    if is_shared_response(request):
+        response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True)
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True)
+    # Для кэша страниц: валидатор не зависит от посетителя
+    response.content_validator = (validator, last_modified)
+
+
+def conditional_view(lookup, depends_on=()):
+    """
+    Декоратор представления: ответ 304 без рендера при совпадении валидаторов.
+
+    Args:
+        lookup (callable): lookup(request, *args, **kwargs) -> QuerySet объектов
+            страницы (с полем updated_at) или None, если проверку нужно пропустить
+        depends_on (iterable): дополнительные зависимости (модели, "app.Model")
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD") or len(messages.get_messages(request)):
+                return view(request, *args, **kwargs)
+            queryset = lookup(request, *args, **kwargs)
+            validators = compute_validators(queryset, depends_on) if queryset is not None else None
+            if validators is None:
+                return view(request, *args, **kwargs)
+
+            response = conditional_response(request, *validators)
+            if response is not None:
+                if response.status_code == 304 and request.resolver_match:
+                    count_view(request.resolver_match.view_name, kwargs)
+                return response
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.has_header("ETag"):
+                set_validators(response, request, *validators)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,18 +1,15 @@
-from knowledge_base.models import Category as KBCategory
-from news.models import NewsCategory
-from portfolio.models import PortfolioCategory
-from services.models import ServiceCategory
-
-from .models import AnalyticsScript, Page, SiteSettings
+from .header_resolver import resolve_header
+from .site_chrome import get_site_chrome
 
 
 def main_context(request):
     """
     Глобальный контекст-процессор для передачи общих данных во все шаблоны.
+    Общие данные (настройки, меню, аналитика, категории) берутся из
+    предвычисленного снимка site_chrome одним обращением к кэшу.
     """
-    settings = SiteSettings.objects.filter(is_active=True).first()
-    menu_pages = Page.objects.filter(show_in_menu=True, is_active=True).order_by("order")
-    analytics_scripts = AnalyticsScript.objects.filter(is_active=True).order_by("position")
+    chrome = get_site_chrome()
+    settings = chrome["site_settings"]
 
     # Значения по умолчанию для шапки (Главная страница)
     header_data = {
@@ -21,105 +18,18 @@ def main_context(request):
         "image": settings.fon_haeders.url if settings and settings.fon_haeders else None,
     }
 
-    path = request.path.strip("/")
-    path_parts = [p for p in path.split("/") if p]
-    found_header = False
-
-    if path_parts:
-        app_name = path_parts[0]
-        
-        # 1. Логика для Новостей
-        if app_name == "news":
-            from news.models import News
-            if "category" in path_parts and len(path_parts) > path_parts.index("category") + 1:
-                slug = path_parts[path_parts.index("category") + 1]
-                obj = NewsCategory.objects.filter(slug=slug, is_active=True).first()
-            elif len(path_parts) > 1:
-                news = News.objects.filter(slug=path_parts[1], is_active=True).first()
-                obj = news.category if news else None
-            else:
-                obj = None
-            
-            if obj:
-                header_data["title"] = obj.header_title or obj.name
-                header_data["description"] = obj.header_description or obj.description
-                if obj.header_image:
-                    header_data["image"] = obj.header_image.url
-                found_header = True
-            else:
-                header_data["title"] = "Новости и Статьи"
-                header_data["description"] = "Актуальные события и обновления"
-                found_header = True
-
-        # 2. Логика для Портфолио
-        elif app_name == "portfolio":
-            from portfolio.models import Portfolio
-            if "category" in path_parts and len(path_parts) > path_parts.index("category") + 1:
-                slug = path_parts[path_parts.index("category") + 1]
-                obj = PortfolioCategory.objects.filter(slug=slug, is_active=True).first()
-            elif len(path_parts) > 1:
-                portfolio = Portfolio.objects.filter(slug=path_parts[1], is_active=True).first()
-                obj = portfolio.category if portfolio else None
-            else:
-                obj = None
-            
-            if obj:
-                header_data["title"] = obj.header_title or obj.name
-                header_data["description"] = obj.header_description or obj.description
-                if obj.header_image:
-                    header_data["image"] = obj.header_image.url
-                found_header = True
-            else:
-                header_data["title"] = "Наше Портфолио"
-                header_data["description"] = "Лучшие работы нашей команды"
-                found_header = True
-
-        # 3. Логика для Услуг
-        elif app_name == "services":
-            header_data["title"] = "Профессиональные услуги"
-            header_data["description"] = "Решения для развития вашего бизнеса"
-            found_header = True
-        
-        # 4. Логика для других приложений
-        elif app_name == "reviews":
-            header_data["title"] = "Отзывы наших клиентов"
-            header_data["description"] = "Мы ценим ваше мнение о нашей работе"
-            found_header = True
-            
-        elif app_name == "tickets":
-            header_data["title"] = "Техническая поддержка"
-            header_data["description"] = "Мы всегда готовы помочь вам"
-            found_header = True
-
-        elif app_name == "search":
-            header_data["title"] = "Поиск по сайту"
-            header_data["description"] = "Результаты поиска по вашему запросу"
-            found_header = True
-
-        elif app_name == "knowledge-base":
-            header_data["title"] = "База знаний"
-            header_data["description"] = "Полезные статьи и инструкции"
-            found_header = True
-
-        # 5. Логика для обычных страниц
-        if not found_header:
-            slug = path_parts[-1]
-            current_page = Page.objects.filter(slug=slug, is_active=True).first()
-            if current_page:
-                header_data["title"] = current_page.meta_title or current_page.title
-                header_data["description"] = current_page.meta_description
-                if current_page.fon_headers:
-                    header_data["image"] = current_page.fon_headers.url
+    # Шапка раздела/страницы из индекса в памяти (без запросов к БД)
+    header = resolve_header(request.path)
+    if header:
+        header_data["title"], header_data["description"], image = header
+        if image:
+            header_data["image"] = image
 
     return {
         "site_settings": settings,
-        "menu_pages": menu_pages,
+        "menu_pages": chrome["menu_pages"],
         "header_data": header_data,
-        "analytics_scripts": analytics_scripts,
-        "nav_categories": {
-            "news": NewsCategory.objects.filter(is_active=True),
-            "portfolio": PortfolioCategory.objects.filter(is_active=True),
-            "services": ServiceCategory.objects.filter(is_active=True),
-            "knowledge_base": KBCategory.objects.all(),
-        }
+        "analytics_scripts": chrome["analytics_scripts"],
+        "nav_categories": chrome["nav_categories"],
+        "site_chrome_version": chrome["version"],
     }
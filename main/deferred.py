@@ -0,0 +1,144 @@
+"""
+Модуль deferred.py приложения main
+
+Отложенные фрагменты страницы: второстепенные блоки загружаются отдельным
+запросом после основного контента.
+
+Боковые блоки («Последние новости», «Последние работы», «Последние
+отзывы»), связанные новости и категории новостей со счетчиками
+вычислялись при рендере каждой страницы и задерживали первый байт
+основного контента. Теперь шаблон помечает блок тегом
+{% deferred "имя" %}: на странице остается легкая заглушка с hx-get на
+/fragments/<имя>/ и hx-trigger="revealed" (или "load"), а блок рендерит
+отдельное представление deferred_fragment.
+
+Фрагменты описаны в FRAGMENTS: шаблон, значения контекста (пути к
+функциям, как PAGE_CACHE_HOLE_CONTEXT_PROCESSORS), зависимости и
+допустимые параметры query string (например, slug новости для связанных
+новостей). Фрагменты общие для всех посетителей — в их шаблонах нет
+пользователя и CSRF-токена. Готовый HTML хранится в кэше по тегам моделей
+(main/cache_tags.py) и отдается с ETag и Cache-Control: public, поэтому
+его могут кэшировать и браузер, и reverse proxy.
+
+DEFERRED_FRAGMENTS_ENABLED = False возвращает рендер блоков на месте.
+
+Использование:
+    {% load deferred %}
+    {% deferred "latest_news" %}
+    {% deferred "related_news" slug=news.slug trigger="load" %}
+"""
+
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.template.loader import get_template
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from .cache_tags import get_or_set_tagged
+
+FRAGMENT_PREFIX = "deferred:"
+
+
+class Fragment:
+    """
+    Описание отложенного фрагмента.
+
+    Args:
+        template_name (str): шаблон блока
+        context (dict): ключ контекста -> путь к функции, принимающей параметры фрагмента
+        depends_on (list): модели ("app.Model"), при изменении которых блок перестраивается
+        params (tuple): допустимые параметры query string (доступны и в шаблоне)
+        placeholder_class (str): CSS-классы заглушки (место под блок до загрузки)
+        min_height (int): минимальная высота заглушки, px (без сдвига верстки)
+    """
+
+    def __init__(self, template_name, context, depends_on, params=(), placeholder_class="", min_height=0):
+        self.template_name = template_name
+        self.context = context
+        self.depends_on = depends_on
+        self.params = params
+        self.placeholder_class = placeholder_class
+        self.min_height = min_height
+
+
+FRAGMENTS = {
+    "latest_news": Fragment(
+        "includes/sidebar/block_news.html",
+        {"latest_news": "news.views.get_latest_news"},
+        ["news.News", "news.NewsCategory", "news.DailyEvent"],
+        placeholder_class="sidebar-card mb-4",
+        min_height=320,
+    ),
+    "latest_portfolio": Fragment(
+        "includes/sidebar/block_portfolio.html",
+        {"latest_portfolio": "portfolio.views.get_latest_portfolio"},
+        ["portfolio.Portfolio", "portfolio.PortfolioCategory"],
+        placeholder_class="sidebar-card mb-4",
+        min_height=320,
+    ),
+    "latest_reviews": Fragment(
+        "includes/sidebar/block_reviews.html",
+        {"latest_reviews": "reviews.views.get_latest_reviews"},
+        ["reviews.Review"],
+        placeholder_class="sidebar-card mb-4",
+        min_height=320,
+    ),
+    "news_categories": Fragment(
+        "news/includes/_categories.html",
+        {"categories": "news.views.get_news_categories"},
+        ["news.News", "news.NewsCategory"],
+        params=("current",),
+        placeholder_class="d-flex flex-wrap gap-2",
+        min_height=38,
+    ),
+    "related_news": Fragment(
+        "news/includes/_related.html",
+        {"related_news": "news.views.get_related_news"},
+        ["news.News", "news.NewsCategory"],
+        params=("slug",),
+        min_height=200,
+    ),
+}
+
+
+def is_enabled():
+    return getattr(settings, "DEFERRED_FRAGMENTS_ENABLED", True)
+
+
+def clean_params(fragment, params):
+    """Только объявленные параметры фрагмента, в постоянном порядке."""
+    return {name: str(params[name]) for name in fragment.params if params.get(name) not in (None, "")}
+
+
+def fragment_url(name, params):
+    url = reverse("main:deferred_fragment", args=[name])
+    query = urlencode(clean_params(FRAGMENTS[name], params))
+    return url + ("?" + query if query else "")
+
+
+def render_fragment(name, params):
+    """
+    HTML фрагмента из кэша или с рендером и сохранением.
+
+    Raises:
+        KeyError: неизвестный фрагмент
+        Http404: из функций контекста (например, неизвестный slug)
+    """
+    fragment = FRAGMENTS[name]
+    params = clean_params(fragment, params)
+    key = FRAGMENT_PREFIX + name
+    if params:
+        key += ":" + hashlib.md5(urlencode(params).encode()).hexdigest()
+
+    def build():
+        context = dict(params)
+        context.update(
+            (var, import_string(path)(**params)) for var, path in fragment.context.items()
+        )
+        return get_template(fragment.template_name).render(context)
+
+    return get_or_set_tagged(
+        key, build, fragment.depends_on, timeout=getattr(settings, "DEFERRED_FRAGMENT_TIMEOUT", 3600)
+    )
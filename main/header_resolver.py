@@ -0,0 +1,166 @@
+"""
+Модуль header_resolver.py приложения main
+
+Определение данных шапки (заголовок, описание, фон) по пути запроса.
+
+Вместо запросов `.filter(slug=...).first()` к News, NewsCategory, Portfolio,
+PortfolioCategory и Page на каждый запрос используется компактный индекс
+в памяти процесса: slug -> (заголовок, описание, URL изображения) для
+каждого раздела. Поиск по индексу — O(1) и не зависит от количества
+разделов с собственной шапкой.
+
+Индекс строится один раз при первом обращении. Версия индекса — версии
+тегов моделей HEADER_DEPENDENCIES (main/cache_tags.py), которые меняются
+сигналами при сохранении; каждый процесс сверяет их (одно обращение к
+кэшу) и перестраивает свой индекс только после изменений.
+"""
+
+import threading
+
+from .cache_tags import get_tag_versions, tags_for
+
+# Модели, из которых строится индекс
+HEADER_DEPENDENCIES = (
+    "main.Page",
+    "news.News",
+    "news.NewsCategory",
+    "portfolio.Portfolio",
+    "portfolio.PortfolioCategory",
+)
+
+# Статические шапки разделов без собственных моделей
+SECTION_HEADERS = {
+    "news": ("Новости и Статьи", "Актуальные события и обновления"),
+    "portfolio": ("Наше Портфолио", "Лучшие работы нашей команды"),
+    "services": ("Профессиональные услуги", "Решения для развития вашего бизнеса"),
+    "reviews": ("Отзывы наших клиентов", "Мы ценим ваше мнение о нашей работе"),
+    "tickets": ("Техническая поддержка", "Мы всегда готовы помочь вам"),
+    "search": ("Поиск по сайту", "Результаты поиска по вашему запросу"),
+    "knowledge-base": ("База знаний", "Полезные статьи и инструкции"),
+}
+
+
+def _file_url(field, name):
+    """Возвращает URL файла по имени без создания FieldFile."""
+    return field.storage.url(name) if name else None
+
+
+def _category_headers(model):
+    """
+    Строит шапки категорий раздела (News/Portfolio).
+
+    Returns:
+        tuple: (по id всех категорий, по slug активных категорий)
+    """
+    image_field = model._meta.get_field("header_image")
+    by_id = {}
+    by_slug = {}
+    rows = model.objects.values_list(
+        "id", "slug", "is_active", "name", "header_title",
+        "description", "header_description", "header_image",
+    )
+    for pk, slug, is_active, name, h_title, description, h_description, h_image in rows:
+        header = (h_title or name, h_description or description, _file_url(image_field, h_image))
+        by_id[pk] = header
+        if is_active:
+            by_slug[slug] = header
+    return by_id, by_slug
+
+
+def _item_headers(model, categories_by_id):
+    """Сопоставляет slug активного объекта раздела с шапкой его категории."""
+    return {
+        slug: categories_by_id[category_id]
+        for slug, category_id in model.objects.filter(is_active=True).values_list("slug", "category_id")
+        if category_id in categories_by_id
+    }
+
+
+class HeaderIndex:
+    """Неизменяемый индекс шапок: словари slug -> (title, description, image_url)."""
+
+    def __init__(self, version):
+        from news.models import News, NewsCategory
+        from portfolio.models import Portfolio, PortfolioCategory
+
+        from .models import Page
+
+        self.version = version
+
+        news_categories, self.news_categories = _category_headers(NewsCategory)
+        self.news = _item_headers(News, news_categories)
+
+        portfolio_categories, self.portfolio_categories = _category_headers(PortfolioCategory)
+        self.portfolio = _item_headers(Portfolio, portfolio_categories)
+
+        image_field = Page._meta.get_field("fon_headers")
+        self.pages = {
+            slug: (meta_title or title, meta_description, _file_url(image_field, image))
+            for slug, meta_title, title, meta_description, image in Page.objects.filter(
+                is_active=True
+            ).values_list("slug", "meta_title", "title", "meta_description", "fon_headers")
+        }
+
+    def section(self, app_name):
+        """Возвращает индексы (категории, объекты) для раздела с категориями."""
+        if app_name == "news":
+            return self.news_categories, self.news
+        if app_name == "portfolio":
+            return self.portfolio_categories, self.portfolio
+        return None
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_header_index():
+    """
+    Возвращает актуальный индекс процесса, перестраивая его при смене версии.
+    """
+    global _index
+    version = get_tag_versions(tags_for(*HEADER_DEPENDENCIES))
+
+    index = _index
+    if index is None or index.version != version:
+        with _lock:
+            index = _index
+            if index is None or index.version != version:
+                index = _index = HeaderIndex(version)
+    return index
+
+
+def resolve_header(path):
+    """
+    Определяет шапку страницы по пути запроса.
+
+    Args:
+        path (str): request.path
+
+    Returns:
+        tuple | None: (title, description, image_url) или None, если для пути
+        нет собственной шапки и нужно использовать настройки сайта.
+        image_url может быть None — тогда остается фон по умолчанию.
+    """
+    path_parts = [p for p in path.strip("/").split("/") if p]
+    if not path_parts:
+        return None
+
+    app_name = path_parts[0]
+    if app_name in SECTION_HEADERS:
+        index = get_header_index()
+        section = index.section(app_name)
+        if section:
+            categories, items = section
+            header = None
+            if "category" in path_parts and len(path_parts) > path_parts.index("category") + 1:
+                header = categories.get(path_parts[path_parts.index("category") + 1])
+            elif len(path_parts) > 1:
+                header = items.get(path_parts[1])
+            if header:
+                return header
+        title, description = SECTION_HEADERS[app_name]
+        return title, description, None
+
+    # Обычные страницы: ищем по последней части пути
+    return get_header_index().pages.get(path_parts[-1])
@@ -0,0 +1,120 @@
+"""
+Модуль html_minify.py приложения main
+
+Минификация HTML: удаление комментариев и отступов.
+
+Шаблоны (base.html, header.html, footer.html и шаблоны приложений)
+написаны с отступами и поясняющими комментариями, и все это уходило
+посетителю. Минификация работает в два этапа:
+
+- MinifyingLoader — при компиляции шаблона: из исходника убираются
+  HTML-комментарии и отступы статических частей. Работа выполняется один
+  раз на шаблон (под django.template.loaders.cached.Loader — один раз на
+  процесс) и не стоит ничего при рендере.
+- minify() — для отрендеренного HTML перед записью в кэш страниц
+  (AnonymousPageCacheMiddleware): убирает то, что приходит из данных
+  (контент TinyMCE, отступы включаемых фрагментов). Выполняется один раз
+  на промах кэша, попадания отдают уже сжатый HTML.
+
+Правила безопасные: последовательность пробельных символов с переводом
+строки заменяется одним переводом строки (для браузера это тот же
+пробел), пробелы и табуляция подряд — одним пробелом. Содержимое <pre>,
+<textarea>, <script> и <style> не трогается. Остаются условные
+комментарии IE, метки «дырок» кэша страниц (<!--page-hole:...-->) и в
+исходниках шаблонов — комментарии с тегами шаблона ({% ... %}), чтобы не
+нарушить структуру блоков.
+
+Отключение: HTML_MINIFY_ENABLED = False; шаблоны, пути которых начинаются
+с HTML_MINIFY_EXCLUDE, не изменяются.
+"""
+
+import re
+
+from django.conf import settings
+from django.template.loaders.base import Loader as BaseLoader
+
+# Блоки, где пробелы значимы (или это код)
+PROTECTED_RE = re.compile(r"<(pre|textarea|script|style)\b.*?</\1\s*>", re.S | re.I)
+
+# Комментарии, кроме условных (<!--[if ...]>), меток «дырок» и <!-->
+COMMENT_RE = re.compile(r"<!--(?!\[if|page-hole:|>)(.*?)-->", re.S)
+
+NEWLINE_SPACE_RE = re.compile(r"[ \t\r\f\v]*\n\s*")
+SPACES_RE = re.compile(r"[ \t\f\v]{2,}")
+
+
+def _is_enabled():
+    return getattr(settings, "HTML_MINIFY_ENABLED", True)
+
+
+def _collapse(text, keep_comment):
+    text = COMMENT_RE.sub(lambda m: m.group(0) if keep_comment(m.group(1)) else "", text)
+    text = NEWLINE_SPACE_RE.sub("\n", text)
+    return SPACES_RE.sub(" ", text)
+
+
+def _minify(text, keep_comment):
+    # Края текста не обрезаются: шаблон может включаться внутрь строки
+    parts = []
+    position = 0
+    for match in PROTECTED_RE.finditer(text):
+        parts.append(_collapse(text[position:match.start()], keep_comment))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(_collapse(text[position:], keep_comment))
+    return "".join(parts)
+
+
+def minify(html):
+    """Минифицирует отрендеренный HTML."""
+    if not _is_enabled():
+        return html
+    return _minify(html, keep_comment=lambda body: False).strip()
+
+
+def minify_template_source(source):
+    """Минифицирует исходник шаблона Django (комментарии с тегами шаблона остаются)."""
+    return _minify(source, keep_comment=lambda body: "{%" in body)
+
+
+class MinifyingLoader(BaseLoader):
+    """
+    Загрузчик шаблонов, минифицирующий HTML-шаблоны вложенных загрузчиков.
+
+    В TEMPLATES ставится внутрь cached.Loader:
+        ("django.template.loaders.cached.Loader", [
+            ("main.html_minify.MinifyingLoader", [
+                "django.template.loaders.filesystem.Loader",
+                "django.template.loaders.app_directories.Loader",
+            ]),
+        ])
+    """
+
+    def __init__(self, engine, loaders):
+        super().__init__(engine)
+        self.loaders = engine.get_template_loaders(loaders)
+
+    def get_template_sources(self, template_name):
+        for loader in self.loaders:
+            for origin in loader.get_template_sources(template_name):
+                # cached.Loader читает исходник через origin.loader
+                origin.source_loader = origin.loader
+                origin.loader = self
+                yield origin
+
+    def get_contents(self, origin):
+        contents = origin.source_loader.get_contents(origin)
+        if self._should_minify(origin.template_name):
+            contents = minify_template_source(contents)
+        return contents
+
+    def reset(self):
+        for loader in self.loaders:
+            if hasattr(loader, "reset"):
+                loader.reset()
+
+    @staticmethod
+    def _should_minify(template_name):
+        if not _is_enabled() or not str(template_name).endswith(".html"):
+            return False
+        return not str(template_name).startswith(tuple(getattr(settings, "HTML_MINIFY_EXCLUDE", ())))
@@ -0,0 +1,82 @@
+"""
+Модуль htmx.py приложения main
+
+Частичный рендер списков для HTMX-запросов.
+
+Смена сортировки, фильтра или страницы в списках новостей, услуг и
+портфолио раньше перерисовывала всю страницу: шапку, меню, боковую
+колонку и все контекстные процессоры. Ссылки сортировки, фильтров и
+пагинации отправляют HTMX-запрос (hx-get, hx-target на блок результатов,
+hx-push-url), и представление отдает только шаблон блока результатов.
+
+Частичный шаблон рендерится без контекстных процессоров обвязки: в
+контексте только request, user, csrf_token и значения процессоров из
+HTMX_PARTIAL_CONTEXT_PROCESSORS (как «дырки» кэша страниц,
+main/page_cache.py). Ответы помечаются Vary: HX-Request, а кэш страниц
+и ETag (main/conditional.py) различают полный и частичный варианты.
+
+Полная страница по-прежнему отдается, если HTMX восстанавливает историю
+(HX-History-Restore-Request) или запрос пришел от hx-boost.
+
+Использование:
+    return render_list(request, "news/list.html", "news/includes/_results.html", context)
+
+    class ServiceListView(HtmxListMixin, ListView):
+        partial_template_name = "services/includes/_results.html"
+"""
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import render
+from django.template.loader import get_template
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+
+def is_htmx(request):
+    """Запрос HTMX, которому нужен только блок результатов."""
+    headers = request.headers
+    return (
+        headers.get("HX-Request") == "true"
+        and not headers.get("HX-History-Restore-Request")
+        and not headers.get("HX-Boosted")
+    )
+
+
+def render_partial(request, template_name, context):
+    """Рендерит частичный шаблон без контекстных процессоров обвязки сайта."""
+    values = {
+        "request": request,
+        "user": request.user,
+        "csrf_token": SimpleLazyObject(lambda: get_token(request)),
+    }
+    for path in getattr(settings, "HTMX_PARTIAL_CONTEXT_PROCESSORS", ()):
+        values.update(import_string(path)(request))
+    values.update(context)
+    return HttpResponse(get_template(template_name).render(values))
+
+
+def render_list(request, template_name, partial_template_name, context):
+    """Полная страница списка или блок результатов для HTMX."""
+    if is_htmx(request):
+        response = render_partial(request, partial_template_name, context)
+    else:
+        response = render(request, template_name, context)
+    patch_vary_headers(response, ("HX-Request",))
+    return response
+
+
+class HtmxListMixin:
+    """Для ListView: блок результатов (partial_template_name) на HTMX-запросы."""
+
+    partial_template_name = None
+
+    def render_to_response(self, context, **response_kwargs):
+        if is_htmx(self.request):
+            response = render_partial(self.request, self.partial_template_name, context)
+        else:
+            response = super().render_to_response(context, **response_kwargs)
+        patch_vary_headers(response, ("HX-Request",))
+        return response
@@ -0,0 +1,155 @@
+"""
+Модуль lazy_context.py приложения main
+
+Ленивые значения для контекстных процессоров.
+
+Контекстные процессоры вызываются при каждом рендере шаблона с
+RequestContext — в том числе для админки, HTMX-фрагментов и robots.txt,
+где последние новости, портфолио, отзывы и корзина не нужны. Вместо
+готовых querysets процессоры возвращают прокси (SimpleLazyObject),
+которые обращаются к БД или сессии только при первом чтении ключа
+шаблоном. Вычисленное значение запоминается на объекте запроса, поэтому
+несколько рендеров в рамках одного запроса выполняют запрос к БД один раз.
+
+При включенной настройке CONTEXT_USAGE_TRACKING (по умолчанию равна DEBUG)
+ведется отчет: какие ключи предоставлены и какие шаблоны их прочитали,
+в разрезе пространства имен URL. Отчет доступен сотрудникам по адресу
+/admin/dashboard/context-usage/ и помогает убрать лишние процессоры.
+"""
+
+import threading
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+# Имя шаблона, который рендерится в данный момент (для отчета)
+_current_template = ContextVar("current_template", default=None)
+
+_report_lock = threading.Lock()
+_report = defaultdict(
+    lambda: {"requests": 0, "provided": Counter(), "touched": defaultdict(Counter)}
+)
+
+
+def tracking_enabled():
+    """Включен ли сбор отчета об использовании ключей контекста."""
+    return getattr(settings, "CONTEXT_USAGE_TRACKING", settings.DEBUG)
+
+
+def _namespace(request):
+    """Пространство имен URL запроса ('-' для адресов без namespace)."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "-"
+    return match.namespace or match.url_name or "-"
+
+
+def _track_request(request, keys):
+    """Учитывает запрос и предоставленные ему ключи (один раз на запрос)."""
+    seen = request.__dict__.setdefault("_context_usage_provided", set())
+    new_keys = [key for key in keys if key not in seen]
+    if not new_keys:
+        return
+    with _report_lock:
+        entry = _report[_namespace(request)]
+        if not seen:
+            entry["requests"] += 1
+        entry["provided"].update(new_keys)
+    seen.update(new_keys)
+
+
+def _track_touch(request, key):
+    """Учитывает чтение ключа шаблоном."""
+    with _report_lock:
+        _report[_namespace(request)]["touched"][key][_current_template.get() or "?"] += 1
+
+
+def _resolve(request, key, factory):
+    """Вычисляет значение ключа один раз на запрос."""
+    values = request.__dict__.setdefault("_lazy_context_values", {})
+    if key not in values:
+        values[key] = factory()
+    return values[key]
+
+
+def lazy_context(request, **factories):
+    """
+    Строит словарь контекста из ленивых значений.
+
+    Args:
+        request: текущий запрос
+        **factories: ключ контекста -> функция без аргументов, возвращающая значение
+
+    Returns:
+        dict: ключ -> SimpleLazyObject, вычисляемый при первом обращении шаблона
+    """
+    tracking = tracking_enabled()
+    if tracking:
+        _track_request(request, factories)
+
+    def make(key, factory):
+        def setup():
+            if tracking:
+                _track_touch(request, key)
+            return _resolve(request, key, factory)
+
+        return SimpleLazyObject(setup)
+
+    return {key: make(key, factory) for key, factory in factories.items()}
+
+
+def install_template_tracking():
+    """
+    Запоминает имя рендерящегося шаблона, чтобы отчет показывал,
+    какой шаблон (включая include) прочитал ключ.
+
+    Подключается из MainConfig.ready() только при включенном отчете —
+    тем же способом Django отслеживает шаблоны в тестовом окружении.
+    """
+    from django.template.base import Template
+
+    if getattr(Template._render, "_context_usage", False):
+        return
+    original_render = Template._render
+
+    def _render(self, context):
+        token = _current_template.set(self.name)
+        try:
+            return original_render(self, context)
+        finally:
+            _current_template.reset(token)
+
+    _render._context_usage = True
+    Template._render = _render
+
+
+def get_usage_report():
+    """
+    Возвращает отчет об использовании ключей контекста.
+
+    Returns:
+        dict: namespace -> {
+            "requests": число запросов,
+            "provided": {ключ: сколько раз предоставлен},
+            "touched": {ключ: {шаблон: число обращений}},
+            "unused": ключи, которые ни разу не прочитаны — кандидаты на удаление
+        }
+    """
+    with _report_lock:
+        return {
+            namespace: {
+                "requests": entry["requests"],
+                "provided": dict(entry["provided"]),
+                "touched": {key: dict(templates) for key, templates in entry["touched"].items()},
+                "unused": sorted(set(entry["provided"]) - set(entry["touched"])),
+            }
+            for namespace, entry in sorted(_report.items())
+        }
+
+
+def reset_usage_report():
+    """Очищает накопленный отчет."""
+    with _report_lock:
+        _report.clear()
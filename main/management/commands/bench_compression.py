@@ -0,0 +1,86 @@
+"""
+Сравнение CPU на запрос при сжатии ответов: GZipMiddleware Django (до)
+и CompressionMiddleware (после, main/compression.py).
+Использование: python manage.py bench_compression [--requests N] [--url-name main:home ...]
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from main import compression
+from main.view_counters import uncounted_views
+
+NEW_MIDDLEWARE = "main.middleware.CompressionMiddleware"
+OLD_MIDDLEWARE = "django.middleware.gzip.GZipMiddleware"
+
+
+class Command(BaseCommand):
+    help = 'Замеряет CPU на запрос и размер ответа до и после CompressionMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Запросов на каждый URL и вариант (по умолчанию 50)',
+        )
+        parser.add_argument(
+            '--url-name',
+            action='append',
+            dest='url_names',
+            default=None,
+            help='Имя URL (можно несколько раз), по умолчанию main:home и news:list',
+        )
+        parser.add_argument(
+            '--host',
+            type=str,
+            default=None,
+            help='Хост запросов (по умолчанию STATIC_EXPORT_HOST)',
+        )
+
+    def measure(self, middleware, path, encoding, requests, host):
+        with override_settings(MIDDLEWARE=middleware), uncounted_views():
+            # Новый клиент загружает MIDDLEWARE заново
+            client = Client(HTTP_HOST=host, HTTP_ACCEPT_ENCODING=encoding)
+            # Прогрев: кэш страниц и сжатых вариантов
+            client.get(path)
+            client.get(path)
+            cpu = 0.0
+            size = 0
+            for _ in range(requests):
+                client.cookies.clear()
+                started = time.process_time()
+                response = client.get(path)
+                cpu += time.process_time() - started
+                size = len(response.content)
+        return cpu / requests * 1000, size, response.get('Content-Encoding') or '—'
+
+    def handle(self, *args, **options):
+        if NEW_MIDDLEWARE not in settings.MIDDLEWARE:
+            self.stderr.write(f'{NEW_MIDDLEWARE} не подключен в MIDDLEWARE')
+            return
+        host = options['host'] or settings.STATIC_EXPORT_HOST
+        requests = options['requests']
+        before = [OLD_MIDDLEWARE if m == NEW_MIDDLEWARE else m for m in settings.MIDDLEWARE]
+        after = list(settings.MIDDLEWARE)
+
+        encodings = ['gzip']
+        if compression.brotli is not None:
+            encodings.append('gzip, br')
+
+        self.stdout.write(f'Запросов на вариант: {requests}; CPU — среднее process_time на запрос\n')
+        for url_name in options['url_names'] or ['main:home', 'news:list']:
+            path = reverse(url_name)
+            for encoding in encodings:
+                old_cpu, old_size, old_coding = self.measure(before, path, encoding, requests, host)
+                new_cpu, new_size, new_coding = self.measure(after, path, encoding, requests, host)
+                self.stdout.write(
+                    f'{url_name} ({path}), Accept-Encoding: {encoding}\n'
+                    f'  до:    {old_cpu:6.2f} мс CPU, {old_size:7d} байт ({old_coding})\n'
+                    f'  после: {new_cpu:6.2f} мс CPU, {new_size:7d} байт ({new_coding})\n'
+                    f'  разница: {old_cpu - new_cpu:+.2f} мс CPU на запрос, '
+                    f'{old_size - new_size:+d} байт'
+                )
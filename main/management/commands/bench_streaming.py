@@ -0,0 +1,92 @@
+"""
+Сравнение обычного и потокового рендера (main/streaming.py) на детальной
+новости дня с большим числом событий: время до первого байта (TTFB),
+полное время ответа и пиковая память Python (tracemalloc).
+Тестовая новость создается в транзакции и откатывается после замера.
+Использование: python manage.py bench_streaming [--events N] [--requests N]
+"""
+import time
+import tracemalloc
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from main.view_counters import uncounted_views
+from news.models import DailyEvent, News, NewsCategory
+
+SLUG = 'bench-streaming-day'
+
+
+class Command(BaseCommand):
+    help = 'Замеряет TTFB и пиковую память детальной новости до и после потокового рендера'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--events',
+            type=int,
+            default=1000,
+            help='Событий в тестовой новости дня (по умолчанию 1000)',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=5,
+            help='Запросов на каждый вариант (по умолчанию 5)',
+        )
+
+    def create_day(self, events):
+        category = NewsCategory.objects.create(name='Замер потока', slug=SLUG)
+        news = News.objects.create(
+            title='Замер потока', slug=SLUG, category=category, news_date=date(2099, 1, 1), content='<p>Замер</p>',
+        )
+        DailyEvent.objects.bulk_create(
+            DailyEvent(
+                news=news,
+                event_type='other',
+                title=f'Событие {i}',
+                description='<p>' + 'Описание события дня. ' * 10 + '</p>',
+                order=i,
+            )
+            for i in range(events)
+        )
+        return reverse('news:detail', args=[SLUG])
+
+    def measure(self, client, path, streaming, requests):
+        ttfb = total = 0.0
+        peak = size = 0
+        with override_settings(STREAMING_RESPONSES_ENABLED=streaming):
+            client.get(path)  # Прогрев: шаблоны и кэш фрагментов
+            for _ in range(requests):
+                tracemalloc.start()
+                started = time.perf_counter()
+                response = client.get(path)
+                chunks = iter(response.streaming_content) if response.streaming else iter([response.content])
+                first = next(chunks, b'')
+                ttfb += time.perf_counter() - started
+                size = len(first) + sum(len(chunk) for chunk in chunks)
+                total += time.perf_counter() - started
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+        return ttfb / requests * 1000, total / requests * 1000, peak / 1024 / 1024, size
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        # Кэш страниц выключен: потоковым бывает только ответ, который не пишется в кэш
+        with transaction.atomic(), uncounted_views(), override_settings(PAGE_CACHE_ENABLED=False):
+            path = self.create_day(options['events'])
+            client = Client(HTTP_HOST=settings.STATIC_EXPORT_HOST, HTTP_ACCEPT_ENCODING='gzip')
+            before = self.measure(client, path, False, requests)
+            after = self.measure(client, path, True, requests)
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{path}: событий {options["events"]}, запросов на вариант {requests}\n')
+        for title, (ttfb, total, peak, size) in (('обычный', before), ('потоковый', after)):
+            self.stdout.write(
+                f'  {title:10s} TTFB {ttfb:7.1f} мс, полностью {total:7.1f} мс, '
+                f'пик памяти {peak:6.1f} МБ, {size} байт (gzip)'
+            )
+        self.stdout.write(f'  разница TTFB: {before[0] - after[0]:+.1f} мс, памяти: {before[2] - after[2]:+.1f} МБ')
@@ -0,0 +1,41 @@
+"""
+Команда построения производных WebP/AVIF для уже загруженных изображений
+(main/responsive_images.py). Новые загрузки обрабатывает задача Celery.
+Использование: python manage.py build_image_derivatives [--force]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.responsive_images import build_derivatives, get_manifest, model_fields
+
+
+class Command(BaseCommand):
+    help = 'Строит производные WebP/AVIF нескольких ширин для всех изображений в моделях'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перестроить производные, даже если они уже есть',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        built = skipped = 0
+        seen = set()
+        for model, attname in model_fields():
+            names = model._default_manager.exclude(**{attname: ''}).exclude(**{f'{attname}__isnull': True})
+            for name in names.values_list(attname, flat=True).distinct():
+                if name in seen:
+                    continue
+                seen.add(name)
+                if not options['force'] and get_manifest(name):
+                    skipped += 1
+                    continue
+                if build_derivatives(name):
+                    built += 1
+                    self.stdout.write(f'  {model._meta.label}.{attname}: {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с: построено {built}, уже были {skipped}'
+        ))
@@ -0,0 +1,63 @@
+"""
+Команда отрисовки изображений Open Graph (main/og_utils.py) для уже
+созданных объектов OG_IMAGE_MODELS. Новые и измененные объекты
+обрабатывает задача Celery.
+Использование: python manage.py build_og_images [--force] [--workers N]
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from main.og_utils import og_job, og_models, og_name, write_og_files
+
+
+def _write(job):
+    return write_og_files(*job)
+
+
+class Command(BaseCommand):
+    help = 'Рисует изображения Open Graph (PNG и WebP) для всех объектов в пуле процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перерисовать изображения, даже если текущая версия уже есть',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Число процессов (по умолчанию — число ядер; 1 — без пула)',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        root = Path(settings.MEDIA_ROOT)
+        jobs = []
+        skipped = 0
+        for model in og_models():
+            for instance in model._default_manager.all():
+                if not options['force'] and (root / og_name(instance)).exists():
+                    skipped += 1
+                    continue
+                jobs.append(og_job(instance))
+
+        workers = options['workers'] or os.cpu_count() or 1
+        if workers > 1 and len(jobs) > 1:
+            # Рисование не обращается к БД; соединения не должны достаться дочерним процессам
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                files = sum(pool.map(_write, jobs, chunksize=8))
+        else:
+            files = sum(_write(job) for job in jobs)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с: нарисовано {len(jobs)} '
+            f'({files} файлов), уже были {skipped}'
+        ))
@@ -0,0 +1,217 @@
+"""
+Команда переноса загруженных файлов в хранилище по хешу содержимого
+(main/media_storage.py): одинаковые файлы сливаются в один, поля моделей
+получают имена blobs/<ab>/<cd>/<хеш>/<читаемое имя>, счетчики ссылок
+MediaBlob пересчитываются.
+
+Старые пути не удаляются сразу: на их месте остается жесткая ссылка на
+файл хранилища (место не занимает), производные WebP/AVIF старого файла
+тоже остаются. Кэш страниц, фрагменты и статический экспорт, которые еще
+содержат старые URL, продолжают их отдавать. Когда кэши обновятся (теги
+моделей меняются командой, экспорт планируется заново), старые пути
+удаляет запуск с --prune-old.
+
+Использование: python manage.py dedupe_media [--dry-run] [--prune-old]
+"""
+import os
+import posixpath
+import re
+import shutil
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import FileField, Q
+
+from main.cache_tags import bump_tags
+from main.media_storage import (
+    BLOB_PREFIX,
+    DERIVATIVE_NAME_RE,
+    blob_digest,
+    blob_name,
+    blob_path,
+    content_digest,
+    count_references,
+    is_blob_name,
+    storage_fields,
+)
+from main.models import MediaBlob
+from main.og_utils import OG_DIRECTORY
+from main.static_export import schedule_export
+
+
+class Command(BaseCommand):
+    help = 'Переносит загрузки в хранилище по хешу содержимого и удаляет одинаковые копии'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, сколько места освободится',
+        )
+        parser.add_argument(
+            '--prune-old',
+            action='store_true',
+            help='Удалить старые пути уже перенесенных файлов (после обновления кэшей)',
+        )
+
+    def handle(self, *args, **options):
+        if options['prune_old']:
+            self._prune_old(options['dry_run'])
+            return
+
+        dry_run = options['dry_run']
+        # Старое имя -> поля (модель, поле), где оно встречается
+        names = defaultdict(list)
+        storage = None
+        for model, field in storage_fields():
+            storage = field.storage
+            values = (
+                model._base_manager.exclude(Q(**{field.attname: ''}) | Q(**{f'{field.attname}__isnull': True}))
+                .values_list(field.attname, flat=True)
+                .distinct()
+            )
+            for name in values:
+                if not is_blob_name(name):
+                    names[name].append((model, field))
+        if storage is None:
+            self.stdout.write('Нет полей в хранилище по хешу (STORAGES["default"])')
+            return
+
+        moved = duplicates = missing = saved = 0
+        digests = set()
+        changed_models = set()
+        for name, fields in sorted(names.items()):
+            if not storage.exists(name):
+                missing += 1
+                self.stdout.write(self.style.WARNING(f'  нет файла: {name}'))
+                continue
+            with storage.open(name, 'rb') as file:
+                digest = content_digest(file)
+            new_name = blob_name(digest, name)
+            source = storage.path(name)
+            target = storage.path(blob_path(new_name))
+            duplicate = digest in digests or os.path.exists(target)
+            digests.add(digest)
+            if duplicate:
+                duplicates += 1
+                saved += os.path.getsize(source)
+                self.stdout.write(f'  копия: {name}')
+            else:
+                moved += 1
+            if dry_run:
+                continue
+
+            self._link(source, target)
+            with transaction.atomic():
+                for model, field in fields:
+                    model._base_manager.filter(**{field.attname: name}).update(**{field.attname: new_name})
+                    changed_models.add(model)
+
+        if not dry_run:
+            self._recount(storage)
+            # QuerySet.update() не отправляет сигналов: кэши и экспорт со старыми URL обновляются вручную
+            if changed_models:
+                bump_tags(*{model._meta.label_lower for model in changed_models})
+                schedule_export()
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Проверка" if dry_run else "Готово"}: перенесено {moved}, копий {duplicates} '
+            f'({saved / 1024 / 1024:.1f} МБ), нет файла {missing}'
+        ))
+        if moved and not dry_run:
+            self.stdout.write('Производные WebP/AVIF: python manage.py build_image_derivatives')
+            self.stdout.write('Старые пути после обновления кэшей: python manage.py dedupe_media --prune-old')
+
+    def _link(self, source, target):
+        """
+        Файл хранилища и жесткая ссылка на него по старому пути.
+        Без жестких ссылок (другая файловая система) — копия; место
+        освободит --prune-old.
+        """
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if not os.path.exists(target):
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copy2(source, target)
+            return
+        tmp = '%s.tmp%s' % (source, os.getpid())
+        try:
+            os.link(target, tmp)
+        except OSError:
+            return
+        os.replace(tmp, source)
+
+    def _prune_old(self, dry_run):
+        """
+        Удаляет файлы вне blobs/, на которые не ссылается ни одно поле и
+        содержимое которых уже есть в хранилище, вместе с их производными.
+        """
+        root = settings.MEDIA_ROOT
+        referenced = set()
+        for model, field in self._file_fields():
+            referenced.update(
+                model._base_manager.exclude(**{field.attname: ''}).values_list(field.attname, flat=True)
+            )
+        stored = set(MediaBlob.objects.values_list('digest', flat=True))
+
+        removed = size = 0
+        for directory, dirnames, filenames in os.walk(root):
+            relative = os.path.relpath(directory, root).replace(os.sep, '/')
+            if relative == '.':
+                dirnames[:] = [d for d in dirnames if d not in (BLOB_PREFIX.rstrip('/'), OG_DIRECTORY)]
+                relative = ''
+            for filename in filenames:
+                name = posixpath.join(relative, filename)
+                if name in referenced or DERIVATIVE_NAME_RE.search(filename):
+                    continue
+                path = os.path.join(directory, filename)
+                with open(path, 'rb') as file:
+                    digest = content_digest(File(file))
+                if digest not in stored:
+                    continue
+                removed += 1
+                size += os.path.getsize(path) if os.stat(path).st_nlink == 1 else 0
+                self.stdout.write(f'  старый путь: {name}')
+                if not dry_run:
+                    os.remove(path)
+                    self._remove_derivatives(directory, filename)
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Проверка" if dry_run else "Готово"}: старых путей {removed} ({size / 1024 / 1024:.1f} МБ)'
+        ))
+
+    def _file_fields(self):
+        """Все поля FileField (и вне хранилища по хешу)."""
+        for model in apps.get_models():
+            for field in model._meta.concrete_fields:
+                if isinstance(field, FileField):
+                    yield model, field
+
+    def _remove_derivatives(self, directory, filename):
+        """Производные main/responsive_images.py рядом со старым файлом."""
+        pattern = re.compile(re.escape(os.path.splitext(filename)[0]) + DERIVATIVE_NAME_RE.pattern)
+        for other in os.listdir(directory):
+            if pattern.match(other):
+                os.remove(os.path.join(directory, other))
+
+    def _recount(self, storage):
+        """Счетчики ссылок по фактическим значениям полей."""
+        blobs = set()
+        for model, field in storage_fields():
+            values = model._base_manager.filter(**{f'{field.attname}__startswith': BLOB_PREFIX})
+            for name in values.values_list(field.attname, flat=True):
+                if is_blob_name(name):
+                    blobs.add((blob_digest(name), blob_path(name)))
+        for digest, stored in blobs:
+            MediaBlob.objects.update_or_create(
+                digest=digest,
+                defaults={
+                    'name': stored,
+                    'size': storage.size(stored),
+                    'refcount': count_references(digest),
+                },
+            )
+
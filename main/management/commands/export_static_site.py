@@ -0,0 +1,61 @@
+"""
+Команда экспорта публичных страниц в статические HTML-файлы (main/static_export.py).
+Использование: python manage.py export_static_site [--full] [--workers N] [--output DIR]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.static_export import export_site
+
+
+class Command(BaseCommand):
+    help = 'Экспортирует публичные страницы в статические файлы (только изменившиеся)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Перерисовать все страницы, а не только затронутые изменениями',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Число процессов (по умолчанию STATIC_EXPORT_WORKERS или число CPU)',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Каталог экспорта (по умолчанию STATIC_EXPORT_ROOT)',
+        )
+        parser.add_argument(
+            '--host',
+            type=str,
+            default=None,
+            help='Хост, от имени которого рендерятся страницы (по умолчанию STATIC_EXPORT_HOST)',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        stats = export_site(
+            root=options['output'],
+            full=options['full'],
+            workers=options['workers'],
+            host=options['host'],
+            log=self.stdout.write,
+        )
+        if stats is None:
+            self.stdout.write(self.style.WARNING('Экспорт уже выполняется другим процессом'))
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nЭкспорт завершен за {time.monotonic() - started:.1f} с. "
+                f"Отрендерено: {stats['rendered']}, записано: {stats['written']}, "
+                f"без изменений: {stats['unchanged']}, с формами: {stats['dynamic']}, "
+                f"пропущено: {stats['skipped']}, "
+                f"удалено: {stats['removed']}, ошибок: {stats['failed']}"
+            )
+        )
@@ -0,0 +1,75 @@
+"""
+Команда прогрева кэшей после деплоя (main/cache_warmup.py).
+Использование: python manage.py warm_cache [--workers N] [--host HOST] [--slowest N]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.cache_warmup import warm_up
+
+
+def _ms(value):
+    return "—" if value is None else f"{value:.0f}"
+
+
+class Command(BaseCommand):
+    help = 'Прогревает кэши страниц, фрагментов и OG-изображений по картам сайта'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Число потоков (по умолчанию CACHE_WARMUP_WORKERS)',
+        )
+        parser.add_argument(
+            '--host',
+            type=str,
+            default=None,
+            help='Хост, от имени которого запрашиваются страницы (по умолчанию STATIC_EXPORT_HOST)',
+        )
+        parser.add_argument(
+            '--slowest',
+            type=int,
+            default=10,
+            help='Сколько самых медленных URL показать в отчете (0 — все URL)',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        results = warm_up(
+            workers=options['workers'],
+            host=options['host'],
+            log=self.stdout.write,
+        )
+        if results is None:
+            self.stdout.write(self.style.WARNING('Прогрев уже выполняется другим процессом'))
+            return
+
+        failed = [r for r in results if r['status'] != 200]
+        warmed = [r for r in results if r['status'] == 200]
+        og_images = [r for r in warmed if r.get('og_image')]
+
+        shown = sorted(warmed, key=lambda r: r['cold_ms'], reverse=True)
+        if options['slowest']:
+            shown = shown[:options['slowest']]
+        if shown:
+            self.stdout.write('\nХолодная / теплая задержка, мс:')
+            for r in shown:
+                line = f"  {_ms(r['cold_ms']):>6} / {_ms(r['warm_ms']):>5}  {r['path']}"
+                if r.get('og_image'):
+                    line += f"  (og:image {_ms(r['og_ms'])})"
+                self.stdout.write(line)
+        for r in failed:
+            self.stdout.write(self.style.WARNING(f"  HTTP {r['status']}: {r['path']}"))
+
+        cold = sum(r['cold_ms'] for r in warmed)
+        warm = sum(r['warm_ms'] for r in warmed)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nПрогрев завершен за {time.monotonic() - started:.1f} с. "
+                f"URL: {len(warmed)}, OG-изображений: {len(og_images)}, ошибок: {len(failed)}. "
+                f"Сумма задержек: холодная {cold:.0f} мс, теплая {warm:.0f} мс"
+            )
+        )
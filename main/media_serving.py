@@ -0,0 +1,211 @@
+"""
+Модуль media_serving.py приложения main
+
+Отдача медиа- и статических файлов без занятого на каждый байт воркера.
+
+Маршруты media/<path> и static/<path> раньше обслуживал
+django.views.static.serve: файл читался в Python и отдавался блоками,
+без диапазонов (Range) и с коротким кэшированием. Представление
+serve_file работает в одном из режимов MEDIA_SERVING_MODE:
+
+- "x-accel": ответ без тела с заголовком X-Accel-Redirect
+  (MEDIA_ACCEL_REDIRECT_PREFIX + путь), файл отдает nginx из internal
+  location;
+- "x-sendfile": заголовок X-Sendfile с абсолютным путем (Apache
+  mod_xsendfile, lighttpd);
+- "django" (по умолчанию): FileResponse — сервер с wsgi.file_wrapper
+  (gunicorn) отдает файл через sendfile без копирования в Python.
+  Поддерживается один диапазон байт (Range, If-Range, ответ 206).
+
+Во всех режимах ответ получает сильный ETag (размер и время изменения
+файла, как у nginx), Last-Modified и отвечает 304 на условные запросы.
+Имена с временной меткой RenameUploadTo (main/utils.py) и хешем
+манифеста статики не меняют содержимого — для них Cache-Control:
+public, max-age=год, immutable; остальные файлы кэшируются на
+MEDIA_CACHE_MAX_AGE и перепроверяются по ETag. Имена хранилища по хешу
+(blobs/<ab>/<cd>/<хеш>/<имя>, main/media_storage.py) отображаются на
+общий файл blobs/<ab>/<cd>/<хеш>.<расширение> и тоже неизменяемы.
+
+Пример nginx для режима "x-accel":
+    location /protected/media/ {
+        internal;
+        alias /srv/mysite/media/;
+    }
+"""
+
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .media_storage import blob_path
+
+# Время загрузки из RenameUploadTo: name_2024-01-15_14-30-45.jpg
+# (и производные main/responsive_images.py: name_2024-01-15_14-30-45.w640.webp)
+TIMESTAMPED_NAME_RE = re.compile(r"_\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}(?:\.w\d+)?\.\w+$")
+# Хеш ManifestStaticFilesStorage: style.3f2a9c1b7e4d.css
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{12}\.\w+$")
+# Файл хранилища по хешу содержимого (main/media_storage.py) и его производные
+CONTENT_NAME_RE = re.compile(r"^[0-9a-f]{32}(?:\.w\d+)?\.\w+$")
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+YEAR = 365 * 24 * 60 * 60
+
+
+def is_immutable(path):
+    """Имя файла меняется вместе с содержимым (метка времени или хеш)."""
+    name = posixpath.basename(path)
+    return bool(TIMESTAMPED_NAME_RE.search(name) or HASHED_NAME_RE.search(name) or CONTENT_NAME_RE.match(name))
+
+
+def file_etag(stat):
+    """Сильный ETag из времени изменения и размера (формат nginx)."""
+    return quote_etag("%x-%x" % (int(stat.st_mtime), stat.st_size))
+
+
+def parse_range(header, size):
+    """
+    Один диапазон байт из заголовка Range.
+
+    Returns:
+        tuple | None: (start, stop) с исключающим stop; None — отдать файл целиком
+    Raises:
+        ValueError: диапазон за пределами файла (ответ 416)
+    """
+    match = RANGE_RE.match(header.strip())
+    # Несколько диапазонов (multipart/byteranges) не поддерживаются — файл целиком
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Суффикс: последние N байт
+        if int(last) == 0:
+            raise ValueError(header)
+        start, stop = max(size - int(last), 0), size
+    else:
+        start = int(first)
+        # Неверный диапазон игнорируется (RFC 9110, 14.2)
+        if last and int(last) < start:
+            return None
+        stop = min(int(last) + 1, size) if last else size
+    if start >= size:
+        raise ValueError(header)
+    return start, stop
+
+
+class RangeFile:
+    """
+    Окно файла [start, stop) для FileResponse. fileno() остается доступен:
+    wsgi.file_wrapper gunicorn отправляет sendfile с текущей позиции файла
+    не больше Content-Length байт.
+    """
+
+    def __init__(self, file, start, stop):
+        self.file = file
+        self.name = file.name
+        self.remaining = stop - start
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def resolve_path(document_root, path):
+    """Абсолютный путь файла внутри document_root (как django.views.static.serve)."""
+    # blobs/.../<хеш>/<читаемое имя> -> файл blobs/.../<хеш>.<расширение>
+    path = blob_path(posixpath.normpath(path).lstrip("/"))
+    try:
+        fullpath = Path(safe_join(document_root, path))
+    except SuspiciousFileOperation:
+        raise Http404("Файл не найден")
+    if not fullpath.is_file():
+        raise Http404("Файл не найден")
+    return path, fullpath
+
+
+def serve_file(request, path, document_root=None, accel_prefix=None, immutable=None):
+    """
+    Отдает файл из document_root: через прокси (X-Accel-Redirect,
+    X-Sendfile) или FileResponse с диапазонами байт.
+
+    Args:
+        path (str): путь из URL
+        document_root (str): MEDIA_ROOT или STATIC_ROOT
+        accel_prefix (str): internal location nginx для этого каталога
+        immutable (bool): явный признак неизменяемости; по умолчанию по имени файла
+    """
+    path, fullpath = resolve_path(document_root, path)
+    stat = fullpath.stat()
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        mode = getattr(settings, "MEDIA_SERVING_MODE", "django")
+        content_type, encoding = mimetypes.guess_type(str(fullpath))
+        content_type = content_type or "application/octet-stream"
+        if mode == "x-accel":
+            response = HttpResponse(content_type=content_type)
+            response["X-Accel-Redirect"] = (accel_prefix or "/protected/media/") + path
+        elif mode == "x-sendfile":
+            response = HttpResponse(content_type=content_type)
+            response["X-Sendfile"] = str(fullpath)
+        else:
+            response = _file_response(request, fullpath, stat.st_size, etag, content_type)
+        if encoding:
+            response["Content-Encoding"] = encoding
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    if immutable is None:
+        immutable = is_immutable(path)
+    if immutable:
+        patch_cache_control(response, public=True, max_age=YEAR, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=getattr(settings, "MEDIA_CACHE_MAX_AGE", 3600))
+    return response
+
+
+def _file_response(request, fullpath, size, etag, content_type):
+    """FileResponse целиком или одного диапазона (206 / 416)."""
+    header = request.META.get("HTTP_RANGE", "")
+    if_range = request.META.get("HTTP_IF_RANGE")
+    # If-Range с другим валидатором: файл изменился, отдается целиком
+    if header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = "bytes */%d" % size
+            return response
+        if byte_range is not None:
+            start, stop = byte_range
+            response = FileResponse(RangeFile(open(fullpath, "rb"), start, stop), content_type=content_type)
+            response.status_code = 206
+            response["Content-Length"] = str(stop - start)
+            response["Content-Range"] = "bytes %d-%d/%d" % (start, stop - 1, size)
+            response["Accept-Ranges"] = "bytes"
+            return response
+
+    response = FileResponse(open(fullpath, "rb"), content_type=content_type)
+    response["Accept-Ranges"] = "bytes"
+    return response
+
@@ -0,0 +1,214 @@
+"""
+Модуль media_storage.py приложения main
+
+Хранилище загрузок по хешу содержимого с дедупликацией.
+
+RenameUploadTo давал каждой загрузке новое имя <slug>_<метка времени>
+в плоских каталогах (media/portfolio/images/, media/services/icons/…),
+поэтому повторная загрузка того же файла создавала копию. Хранилище
+ContentAddressedStorage (STORAGES["default"]) кладет содержимое в
+
+    blobs/<ab>/<cd>/<хеш>.<расширение>
+
+где хеш — первые 32 символа SHA-256. Одинаковые загрузки хранятся одним
+файлом, а в поле модели записывается имя
+
+    blobs/<ab>/<cd>/<хеш>/<читаемое имя>
+
+— читаемое имя от RenameUploadTo остается в URL, а путь к файлу
+вычисляется из хеша (blob_path). Запись MediaBlob считает ссылки:
+сигналы (main/signals.py) освобождают файл при удалении объекта или
+замене загрузки, и файл удаляется с диска, когда ссылок не осталось.
+
+Имена вне blobs/ (старые загрузки, резервные копии логов) работают как в
+FileSystemStorage. Перенос старых файлов: python manage.py dedupe_media
+"""
+
+import hashlib
+import logging
+import os
+import posixpath
+import re
+import tempfile
+from functools import lru_cache
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+logger = logging.getLogger(__name__)
+
+BLOB_PREFIX = "blobs/"
+DIGEST_LENGTH = 32
+# Читаемая часть имени укорачивается: поле FileField по умолчанию — 100 символов
+READABLE_NAME_LENGTH = 40
+
+BLOB_NAME_RE = re.compile(r"^blobs/([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{32})/([^/]+)$")
+# Производные main/responsive_images.py: <имя>.w640.webp
+DERIVATIVE_NAME_RE = re.compile(r"\.w\d+\.\w+$")
+
+
+def is_blob_name(name):
+    return bool(name) and BLOB_NAME_RE.match(name) is not None
+
+
+def blob_path(name):
+    """blobs/ab/cd/<хеш>/foto_2026-01-15.jpg -> blobs/ab/cd/<хеш>.jpg; остальные имена без изменений."""
+    match = BLOB_NAME_RE.match(name or "")
+    if not match:
+        return name
+    return blob_directory(match.group(3)) + match.group(3) + posixpath.splitext(match.group(4))[1].lower()
+
+
+def blob_directory(digest):
+    return "%s%s/%s/" % (BLOB_PREFIX, digest[:2], digest[2:4])
+
+
+def blob_digest(name):
+    match = BLOB_NAME_RE.match(name or "")
+    return match.group(3) if match else None
+
+
+def content_digest(content):
+    sha = hashlib.sha256()
+    if hasattr(content, "seek"):
+        content.seek(0)
+    for chunk in content.chunks():
+        sha.update(chunk)
+    return sha.hexdigest()[:DIGEST_LENGTH]
+
+
+def readable_name(name):
+    """Имя файла для URL: конец имени сохраняется, он содержит метку времени."""
+    basename = posixpath.basename(name)
+    if len(basename) <= READABLE_NAME_LENGTH:
+        return basename
+    stem, ext = posixpath.splitext(basename)
+    return stem[len(ext) - READABLE_NAME_LENGTH:].lstrip("._-") + ext
+
+
+def blob_name(digest, name):
+    """Имя для поля модели: blobs/<ab>/<cd>/<хеш>/<читаемое имя>."""
+    return "%s%s/%s" % (blob_directory(digest), digest, readable_name(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage, который хранит загрузки по хешу содержимого.
+
+    Имена вида blobs/.../<хеш>/<читаемое имя> отображаются на общий файл
+    (path, open, exists, size, delete); url() оставляет читаемое имя.
+    """
+
+    def path(self, name):
+        return super().path(blob_path(name))
+
+    def _save(self, name, content):
+        # Производные WebP/AVIF — и рядом с файлом хранилища, и рядом со старой
+        # загрузкой вне blobs/ — пишутся как есть: srcset ссылается на их имена
+        name = name.replace("\\", "/")
+        if name.startswith(BLOB_PREFIX) or DERIVATIVE_NAME_RE.search(name):
+            return super()._save(name, content)
+
+        from .models import MediaBlob
+
+        digest = content_digest(content)
+        stored = blob_path(blob_name(digest, name))
+        full_path = super().path(stored)
+        if not os.path.exists(full_path):
+            self._write(full_path, content)
+        else:
+            logger.debug(f"Загрузка {name} совпала с {stored}, копия не создается")
+
+        with transaction.atomic():
+            blob, _ = MediaBlob.objects.get_or_create(
+                digest=digest, defaults={"name": stored, "size": os.path.getsize(full_path)}
+            )
+            MediaBlob.objects.filter(pk=blob.pk).update(refcount=F("refcount") + 1)
+        return blob_name(digest, name)
+
+    def _write(self, full_path, content):
+        """Атомарная запись: параллельная загрузка того же файла не видит половину."""
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    out.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp, self.file_permissions_mode)
+            os.replace(tmp, full_path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def delete(self, name):
+        """
+        Для имен blobs/.../<хеш>/<имя> освобождает одну ссылку; файл и его
+        производные удаляются, когда ссылок не осталось.
+        """
+        digest = blob_digest(name)
+        if digest is None:
+            return super().delete(name)
+
+        from .models import MediaBlob
+
+        with transaction.atomic():
+            MediaBlob.objects.filter(digest=digest, refcount__gt=0).update(refcount=F("refcount") - 1)
+            blob = MediaBlob.objects.select_for_update().filter(digest=digest).first()
+            if blob is None or blob.refcount > 0:
+                return
+            references = count_references(digest)
+            if references:
+                # Ссылки, созданные без загрузки (копирование имени), не были посчитаны
+                blob.refcount = references
+                blob.save(update_fields=["refcount"])
+                return
+            blob.delete()
+
+        stored = blob_path(name)
+        stem = posixpath.splitext(stored)[0]
+        directory = posixpath.dirname(stored)
+        _, files = self.listdir(directory)
+        for filename in files:
+            if posixpath.join(directory, filename).startswith(stem):
+                super().delete(posixpath.join(directory, filename))
+
+
+@lru_cache(maxsize=None)
+def blob_fields(model):
+    """Файловые поля модели в ContentAddressedStorage."""
+    return tuple(
+        field for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage)
+    )
+
+
+def storage_fields():
+    """Пары (модель, поле) всех файловых полей в ContentAddressedStorage."""
+    for model in apps.get_models():
+        for field in blob_fields(model):
+            yield model, field
+
+
+def count_references(digest):
+    """Число записей, которые ссылаются на файл с этим хешом."""
+    prefix = blob_directory(digest) + digest + "/"
+    return sum(
+        model._base_manager.filter(**{f"{field.attname}__startswith": prefix}).count()
+        for model, field in storage_fields()
+    )
+
+
+def release(storage, name):
+    """Освобождает ссылку на файл (сигналы вызывают после фиксации транзакции)."""
+    try:
+        storage.delete(name)
+    except OSError as exc:
+        logger.warning(f"Файл {name} не удален: {exc}")
@@ -0,0 +1,257 @@
+"""
+Модуль middleware.py приложения main
+
+Промежуточные обработчики (middleware) приложения main.
+"""
+
+from django.conf import settings
+from django.contrib import messages
+from django.http import HttpResponse
+from django.middleware.gzip import GZipMiddleware
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+
+from . import compression, preload
+from .cache_tags import record_dependencies
+from .conditional import conditional_response, set_validators
+from .html_minify import minify
+from .request_cache import request_scope
+from .page_cache import (
+    CSRF_PLACEHOLDER,
+    fill_holes,
+    get_page,
+    is_cached_view,
+    is_service_render,
+    page_cache_key,
+    store_page,
+)
+from .view_counters import count_view
+
+
+class RequestCacheMiddleware:
+    """
+    Открывает кэш уровня запроса (main/request_cache.py) для представлений,
+    контекстных процессоров и шаблонных тегов. Ставится в начало MIDDLEWARE.
+    При DEBUG добавляет заголовок X-Request-Cache: hits=N; misses=M.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_scope() as store:
+            response = self.get_response(request)
+        if settings.DEBUG:
+            response["X-Request-Cache"] = "hits=%d; misses=%d" % (store.hits, store.misses)
+        return response
+
+
+class EarlyHintsMiddleware:
+    """
+    Предзагрузка стилей и скриптов базового шаблона (см. main/preload.py):
+    103 Early Hints до выполнения представления (если сервер передает
+    wsgi.early_hints) и заголовок Link в HTML-ответе. Ставится перед
+    кэшем страниц — подсказки уходят и до поиска страницы в кэше.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not preload.wants_preload(request):
+            return self.get_response(request)
+
+        links = preload.preload_links()
+        send_early_hints = request.META.get("wsgi.early_hints")
+        if links and callable(send_early_hints):
+            send_early_hints([("Link", value) for value in links])
+
+        response = self.get_response(request)
+        if (
+            links
+            and response.status_code == 200
+            and "text/html" in response.get("Content-Type", "")
+            and not response.has_header("Link")
+        ):
+            response["Link"] = ", ".join(links)
+        return response
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Сжатие ответов brotli/gzip (см. main/compression.py). Общие ответы
+    (response.compress_shared) сжимаются один раз и берутся из кэша,
+    персональные — дешевым gzip. Потоковые ответы сжимаются gzip с flush
+    после каждой части.
+    Стоит на месте GZipMiddleware — до middleware, формирующих ответ.
+    """
+
+    def process_response(self, request, response):
+        # Изображения, шрифты, архивы уже сжаты
+        if not compression.is_compressible(response.get("Content-Type", "")):
+            return response
+        # Файлы (main/media_serving.py) уходят как есть: sendfile и диапазоны байт
+        if getattr(response, "file_to_stream", None) is not None:
+            return response
+        if response.streaming:
+            if response.is_async or response.has_header("Content-Encoding"):
+                return super().process_response(request, response)
+            return self._compress_stream(request, response)
+        if len(response.content) < compression.MIN_LENGTH or response.has_header("Content-Encoding"):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        shared = getattr(response, "compress_shared", False)
+        encoding = compression.negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""), shared)
+        if encoding is None:
+            return response
+
+        if shared:
+            content, hit = compression.cached_compress(response.content, encoding)
+            if settings.DEBUG:
+                response["X-Compression-Cache"] = "HIT" if hit else "MISS"
+        else:
+            content = compression.compress_dynamic(response.content)
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response.headers["Content-Length"] = str(len(content))
+
+        # Сильный ETag становится слабым (RFC 9110, 8.8.1), как в GZipMiddleware
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    @staticmethod
+    def _compress_stream(request, response):
+        """Потоковый ответ: gzip с flush после каждой части (main/streaming.py)."""
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if compression.negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""), shared=False) is None:
+            return response
+        response.streaming_content = compression.compress_stream(response.streaming_content)
+        del response.headers["Content-Length"]
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "gzip"
+        return response
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Кэш полных страниц для анонимных посетителей (см. main/page_cache.py).
+
+    Страница из кэша отдается до вызова представления и контекстных
+    процессоров; в нее подставляются только «дырки» (корзина) и CSRF-токен,
+    а для страниц деталей учитывается просмотр (main/view_counters.py).
+    При промахе представление выполняется как обычно, а ответ сохраняется
+    вместе с тегами прочитанных моделей (HTML перед записью минифицируется,
+    main/html_minify.py).
+
+    Должен стоять после SessionMiddleware, CsrfViewMiddleware,
+    AuthenticationMiddleware и MessageMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        match = self._match(request)
+        if match is None:
+            return self._fill(self.get_response(request), request)
+
+        key = page_cache_key(request)
+        entry = get_page(key)
+        if entry is not None:
+            count_view(match.view_name, match.kwargs)
+            validators = entry.get("validators")
+            if validators:
+                # Условный GET: 304 без подстановки «дырок»
+                response = conditional_response(request, *validators)
+                if response is not None:
+                    return response
+            response = HttpResponse(
+                fill_holes(entry["content"], request), content_type=entry["content_type"]
+            )
+            if validators:
+                set_validators(response, request, *validators)
+            response["X-Page-Cache"] = "HIT"
+            response.compress_shared = self._is_shared(request, entry["content"])
+            # Ключ страницы различает полный вариант и блок результатов HTMX
+            patch_vary_headers(response, ("Cookie", "HX-Request"))
+            return response
+
+        request._page_cache_recording = True
+        try:
+            with record_dependencies() as tags:
+                response = self.get_response(request)
+        finally:
+            request._page_cache_recording = False
+
+        if request.method == "GET" and self._is_cacheable(request, response):
+            # Минифицированный HTML уходит и в кэш, и в текущий ответ
+            html = minify(response.content.decode(response.charset))
+            response.content = html
+            content = store_page(
+                key,
+                html,
+                response["Content-Type"],
+                tags,
+                getattr(response, "content_validator", None),
+            )
+            response["X-Page-Cache"] = "MISS"
+            response.compress_shared = self._is_shared(request, content)
+        # Тот же Vary, что у ответа из кэша: промах не должен попасть в общий кэш
+        # прокси как ответ для всех вариантов
+        patch_vary_headers(response, ("Cookie", "HX-Request"))
+        return self._fill(response, request)
+
+    def _match(self, request):
+        """Возвращает ResolverMatch, если запрос можно обслужить из кэша."""
+        if not getattr(settings, "PAGE_CACHE_ENABLED", True) or is_service_render():
+            return None
+        if request.method not in ("GET", "HEAD") or request.user.is_authenticated:
+            return None
+        try:
+            match = resolve(request.path_info, getattr(request, "urlconf", None))
+        except Resolver404:
+            return None
+        if not is_cached_view(match.view_name):
+            return None
+        # Страница с непоказанными сообщениями персональна
+        if len(messages.get_messages(request)):
+            return None
+        return match
+
+    @staticmethod
+    def _is_cacheable(request, response):
+        if response.status_code != 200 or response.streaming or response.cookies:
+            return False
+        if "text/html" not in response.get("Content-Type", ""):
+            return False
+        cache_control = response.get("Cache-Control", "")
+        if "private" in cache_control or "no-store" in cache_control:
+            return False
+        session = getattr(request, "session", None)
+        return not (session is not None and session.modified)
+
+    @staticmethod
+    def _is_shared(request, content):
+        """
+        Одинакова ли страница для всех анонимов (сжимается один раз): без
+        CSRF-токена и без сессии (корзина в «дырке» пуста).
+        """
+        return CSRF_PLACEHOLDER not in content and settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+    @staticmethod
+    def _fill(response, request):
+        """Заполняет «дырки» в HTML-ответе (в т.ч. отрендеренном при записи в кэш)."""
+        if (
+            not response.streaming
+            and "text/html" in response.get("Content-Type", "")
+            and b"<!--page-hole:" in response.content
+        ):
+            response.content = fill_holes(response.content.decode(response.charset), request)
+        return response
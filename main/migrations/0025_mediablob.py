@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-18 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0024_sitesettings_description_of_services_block_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=32, unique=True, verbose_name='Хеш содержимого')),
+                ('name', models.CharField(max_length=100, verbose_name='Путь файла')),
+                ('size', models.PositiveBigIntegerField(default=0, verbose_name='Размер, байт')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата загрузки')),
+            ],
+            options={
+                'verbose_name': 'Файл хранилища',
+                'verbose_name_plural': 'Файлы хранилища',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -397,4 +397,24 @@ class AnalyticsScript(ActiveModel):
         ordering = ["position", "name"]
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+class MediaBlob(models.Model):
+    """
+    Файл в хранилище по хешу содержимого (main/media_storage.py).
+    Одинаковые загрузки хранятся одним файлом; счетчик ссылок позволяет
+    удалить файл, только когда на него не ссылается ни одна запись.
+    """
+    digest = models.CharField(max_length=32, unique=True, verbose_name="Хеш содержимого")
+    name = models.CharField(max_length=100, verbose_name="Путь файла")
+    size = models.PositiveBigIntegerField(default=0, verbose_name="Размер, байт")
+    refcount = models.PositiveIntegerField(default=0, verbose_name="Число ссылок")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата загрузки")
+
+    class Meta:
+        verbose_name = "Файл хранилища"
+        verbose_name_plural = "Файлы хранилища"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return self.name
@@ -1,8 +1,63 @@
+"""
+Модуль og_utils.py приложения main
+
+Изображения Open Graph (1200x630).
+
+Для новостей, работ портфолио, услуг, страниц и статей базы знаний
+(OG_IMAGE_MODELS) изображение рисуется заранее: после сохранения объекта
+сигнал ставит задачу Celery images.og (без брокера — отдельный поток), и
+файлы PNG и WebP (OG_IMAGE_FORMATS) записываются в MEDIA_ROOT:
+
+    og/<app_label>.<model>/<pk>.<хеш текста>.png
+
+Хеш меняется вместе с заголовком и подзаголовком, поэтому файлы отдаются
+как статика с Cache-Control: immutable (main/media_serving.py), а
+прежние версии удаляются. Тег {% og_image_url news %} выводит абсолютный
+URL готового файла; пока его нет — URL представления og_image, которое
+рисует картинку по параметрам запроса и кэширует PNG.
+
+Шрифты (OG_IMAGE_FONT, fonts/Inter-Bold.ttf из статики или системный
+DejaVu Sans) и фон с линиями загружаются и рисуются один раз на процесс.
+
+Изображения для уже созданных объектов: python manage.py build_og_images
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
 from django.http import HttpResponse
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
 from PIL import Image, ImageDraw, ImageFont
-import os
-from django.core.cache import cache
-import hashlib
+
+from .single_flight import get_or_compute
+
+logger = logging.getLogger(__name__)
+
+WIDTH, HEIGHT = 1200, 630
+OG_DIRECTORY = "og"
+# Меняется при изменении оформления: все изображения перерисовываются
+RENDER_VERSION = "1"
+
+SYSTEM_FONTS = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf",
+    "arial.ttf",
+)
+
+THEMES = {
+    "dark": {"bg": (20, 20, 25), "text": (255, 255, 255), "accent": (52, 152, 219)},
+    "light": {"bg": (245, 245, 250), "text": (40, 40, 50), "accent": (41, 128, 185)},
+}
+
 
 def generate_og_image(request):
     """
@@ -12,61 +67,210 @@ def generate_og_image(request):
     title = request.GET.get('title', 'DPIT-CMS')
     subtitle = request.GET.get('subtitle', 'Современная система управления контентом')
     theme = request.GET.get('theme', 'dark') # dark, light, season
-    
-    # Кеширование по хешу параметров
+
+    # Кеширование по хешу параметров; одновременные запросы одной картинки рисуют ее один раз
     cache_key = f"og_image_{hashlib.md5((title + subtitle + theme).encode()).hexdigest()}"
-    cached_img = cache.get(cache_key)
-    if cached_img:
-        return HttpResponse(cached_img, content_type="image/png")
-
-    # Создаем изображение 1200x630 (стандарт OG)
-    width, height = 1200, 630
-    if theme == 'dark':
-        bg_color = (20, 20, 25)
-        text_color = (255, 255, 255)
-        accent_color = (52, 152, 219)
-    else:
-        bg_color = (245, 245, 250)
-        text_color = (40, 40, 50)
-        accent_color = (41, 128, 185)
+    img_data = get_or_compute(
+        cache_key,
+        lambda: render_og_image(title, subtitle, theme),
+        60*60*24, # 24 часа
+        name="og_image",
+    )
+    return HttpResponse(img_data, content_type="image/png")
+
+
+@lru_cache(maxsize=1)
+def font_path():
+    """Путь к шрифту с кириллицей; ищется один раз на процесс."""
+    configured = getattr(settings, "OG_IMAGE_FONT", None)
+    if configured and os.path.exists(configured):
+        return configured
+    from django.contrib.staticfiles import finders
+
+    found = finders.find('fonts/Inter-Bold.ttf')
+    if found and os.path.exists(found):
+        return found
+    for candidate in SYSTEM_FONTS:
+        if os.path.exists(candidate):
+            return candidate
+    return None
 
-    img = Image.new('RGB', (width, height), color=bg_color)
+
+@lru_cache(maxsize=8)
+def load_font(size):
+    """Объект шрифта нужного размера (ImageFont.truetype читает файл — только один раз)."""
+    path = font_path()
+    if path:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            pass
+    # Последний рубеж - дефолтный шрифт (может не поддерживать кириллицу!)
+    return ImageFont.load_default(size)
+
+
+@lru_cache(maxsize=4)
+def background(theme):
+    """Фон с линиями для темы; рисуется один раз, дальше копируется."""
+    colors = THEMES.get(theme, THEMES["light"])
+    img = Image.new('RGB', (WIDTH, HEIGHT), color=colors["bg"])
     draw = ImageDraw.Draw(img)
-    
     # Рисуем градиент или узоры (упрощенно - линии)
-    for i in range(0, width, 40):
-        draw.line([(i, 0), (i+200, height)], fill=(accent_color[0], accent_color[1], accent_color[2], 30), width=1)
-
-    # Загрузка шрифта
-    try:
-        from django.contrib.staticfiles import finders
-        # Пытаемся найти Inter-Bold в статике (ищет в STATICFILES_DIRS и папках приложений)
-        font_path = finders.find('fonts/Inter-Bold.ttf')
-        
-        if not font_path or not os.path.exists(font_path):
-             # Fallback для Windows (Arial обычно поддерживает кириллицу)
-             font_path = "arial.ttf"
-        
-        font_title = ImageFont.truetype(font_path, 80)
-        font_sub = ImageFont.truetype(font_path, 40)
-    except Exception:
-        # Последний рубеж - дефолтный шрифт (может не поддерживать кириллицу!)
-        font_title = ImageFont.load_default()
-        font_sub = ImageFont.load_default()
-
-    # Рисуем текст
-    draw.text((80, 200), title, font=font_title, fill=text_color)
-    draw.text((80, 320), subtitle, font=font_sub, fill=(text_color[0], text_color[1], text_color[2], 180))
-    
+    for i in range(0, WIDTH, 40):
+        draw.line([(i, 0), (i+200, HEIGHT)], fill=colors["accent"], width=1)
     # Рисуем маркер бренда
-    draw.rectangle([80, 180, 200, 190], fill=accent_color)
+    draw.rectangle([80, 180, 200, 190], fill=colors["accent"])
+    return img
 
-    # Сохраняем в память
-    from io import BytesIO
+
+def draw_og_image(title, subtitle, theme):
+    """Рисует изображение Open Graph (PIL.Image)."""
+    colors = THEMES.get(theme, THEMES["light"])
+    img = background(theme).copy()
+    draw = ImageDraw.Draw(img)
+    draw.text((80, 200), title, font=load_font(80), fill=colors["text"])
+    draw.text((80, 320), subtitle, font=load_font(40), fill=colors["text"])
+    return img
+
+
+def encode(img, fmt):
+    """
+    PNG — палитра из 256 цветов и optimize (примерно вдвое меньше),
+    WebP — без потерь: на тексте и плоских цветах он меньше и PNG, и WebP
+    с потерями (11 КБ против 15 КБ и 75 КБ).
+    """
     buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    img_data = buffer.getvalue()
-    
-    cache.set(cache_key, img_data, 60*60*24) # 24 часа
-    
-    return HttpResponse(img_data, content_type="image/png")
+    if fmt == "webp":
+        img.save(buffer, format="WEBP", lossless=True)
+    else:
+        img.quantize(colors=256).save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def render_og_image(title, subtitle, theme):
+    """Рисует изображение Open Graph и возвращает PNG (bytes)."""
+    return encode(draw_og_image(title, subtitle, theme), "png")
+
+
+# ---------------------------------------------------------------------------
+# Заранее нарисованные изображения объектов
+# ---------------------------------------------------------------------------
+
+def is_enabled():
+    return getattr(settings, "OG_IMAGES_ENABLED", True)
+
+
+def formats():
+    return tuple(getattr(settings, "OG_IMAGE_FORMATS", ("png", "webp")))
+
+
+def theme():
+    return getattr(settings, "OG_IMAGE_THEME", "dark")
+
+
+@lru_cache(maxsize=None)
+def og_models():
+    """Модели из OG_IMAGE_MODELS (метки "app_label.Model")."""
+    return tuple(apps.get_model(label) for label in getattr(settings, "OG_IMAGE_MODELS", ()))
+
+
+def og_text(instance):
+    """Заголовок и подзаголовок: мета-описание или начало описания объекта."""
+    title = getattr(instance, "title", "") or str(instance)
+    subtitle = getattr(instance, "meta_description", "")
+    if not subtitle:
+        for attr in ("short_description", "description", "content"):
+            subtitle = strip_tags(getattr(instance, attr, "") or "").strip()
+            if subtitle:
+                break
+    return title, Truncator(" ".join(subtitle.split())).chars(100)
+
+
+def og_stem(instance):
+    """og/news.news/15 — общая часть имен файлов объекта."""
+    return "%s/%s/%s" % (OG_DIRECTORY, instance._meta.label_lower, instance.pk)
+
+
+def text_digest(title, subtitle, theme_name):
+    """Хеш текста, темы и версии оформления — часть имени файла."""
+    return hashlib.sha1("\0".join((RENDER_VERSION, theme_name, title, subtitle)).encode()).hexdigest()[:12]
+
+
+def og_name(instance, fmt=None):
+    """og/news.news/15.<хеш>.png"""
+    return "%s.%s.%s" % (og_stem(instance), text_digest(*og_text(instance), theme()), fmt or formats()[0])
+
+
+def write_og_files(stem, title, subtitle, theme_name, fmts):
+    """
+    Рисует изображение и записывает его во всех форматах; удаляет прежние
+    версии. Не обращается к БД — выполняется и в процессах пула.
+
+    Args:
+        stem (str): og/<модель>/<pk> относительно MEDIA_ROOT
+    """
+    path = Path(settings.MEDIA_ROOT) / stem
+    path.parent.mkdir(parents=True, exist_ok=True)
+    img = draw_og_image(title, subtitle, theme_name)
+    written = set()
+    for fmt in fmts:
+        target = path.with_name("%s.%s.%s" % (path.name, text_digest(title, subtitle, theme_name), fmt))
+        tmp = target.with_name(".%s.tmp%s" % (target.name, os.getpid()))
+        tmp.write_bytes(encode(img, fmt))
+        os.replace(tmp, target)
+        written.add(target.name)
+    remove_og_files(stem, keep=written)
+    return len(written)
+
+
+def remove_og_files(stem, keep=()):
+    """Удаляет файлы объекта (og/<модель>/<pk>.*), кроме keep."""
+    path = Path(settings.MEDIA_ROOT) / stem
+    for old in path.parent.glob(path.name + ".*"):
+        if old.name not in keep:
+            old.unlink(missing_ok=True)
+
+
+def og_job(instance):
+    """Аргументы write_og_files для объекта."""
+    return (og_stem(instance), *og_text(instance), theme(), formats())
+
+
+def build_og_image(instance):
+    """Рисует изображения объекта, если текущей версии еще нет. Returns: bool — нарисовано."""
+    if (Path(settings.MEDIA_ROOT) / og_name(instance)).exists():
+        return False
+    write_og_files(*og_job(instance))
+    return True
+
+
+def og_image_url(instance):
+    """URL готового изображения объекта или None, если оно еще не нарисовано."""
+    name = og_name(instance)
+    if (Path(settings.MEDIA_ROOT) / name).exists():
+        return settings.MEDIA_URL + name
+    return None
+
+
+def schedule_og_image(label, pk):
+    """Ставит отрисовку в очередь Celery (без брокера — отдельный поток)."""
+    if not is_enabled():
+        return
+
+    from .tasks import build_og_image_task
+
+    try:
+        build_og_image_task.delay(label, pk)
+    except Exception as exc:
+        logger.warning(f"Не удалось отправить задачу в Celery ({exc}), OG-изображение {label} {pk} в отдельном потоке...")
+
+        def fallback_run():
+            try:
+                build_og_image_task(label, pk)
+            except Exception as e:
+                logger.error(f"Ошибка при фолбэк-отрисовке OG-изображения {label} {pk}: {e}")
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=fallback_run, daemon=True)
+        thread.start()
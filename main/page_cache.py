@@ -0,0 +1,161 @@
+"""
+Модуль page_cache.py приложения main
+
+Кэш полных страниц для анонимных GET-запросов.
+
+Ключ страницы — схема, хост, сезонная тема, признак HTMX-запроса и путь
+с query string. Страница сохраняется вместе с тегами всех моделей, данные
+которых были прочитаны при рендере (main/cache_tags.py), поэтому изменение
+любого показанного объекта делает ее устаревшей.
+
+Небольшие персональные части страницы («дырки») не попадают в кэш:
+- {% page_hole "name" %} выводит при записи метку, а при отдаче на место
+  метки подставляется шаблон templates/includes/holes/<name>.html,
+  отрендеренный с минимальным контекстом (request, user, csrf_token и
+  процессоры из PAGE_CACHE_HOLE_CONTEXT_PROCESSORS — корзина);
+- значения CSRF-токенов в формах заменяются меткой и при отдаче
+  подставляется токен текущего посетителя.
+
+Ссылки входа/профиля и кнопки избранного зависят только от того, вошел ли
+пользователь, а кэш используется только для анонимных посетителей, поэтому
+для них отдельные «дырки» не нужны.
+
+Служебный рендер (статический экспорт) идет внутри service_render(): для
+запросов этого потока кэш страниц и потоковые ответы не используются, а
+настройки и остальные запросы процесса не затрагиваются.
+
+Middleware: main/middleware.py -> AnonymousPageCacheMiddleware.
+"""
+
+import hashlib
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.middleware.csrf import get_token
+from django.template import Context
+from django.template.loader import get_template
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+from mysite.context_processors import season_theme
+
+from .cache_tags import get_tagged, set_tagged
+from .htmx import is_htmx
+
+# Префикс ключей страниц в кэше
+PAGE_CACHE_PREFIX = "page:"
+
+_service_render = ContextVar("page_cache_service_render", default=False)
+
+HOLE_MARKER = "<!--page-hole:%s-->"
+HOLE_RE = re.compile(r"<!--page-hole:([\w-]+)-->")
+CSRF_PLACEHOLDER = "<!--page-csrf-->"
+CSRF_VALUE_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+@contextmanager
+def service_render():
+    """Запросы внутри блока рендерятся без кэша страниц и потоковых ответов."""
+    token = _service_render.set(True)
+    try:
+        yield
+    finally:
+        _service_render.reset(token)
+
+
+def is_service_render():
+    return _service_render.get()
+
+
+def is_cached_view(view_name):
+    """Входит ли имя URL ("news:detail") в PAGE_CACHE_VIEWS (поддерживается "news:*")."""
+    for pattern in getattr(settings, "PAGE_CACHE_VIEWS", ()):
+        if pattern == view_name or (
+            pattern.endswith(":*") and view_name.startswith(pattern[:-1])
+        ):
+            return True
+    return False
+
+
+def page_cache_key(request):
+    """Ключ страницы: схема, хост, сезон, вариант (блок результатов HTMX) и полный путь."""
+    parts = "|".join(
+        (
+            request.scheme,
+            request.get_host(),
+            season_theme(request)["current_season"],
+            "partial" if is_htmx(request) else "",
+            request.get_full_path(),
+        )
+    )
+    return PAGE_CACHE_PREFIX + hashlib.md5(parts.encode()).hexdigest()
+
+
+def get_page(key):
+    """Возвращает сохраненную страницу или None, если ее нет или данные изменились."""
+    return get_tagged(key)
+
+
+def store_page(key, content, content_type, tags, validators=None):
+    """
+    Сохраняет страницу с метками вместо CSRF-токенов.
+
+    Args:
+        content (str): HTML с метками «дырок»
+        tags (iterable): теги моделей, прочитанных при рендере
+        validators (tuple | None): (валидатор, last_modified) из main/conditional.py
+
+    Returns:
+        str: сохраненный HTML (с метками)
+    """
+    content = CSRF_VALUE_RE.sub(r"\g<1>%s\g<2>" % CSRF_PLACEHOLDER, content)
+    set_tagged(
+        key,
+        {"content": content, "content_type": content_type, "validators": validators},
+        sorted(tags),
+        getattr(settings, "PAGE_CACHE_TIMEOUT", 600),
+    )
+    return content
+
+
+def _hole_context(request):
+    """Минимальный контекст для шаблонов «дырок»."""
+    values = {
+        "request": request,
+        "user": request.user,
+        "csrf_token": SimpleLazyObject(lambda: get_token(request)),
+    }
+    for path in getattr(settings, "PAGE_CACHE_HOLE_CONTEXT_PROCESSORS", ()):
+        values.update(import_string(path)(request))
+    return Context(values)
+
+
+def hole_template_name(name):
+    return "includes/holes/%s.html" % name
+
+
+def fill_holes(content, request):
+    """
+    Подставляет в страницу персональные части и CSRF-токен посетителя.
+    Каждый шаблон «дырки» рендерится один раз, контекст создается лениво.
+    """
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+    if "<!--page-hole:" not in content:
+        return content
+
+    context = None
+    rendered = {}
+
+    def render_hole(match):
+        nonlocal context
+        name = match.group(1)
+        if name not in rendered:
+            if context is None:
+                context = _hole_context(request)
+            rendered[name] = get_template(hole_template_name(name)).template.render(context)
+        return rendered[name]
+
+    return HOLE_RE.sub(render_hole, content)
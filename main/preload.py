@@ -0,0 +1,154 @@
+"""
+Модуль preload.py приложения main
+
+Предзагрузка критичной статики: заголовки Link: rel=preload и 103 Early Hints.
+
+Все страницы сайта наследуют base.html и подключают одни и те же
+css/js из static/ через {% static %}, но браузер узнает о них только
+после разбора <head>. Список файлов собирается из скомпилированного
+шаблона: узлы {% static '...' %} с постоянным путем в самом базовом
+шаблоне и в подключаемых им {% include '...' %} (шапка, подвал), если
+узел стоит в атрибуте тега <link> или <script>. Ветки {% if %} и тела
+{% for %} пропускаются: условия при обходе не вычисляются, а файл,
+подключенный только на части страниц (css/category-bl.css в hero.html —
+на главной и в новостях), не должен предзагружаться на всех.
+Берутся стили, скрипты и шрифты; адреса строятся через хранилище
+статики, поэтому имена с хэшем из манифеста
+CompressedManifestStaticFilesStorage подставляются правильно.
+Результат запоминается на процесс (манифест меняется только при деплое).
+
+EarlyHintsMiddleware для навигационных запросов (Accept: text/html, не
+HTMX) отправляет 103 Early Hints через wsgi.early_hints (gunicorn 22+)
+до выполнения представления и кэша страниц, а HTML-ответу добавляет
+заголовок Link — по нему 103 формируют nginx и CDN, если сервер
+приложения их не отправляет.
+
+Настройки: PRELOAD_TEMPLATES — базовые шаблоны (по умолчанию
+["base.html"]), PRELOAD_ENABLED.
+"""
+
+import logging
+import os
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist, engines
+from django.template.base import TextNode
+from django.template.defaulttags import ForNode, IfNode
+from django.template.loader_tags import IncludeNode
+from django.templatetags.static import StaticNode, static
+
+logger = logging.getLogger(__name__)
+
+# Расширение файла -> значение атрибута as
+PRELOAD_TYPES = {
+    ".css": "style",
+    ".js": "script",
+    ".mjs": "script",
+    ".woff2": "font",
+    ".woff": "font",
+}
+
+# Ссылки, которые браузер загружает сам (не адреса в коде скриптов, как sw.js)
+LINK_TAG_RE = re.compile(r"<(link|script)\b", re.I)
+
+# Глубина обхода {% include %} от базового шаблона
+MAX_INCLUDE_DEPTH = 2
+
+
+def _literal(filter_expression):
+    """Строковая константа выражения шаблона ('css/style.css') или None."""
+    # Константа в кавычках хранится уже строкой, переменная — объектом Variable
+    var = filter_expression.var
+    if filter_expression.filters or not isinstance(var, str):
+        return None
+    return str(var)
+
+
+def _walk(nodelist):
+    """
+    Узлы шаблона по порядку вместе с текстом, стоящим непосредственно перед
+    узлом; без узлов внутри {% if %} и {% for %}.
+    """
+    previous = ""
+    for node in nodelist:
+        yield node, previous
+        previous = node.s if isinstance(node, TextNode) else ""
+        if isinstance(node, (IfNode, ForNode)):
+            continue
+        for attr in node.child_nodelists:
+            child = getattr(node, attr, None)
+            if child:
+                yield from _walk(child)
+
+
+def _in_tag_attribute(previous_text):
+    """Стоит ли узел внутри открывающего тега <link ...> или <script ...> (а не в коде скрипта)."""
+    fragment = previous_text[previous_text.rfind("<"):]
+    return ">" not in fragment and LINK_TAG_RE.match(fragment) is not None
+
+
+def template_assets(template_name, depth=0):
+    """
+    Пути статики (css/js/шрифты), на которые ссылается шаблон и его {% include %}.
+
+    Returns:
+        list: пути относительно STATIC_URL в порядке появления, без повторов
+    """
+    template = engines["django"].engine.get_template(template_name)
+    paths = []
+    for node, previous_text in _walk(template.nodelist):
+        if isinstance(node, StaticNode):
+            path = _literal(node.path)
+            if (
+                path
+                and os.path.splitext(path)[1].lower() in PRELOAD_TYPES
+                and _in_tag_attribute(previous_text)
+            ):
+                paths.append(path)
+        elif isinstance(node, IncludeNode) and depth < MAX_INCLUDE_DEPTH:
+            name = _literal(node.template)
+            if name:
+                try:
+                    paths += template_assets(name, depth + 1)
+                except TemplateDoesNotExist:
+                    pass
+    return list(dict.fromkeys(paths))
+
+
+def link_value(url, as_type):
+    value = "<%s>; rel=preload; as=%s" % (url, as_type)
+    if as_type == "font":
+        # Шрифты загружаются в режиме CORS — без crossorigin предзагрузка не используется
+        value += "; crossorigin"
+    return value
+
+
+@lru_cache(maxsize=None)
+def preload_links():
+    """
+    Значения заголовка Link для базовых шаблонов (PRELOAD_TEMPLATES).
+
+    Returns:
+        tuple: строки вида '</static/css/style.3f2a.css>; rel=preload; as=style'
+    """
+    links = []
+    for template_name in getattr(settings, "PRELOAD_TEMPLATES", ["base.html"]):
+        try:
+            paths = template_assets(template_name)
+        except TemplateDoesNotExist:
+            logger.warning("Шаблон для предзагрузки не найден: %s", template_name)
+            continue
+        for path in paths:
+            links.append(link_value(static(path), PRELOAD_TYPES[os.path.splitext(path)[1].lower()]))
+    return tuple(dict.fromkeys(links))
+
+
+def wants_preload(request):
+    """Навигационный GET-запрос страницы (не статика, не админка, не HTMX)."""
+    if not getattr(settings, "PRELOAD_ENABLED", True) or request.method != "GET":
+        return False
+    if request.headers.get("HX-Request") or "text/html" not in request.headers.get("Accept", ""):
+        return False
+    return not request.path.startswith((settings.STATIC_URL, settings.MEDIA_URL, "/admin/"))
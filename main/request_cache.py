@@ -0,0 +1,124 @@
+"""
+Модуль request_cache.py приложения main
+
+Кэш в пределах одного запроса (identity map).
+
+Представление, контекстные процессоры и шаблонные теги часто загружают
+одни и те же данные: страницу по slug, «последние работы» для главной и
+для боковой колонки, настройки сайта. Значения, полученные через этот
+модуль, запоминаются до конца запроса и при повторном обращении берутся
+из памяти без SQL-запроса и без чтения общего кэша.
+
+Область действия задает RequestCacheMiddleware (или request_scope() в
+командах и задачах); вне ее функции просто вычисляют значение.
+Сохранение или удаление объекта модели сбрасывает запомненные значения
+этой модели (сигналы в main/signals.py), поэтому после обработки формы
+представление видит актуальные данные.
+
+При DEBUG ответ получает заголовок X-Request-Cache с числом
+сэкономленных обращений (hits) и вычислений (misses).
+
+Использование:
+    page = get_object_or_404(Page, slug=slug, is_active=True)
+    latest = memoize("latest_portfolio", build, depends_on=[Portfolio])
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.http import Http404
+
+from .cache_tags import tags_for
+
+# Хранилище текущего запроса
+_current = ContextVar("request_cache", default=None)
+
+
+class RequestCache:
+    """Значения одного запроса и счетчики попаданий."""
+
+    def __init__(self):
+        self.values = {}
+        # Метка модели -> ключи значений, построенных из ее объектов
+        self.model_keys = {}
+        self.hits = 0
+        self.misses = 0
+
+    def forget_model(self, label):
+        for key in self.model_keys.pop(label, ()):
+            self.values.pop(key, None)
+
+
+@contextmanager
+def request_scope():
+    """Открывает область кэша (запрос, команда, задача)."""
+    store = RequestCache()
+    token = _current.set(store)
+    try:
+        yield store
+    finally:
+        _current.reset(token)
+
+
+def current():
+    """Хранилище текущего запроса или None вне области."""
+    return _current.get()
+
+
+def memoize(key, factory, depends_on=()):
+    """
+    Возвращает значение, запомненное в текущем запросе, или вычисляет factory().
+
+    Args:
+        key: хешируемый ключ
+        factory (callable): вычисление значения
+        depends_on (iterable): модели (классы, объекты, querysets, "app.Model"),
+            изменение которых сбрасывает значение
+    """
+    store = _current.get()
+    if store is None:
+        return factory()
+    if key in store.values:
+        store.hits += 1
+        return store.values[key]
+    value = factory()
+    store.misses += 1
+    store.values[key] = value
+    for label in tags_for(*depends_on):
+        store.model_keys.setdefault(label, set()).add(key)
+    return value
+
+
+def _object_key(model, lookup):
+    return ("object", model._meta.label_lower, tuple(sorted(lookup.items())))
+
+
+def get_object(model, **lookup):
+    """
+    model.objects.get(**lookup) один раз за запрос. Найденный объект
+    запоминается и по первичному ключу (get_object(Model, pk=...)).
+    """
+    key = _object_key(model, lookup)
+    obj = memoize(key, lambda: model._default_manager.get(**lookup), depends_on=[model])
+    store = _current.get()
+    if store is not None:
+        pk_key = _object_key(model, {"pk": obj.pk})
+        if pk_key not in store.values:
+            store.values[pk_key] = obj
+            store.model_keys.setdefault(model._meta.label_lower, set()).add(pk_key)
+    return obj
+
+
+def get_object_or_404(model, **lookup):
+    """Как django.shortcuts.get_object_or_404, но с запоминанием в запросе."""
+    try:
+        return get_object(model, **lookup)
+    except model.DoesNotExist:
+        raise Http404("No %s matches the given query." % model._meta.object_name)
+
+
+def forget_model(model):
+    """Сбрасывает значения, построенные из объектов модели (после save/delete)."""
+    store = _current.get()
+    if store is not None:
+        store.forget_model(model._meta.label_lower)
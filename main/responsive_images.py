@@ -0,0 +1,257 @@
+"""
+Модуль responsive_images.py приложения main
+
+Адаптивные изображения: производные WebP/AVIF нескольких ширин и srcset.
+
+Страницы отдавали телефонам оригиналы шириной 1920px и больше, а две
+функции optimize_image (main/utils.py и main/services/image_optimizer.py)
+не были подключены ни к одной модели. Теперь после сохранения объекта с
+новым файлом в ImageField (и в полях RESPONSIVE_IMAGE_EXTRA_FIELDS,
+например иконках услуг) сигнал ставит в очередь Celery задачу
+images.derivatives (main/tasks.py; без брокера — отдельный поток).
+Загрузка не ждет обработки.
+
+Задача пишет рядом с оригиналом файлы <имя>.w<ширина>.<формат> для
+ширин RESPONSIVE_IMAGE_WIDTHS, не превышающих ширину оригинала, в
+форматах RESPONSIVE_IMAGE_FORMATS (AVIF — если Pillow собран с
+libavif). Сведения о готовых производных (манифест) хранятся в кэше, а
+версии тегов моделей, в полях которых есть этот файл, меняются — кэш
+страниц и фрагменты с <img> без <picture> устаревают. SVG и GIF не
+обрабатываются.
+
+Шаблонный тег {% responsive_image %} выводит <picture> с <source> для
+AVIF и WebP (srcset, sizes) и <img> с оригиналом; пока производных нет,
+выводится только <img>.
+
+Использование:
+    {% load responsive_images %}
+    {% responsive_image news.image alt=news.title sizes="(max-width: 768px) 100vw, 33vw" class="w-100" %}
+
+Производные для уже загруженных файлов: python manage.py build_image_derivatives
+"""
+
+import io
+import logging
+import posixpath
+import re
+import threading
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, models
+
+from .cache_tags import bump_tags, is_tracked_model
+from .media_storage import blob_digest, blob_directory, blob_path
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_PREFIX = "responsive:"
+
+# Форматы без пользы от пережатия (векторные и анимированные)
+SKIPPED_EXTENSIONS = (".svg", ".gif", ".ico")
+
+PIL_FORMATS = {"avif": "AVIF", "webp": "WEBP"}
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp"}
+
+
+def is_enabled():
+    return getattr(settings, "RESPONSIVE_IMAGES_ENABLED", True)
+
+
+def widths():
+    return tuple(sorted(getattr(settings, "RESPONSIVE_IMAGE_WIDTHS", (320, 640, 960, 1280, 1920))))
+
+
+@lru_cache(maxsize=1)
+def available_formats():
+    """Настроенные форматы, которые умеет сохранять установленный Pillow."""
+    from PIL import features
+
+    configured = getattr(settings, "RESPONSIVE_IMAGE_FORMATS", ("avif", "webp"))
+    return tuple(fmt for fmt in configured if features.check(fmt))
+
+
+def derivative_name(name, width, fmt):
+    """
+    news/images/foto_2024-01-15_14-30-45.jpg -> news/images/foto_2024-01-15_14-30-45.w640.webp,
+    blobs/ab/cd/<хеш>/foto.jpg -> blobs/ab/cd/<хеш>.w640.webp (общие для одинаковых загрузок)
+    """
+    return "%s.w%d.%s" % (posixpath.splitext(blob_path(name))[0], width, fmt)
+
+
+def is_processable(name):
+    return bool(name) and not name.lower().endswith(SKIPPED_EXTENSIONS)
+
+
+@lru_cache(maxsize=None)
+def tracked_fields(model):
+    """Поля модели, для файлов которых строятся производные."""
+    extra = set(getattr(settings, "RESPONSIVE_IMAGE_EXTRA_FIELDS", ()))
+    return tuple(
+        field.attname
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.ImageField) or "%s.%s" % (model._meta.label, field.name) in extra
+    )
+
+
+def target_widths(original_width):
+    """Ширины производных: настроенные меньше оригинала и сама ширина оригинала, если она меньше максимума."""
+    result = [width for width in widths() if width < original_width]
+    if original_width <= widths()[-1]:
+        result.append(original_width)
+    return result
+
+
+def build_derivatives(name, storage=None):
+    """
+    Строит производные изображения и сохраняет манифест.
+
+    Returns:
+        dict | None: манифест {"width", "height", "sources": {формат: [ширины]}}
+            или None, если файл не изображение
+    """
+    from PIL import Image, ImageOps
+
+    storage = storage or default_storage
+    if not is_processable(name) or not storage.exists(name):
+        return None
+    try:
+        with storage.open(name, "rb") as original, Image.open(original) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("P", "LA") else "RGB")
+            manifest = {"width": image.width, "height": image.height, "sources": {}}
+            # От большей ширины к меньшей: каждая следующая уменьшается из предыдущей
+            current = image
+            sizes = sorted(target_widths(image.width), reverse=True)
+            resized = []
+            for width in sizes:
+                height = max(1, round(image.height * width / image.width))
+                if (width, height) != current.size:
+                    current = current.resize((width, height), Image.Resampling.LANCZOS)
+                resized.append((width, current))
+            for fmt in available_formats():
+                quality = getattr(settings, "RESPONSIVE_IMAGE_QUALITY", {}).get(fmt, 75)
+                for width, variant in resized:
+                    buffer = io.BytesIO()
+                    variant.save(buffer, PIL_FORMATS[fmt], quality=quality)
+                    target = derivative_name(name, width, fmt)
+                    # Повторная обработка перезаписывает файл, а не создает копию с суффиксом
+                    if storage.exists(target):
+                        storage.delete(target)
+                    storage.save(target, ContentFile(buffer.getvalue()))
+                manifest["sources"][fmt] = sorted(sizes)
+    except (OSError, ValueError) as exc:
+        # Не изображение или поврежденный файл: оригинал отдается как есть
+        logger.warning(f"Производные изображения {name} не построены: {exc}")
+        return None
+    cache.set(MANIFEST_PREFIX + name, manifest, None)
+    tags = owner_tags(name)
+    if tags:
+        from .static_export import schedule_export
+
+        bump_tags(*tags)
+        schedule_export()
+    return manifest
+
+
+def owner_tags(name):
+    """
+    Теги моделей, в полях которых есть файл. Для имени в хранилище по хешу —
+    и другие имена того же содержимого: производные у них общие.
+    """
+    digest = blob_digest(name)
+    if digest:
+        lookup, value = "__startswith", "%s%s/" % (blob_directory(digest), digest)
+    else:
+        lookup, value = "", name
+    return {
+        model._meta.label_lower
+        for model, attname in model_fields()
+        if is_tracked_model(model) and model._base_manager.filter(**{attname + lookup: value}).exists()
+    }
+
+
+def get_manifest(name, storage=None):
+    """
+    Манифест готовых производных из кэша; при промахе — по файлам рядом с
+    оригиналом (без производных — None на RESPONSIVE_IMAGE_PENDING_TIMEOUT).
+    """
+    if not is_processable(name):
+        return None
+    key = MANIFEST_PREFIX + name
+    manifest = cache.get(key)
+    if manifest is not None:
+        return manifest or None
+
+    storage = storage or default_storage
+    # Ширины — по именам файлов: среди них и ширина оригинала (target_widths), которой нет в настройках
+    directory, stem = posixpath.split(posixpath.splitext(blob_path(name))[0])
+    pattern = re.compile(r"%s\.w(\d+)\.(\w+)$" % re.escape(stem))
+    try:
+        filenames = storage.listdir(directory)[1]
+    except OSError:
+        filenames = []
+    sources = {}
+    for filename in filenames:
+        match = pattern.match(filename)
+        if match and match.group(2) in available_formats():
+            sources.setdefault(match.group(2), []).append(int(match.group(1)))
+    for found in sources.values():
+        found.sort()
+    manifest = {"width": None, "height": None, "sources": sources} if sources else {}
+    cache.set(key, manifest, None if manifest else getattr(settings, "RESPONSIVE_IMAGE_PENDING_TIMEOUT", 60))
+    return manifest or None
+
+
+def srcset(name, manifest, fmt, storage=None):
+    storage = storage or default_storage
+    return ", ".join(
+        "%s %dw" % (storage.url(derivative_name(name, width, fmt)), width)
+        for width in manifest["sources"][fmt]
+    )
+
+
+def schedule_derivatives(name):
+    """Ставит построение производных в очередь Celery (без брокера — отдельный поток)."""
+    if not is_enabled() or not is_processable(name):
+        return
+
+    from .tasks import build_image_derivatives_task
+
+    try:
+        build_image_derivatives_task.delay(name)
+    except Exception as exc:
+        logger.warning(f"Не удалось отправить задачу в Celery ({exc}), производные {name} в отдельном потоке...")
+
+        def fallback_run():
+            try:
+                build_image_derivatives_task(name)
+            except Exception as e:
+                logger.error(f"Ошибка при фолбэк-построении производных {name}: {e}")
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=fallback_run, daemon=True)
+        thread.start()
+
+
+def pending_uploads(instance):
+    """Поля объекта с новыми, еще не записанными файлами (вызывается в pre_save)."""
+    pending = []
+    for attname in tracked_fields(type(instance)):
+        file = getattr(instance, attname, None)
+        if file and not getattr(file, "_committed", True):
+            pending.append(attname)
+    return pending
+
+
+def model_fields():
+    """Пары (модель, поле) всех отслеживаемых полей — для команды build_image_derivatives."""
+    for model in apps.get_models():
+        for attname in tracked_fields(model):
+            yield model, attname
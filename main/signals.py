@@ -1,51 +1,140 @@
-import logging
-from django.db.models.signals import post_save, post_delete
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_save
 from django.dispatch import receiver
-from django.core.cache import cache
-from django.core.cache.utils import make_template_fragment_key
-
-# Импортируем модели, которые кэшируются на главной странице
-from news.models import News, NewsCategory
-from portfolio.models import Portfolio, PortfolioCategory
-from services.models import Service, ServiceCategory
-from reviews.models import Review
-from main.models import Page, SiteSettings
-
-logger = logging.getLogger(__name__)
-
-@receiver([post_save, post_delete], sender=News)
-def invalidate_news_cache(sender, instance, **kwargs):
-    """Очищает кэш новостей при их изменении"""
-    cache.delete("latest_news")
-    cache.delete(make_template_fragment_key("homepage_news"))
-    logger.info("Кэш новостей очищен.")
-
-@receiver([post_save, post_delete], sender=Portfolio)
-def invalidate_portfolio_cache(sender, instance, **kwargs):
-    """Очищает кэш портфолио при изменении работ"""
-    cache.delete(make_template_fragment_key("homepage_portfolio"))
-    logger.info("Кэш портфолио очищен.")
-
-@receiver([post_save, post_delete], sender=Service)
-def invalidate_service_cache(sender, instance, **kwargs):
-    """Очищает кэш услуг при их изменении"""
-    cache.delete(make_template_fragment_key("homepage_services"))
-    cache.delete(make_template_fragment_key("site_navigation"))
-    logger.info("Кэш услуг очищен.")
-
-@receiver([post_save, post_delete], sender=Review)
-def invalidate_review_cache(sender, instance, **kwargs):
-    """Очищает кэш отзывов при их изменении"""
-    cache.delete(make_template_fragment_key("homepage_reviews"))
-    logger.info("Кэш отзывов очищен.")
-
-# Инвалидация кэша навигации (site_navigation)
-@receiver([post_save, post_delete], sender=Page)
-@receiver([post_save, post_delete], sender=SiteSettings)
-@receiver([post_save, post_delete], sender=NewsCategory)
-@receiver([post_save, post_delete], sender=PortfolioCategory)
-@receiver([post_save, post_delete], sender=ServiceCategory)
-def invalidate_navigation_cache(sender, instance, **kwargs):
-    """Очищает кэш навигации сайта при изменении категорий или страниц"""
-    cache.delete(make_template_fragment_key("site_navigation"))
-    logger.info("Кэш навигации очищен.")
+
+from main.cache_tags import bump_tags, is_tracked_model, note_dependencies, recording_dependencies
+from main.media_storage import blob_fields, is_blob_name, release
+from main.og_utils import og_models, og_stem, remove_og_files, schedule_og_image
+from main.request_cache import forget_model
+from main.responsive_images import pending_uploads, schedule_derivatives, tracked_fields
+from main.static_export import schedule_export
+
+# Изменения только этих полей не влияют на закэшированные данные
+# (счетчики просмотров обновляются на каждый показ страницы)
+IGNORED_UPDATE_FIELDS = frozenset({"views"})
+
+
+# Инвалидация кэша по тегам (main/cache_tags.py): сохранение или удаление
+# объекта меняет версию тега его модели. Фрагменты шаблонов, снимок обвязки
+# сайта (site_chrome), индекс шапок (header_resolver) и списки последних
+# новостей/работ/отзывов сами объявляют свои зависимости, поэтому отдельные
+# обработчики с перечнем ключей для каждой модели не нужны.
+def bump_tags_and_after_commit(*tags):
+    """
+    Меняет версии тегов сразу (текущий запрос видит свои изменения) и еще раз
+    после фиксации транзакции: значение, которое параллельный запрос успел
+    собрать из незафиксированных строк под новой версией, тоже устаревает.
+    """
+    bump_tags(*tags)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(partial(bump_tags, *tags))
+
+
+@receiver([post_save, post_delete])
+def bump_model_cache_tag(sender, update_fields=None, **kwargs):
+    """Меняет версию тега модели после сохранения или удаления объекта"""
+    if not is_tracked_model(sender):
+        return
+    if update_fields and IGNORED_UPDATE_FIELDS.issuperset(update_fields):
+        return
+    bump_tags_and_after_commit(sender._meta.label_lower)
+    # Статический экспорт страниц сверяет те же версии тегов
+    schedule_export()
+
+
+@receiver([post_save, post_delete])
+def forget_request_cached_objects(sender, **kwargs):
+    """Сбрасывает запомненные в текущем запросе значения модели (main/request_cache.py)"""
+    forget_model(sender)
+
+
+@receiver(m2m_changed)
+def bump_m2m_cache_tags(sender, instance, action, model, **kwargs):
+    """Меняет версии тегов обеих сторон связи ManyToMany"""
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    tags = {m._meta.label_lower for m in (type(instance), model) if is_tracked_model(m)}
+    if tags:
+        bump_tags_and_after_commit(*tags)
+        schedule_export()
+
+
+@receiver(post_init)
+def note_model_dependency(sender, **kwargs):
+    """Запоминает модель загруженного объекта, пока кэш страниц записывает зависимости"""
+    if recording_dependencies() and is_tracked_model(sender):
+        note_dependencies((sender._meta.label_lower,))
+
+
+# Адаптивные изображения (main/responsive_images.py): новый файл в
+# ImageField замечается до записи (файл еще не сохранен в хранилище), а
+# построение производных ставится в очередь после фиксации транзакции.
+@receiver(pre_save)
+def note_image_uploads(sender, instance, raw=False, **kwargs):
+    """Запоминает поля с новыми файлами изображений"""
+    if not raw and tracked_fields(sender):
+        instance._pending_image_uploads = pending_uploads(instance)
+
+
+@receiver(post_save)
+def schedule_image_derivatives(sender, instance, **kwargs):
+    """Ставит в очередь производные WebP/AVIF для загруженных изображений"""
+    for attname in instance.__dict__.pop("_pending_image_uploads", ()):
+        transaction.on_commit(partial(schedule_derivatives, getattr(instance, attname).name))
+
+
+# Хранилище по хешу содержимого (main/media_storage.py): ссылка на файл
+# освобождается после фиксации транзакции, когда объект удален или
+# загрузка в поле заменена; файл удаляется, когда ссылок не осталось.
+@receiver(pre_save)
+def note_replaced_blobs(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Запоминает прежние файлы полей, значение которых меняется"""
+    fields = blob_fields(sender)
+    if update_fields is not None:
+        fields = [field for field in fields if field.name in update_fields or field.attname in update_fields]
+    if raw or not fields or instance._state.adding or instance.pk is None:
+        return
+    old = sender._base_manager.filter(pk=instance.pk).values(*(field.attname for field in fields)).first() or {}
+    instance._replaced_blobs = [
+        (field.storage, old[field.attname])
+        for field in fields
+        if is_blob_name(old.get(field.attname)) and old[field.attname] != getattr(instance, field.attname).name
+    ]
+
+
+@receiver(post_save)
+def release_replaced_blobs(sender, instance, **kwargs):
+    """Освобождает замененные файлы"""
+    for storage, name in instance.__dict__.pop("_replaced_blobs", ()):
+        transaction.on_commit(partial(release, storage, name))
+
+
+@receiver(post_delete)
+def release_deleted_blobs(sender, instance, **kwargs):
+    """Освобождает файлы удаленного объекта"""
+    for field in blob_fields(sender):
+        name = getattr(instance, field.attname).name
+        if is_blob_name(name):
+            transaction.on_commit(partial(release, field.storage, name))
+
+
+# Изображения Open Graph (main/og_utils.py) рисуются заранее: после
+# фиксации транзакции задача Celery перерисовывает картинку объекта, если
+# изменился ее текст; файлы удаленного объекта удаляются.
+@receiver(post_save)
+def schedule_og_image_render(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Ставит в очередь изображение Open Graph сохраненного объекта"""
+    if raw or sender not in og_models():
+        return
+    if update_fields and IGNORED_UPDATE_FIELDS.issuperset(update_fields):
+        return
+    transaction.on_commit(partial(schedule_og_image, sender._meta.label, instance.pk))
+
+
+@receiver(post_delete)
+def remove_og_image(sender, instance, **kwargs):
+    """Удаляет изображения Open Graph удаленного объекта"""
+    if sender in og_models():
+        transaction.on_commit(partial(remove_og_files, og_stem(instance)))
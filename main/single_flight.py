@@ -0,0 +1,239 @@
+"""
+Модуль single_flight.py приложения main
+
+Вычисление дорогих значений кэша без «лавины» запросов.
+
+Когда ключ истекает под нагрузкой, все одновременные запросы видят промах
+и пересчитывают значение параллельно (например, 20 COUNT/SUM-запросов
+статистики админки). get_or_compute() объединяет такие промахи:
+- внутри процесса потоки ждут одну блокировку на ключ (threading.Lock);
+- между процессами и серверами блокировкой служит cache.add() —
+  вычисляет только получивший ее воркер, остальные ждут появления
+  значения в кэше (не дольше SINGLE_FLIGHT_WAIT_TIMEOUT), затем считают сами.
+
+Устаревшее значение (stale-while-revalidate): при stale_ttl > 0 значение
+хранится еще stale_ttl секунд после истечения timeout. В этот период оно
+отдается сразу, а один воркер обновляет его в фоновом потоке. Изменение
+зависимостей (версий тегов, main/cache_tags.py) — не устаревание, а
+инвалидация: такое значение не отдается, пересчет объединяется как промах.
+
+Счетчики путей (hit, stale, refresh, compute, waited, coalesced,
+wait_timeout, refresh_error) ведутся по имени значения в каждом процессе —
+get_stats() и /admin/dashboard/single-flight/.
+
+Использование:
+    get_or_compute("admin_dashboard_stats", build, 60, stale_ttl=300,
+                   depends_on=ADMIN_STATS_DEPENDENCIES)
+"""
+
+import logging
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .cache_tags import TAG_VERSION_PREFIX, get_tag_versions, note_dependencies, tags_for
+
+logger = logging.getLogger(__name__)
+
+# Префикс ключей межпроцессных блокировок
+LOCK_PREFIX = "single_flight:"
+
+# Интервал опроса кэша ожидающими воркерами (секунды)
+WAIT_POLL_INTERVAL = 0.05
+
+_MISSING = object()
+
+# Блокировки потоков текущего процесса по ключу
+_key_locks = weakref.WeakValueDictionary()
+_key_locks_guard = threading.Lock()
+
+# Имя значения -> Counter путей
+_stats = defaultdict(Counter)
+_stats_lock = threading.Lock()
+
+
+def _count(name, path):
+    with _stats_lock:
+        _stats[name][path] += 1
+
+
+def get_stats():
+    """Счетчики путей по именам значений (текущий процесс)."""
+    with _stats_lock:
+        return {name: dict(counter) for name, counter in sorted(_stats.items())}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _key_lock(key):
+    with _key_locks_guard:
+        lock = _key_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _key_locks[key] = lock
+        return lock
+
+
+def _acquire(key, lock_timeout):
+    """Межпроцессная блокировка ключа; возвращает токен или None, если она занята."""
+    token = uuid.uuid4().hex
+    if cache.add(LOCK_PREFIX + key, token, lock_timeout):
+        return token
+    return None
+
+
+def _release(key, token):
+    # Блокировку снимает только ее владелец (она могла истечь и достаться другому)
+    if cache.get(LOCK_PREFIX + key) == token:
+        cache.delete(LOCK_PREFIX + key)
+
+
+def _read(key, tags):
+    """
+    Returns:
+        tuple: (значение или _MISSING, свежее ли оно)
+    """
+    if tags:
+        tag_keys = [TAG_VERSION_PREFIX + tag for tag in tags]
+        found = cache.get_many([key, *tag_keys])
+        entry = found.get(key)
+        current = tuple((tag, found.get(tag_key)) for tag, tag_key in zip(tags, tag_keys))
+    else:
+        entry = cache.get(key)
+        current = None
+    if not isinstance(entry, tuple) or len(entry) != 3:
+        return _MISSING, False
+    stamp, fresh_until, value = entry
+    if stamp != current:
+        return _MISSING, False
+    return value, fresh_until is None or time.time() < fresh_until
+
+
+def _compute(key, compute, timeout, stale_ttl, tags):
+    # Версии читаются до вычисления: изменение данных во время расчета
+    # сразу сделает сохраненное значение недействительным
+    versions = get_tag_versions(tags) if tags else None
+    started = time.monotonic()
+    value = compute()
+    # Время вычисления по группам ключей — для инспектора кэша (TwoTierCache)
+    record_compute = getattr(cache, "record_compute", None)
+    if record_compute is not None:
+        record_compute(key, time.monotonic() - started)
+    if timeout is None:
+        fresh_until, cache_timeout = None, None
+    else:
+        fresh_until, cache_timeout = time.time() + timeout, timeout + stale_ttl
+    cache.set(key, (versions, fresh_until, value), cache_timeout)
+    return value
+
+
+def _wait(key, tags, wait_timeout):
+    """Ждет значение, которое вычисляет другой воркер; _MISSING — не дождались."""
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_POLL_INTERVAL)
+        value, _ = _read(key, tags)
+        if value is not _MISSING:
+            return value
+        # Владелец блокировки завершился без результата (ошибка вычисления)
+        if cache.get(LOCK_PREFIX + key) is None:
+            break
+    return _MISSING
+
+
+def _refresh_in_background(key, compute, timeout, stale_ttl, tags, name, lock_timeout):
+    """Обновляет устаревшее значение в фоновом потоке (если его еще не обновляет другой воркер)."""
+    token = _acquire(key, lock_timeout)
+    if token is None:
+        return None
+    _count(name, "refresh")
+
+    def run():
+        try:
+            _compute(key, compute, timeout, stale_ttl, tags)
+        except Exception:
+            _count(name, "refresh_error")
+            logger.exception("Ошибка фонового обновления кэша %s", key)
+        finally:
+            _release(key, token)
+            connections.close_all()
+
+    thread = threading.Thread(target=run, name="single-flight-%s" % name, daemon=True)
+    thread.start()
+    return thread
+
+
+def get_or_compute(
+    key,
+    compute,
+    timeout=None,
+    *,
+    depends_on=None,
+    stale_ttl=0,
+    name=None,
+    lock_timeout=None,
+    wait_timeout=None,
+):
+    """
+    Возвращает значение из кэша или вычисляет compute() один раз на все
+    одновременные промахи.
+
+    Args:
+        key (str): ключ кэша
+        compute (callable): функция вычисления значения
+        timeout (int | None): время свежести в секундах (None — до инвалидации)
+        depends_on (iterable | None): зависимости для инвалидации по тегам
+            (модели, объекты, querysets, строки "app.Model")
+        stale_ttl (int): сколько секунд после timeout отдавать устаревшее
+            значение, пока оно обновляется в фоне (0 — не отдавать)
+        name (str | None): имя для счетчиков (по умолчанию key)
+        lock_timeout (int | None): срок блокировки, SINGLE_FLIGHT_LOCK_TIMEOUT
+        wait_timeout (float | None): ожидание чужого вычисления, SINGLE_FLIGHT_WAIT_TIMEOUT
+    """
+    name = name or key
+    tags = sorted(tags_for(*depends_on)) if depends_on else ()
+    if lock_timeout is None:
+        lock_timeout = getattr(settings, "SINGLE_FLIGHT_LOCK_TIMEOUT", 30)
+    if wait_timeout is None:
+        wait_timeout = getattr(settings, "SINGLE_FLIGHT_WAIT_TIMEOUT", 5)
+    note_dependencies(tags)
+
+    value, fresh = _read(key, tags)
+    if value is not _MISSING:
+        if fresh:
+            _count(name, "hit")
+            return value
+        if stale_ttl:
+            _count(name, "stale")
+            _refresh_in_background(key, compute, timeout, stale_ttl, tags, name, lock_timeout)
+            return value
+
+    with _key_lock(key):
+        # Пока поток ждал блокировку, значение мог вычислить соседний поток
+        value, fresh = _read(key, tags)
+        if value is not _MISSING and fresh:
+            _count(name, "coalesced")
+            return value
+
+        token = _acquire(key, lock_timeout)
+        if token is None:
+            value = _wait(key, tags, wait_timeout)
+            if value is not _MISSING:
+                _count(name, "waited")
+                return value
+            _count(name, "wait_timeout")
+        try:
+            _count(name, "compute")
+            return _compute(key, compute, timeout, stale_ttl, tags)
+        finally:
+            if token is not None:
+                _release(key, token)
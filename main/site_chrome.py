@@ -0,0 +1,85 @@
+"""
+Модуль site_chrome.py приложения main
+
+Предвычисленный снимок «обвязки» сайта (site chrome): настройки сайта, меню,
+скрипты аналитики и категории для навигации. Эти данные одинаковы для всех
+страниц, поэтому вместо 7+ запросов к БД на каждый запрос они собираются
+один раз, сохраняются в кэше одним ключом и читаются одной операцией.
+
+Снимок пересобирается только при изменении связанных моделей: он
+сохраняется с тегами зависимостей (main/cache_tags.py), и после изменения
+любой из моделей SITE_CHROME_DEPENDENCIES следующий запрос строит новую
+версию снимка.
+"""
+
+import time
+
+from .cache_tags import get_or_set_tagged
+from .request_cache import memoize
+
+# Ключ кэша, под которым хранится снимок
+SITE_CHROME_CACHE_KEY = "site_chrome"
+# Снимок живет до изменения зависимостей
+SITE_CHROME_TIMEOUT = None
+# Модели, из которых собирается снимок
+SITE_CHROME_DEPENDENCIES = (
+    "main.SiteSettings",
+    "main.Page",
+    "main.AnalyticsScript",
+    "news.NewsCategory",
+    "portfolio.PortfolioCategory",
+    "services.ServiceCategory",
+    "knowledge_base.Category",
+)
+
+
+def build_site_chrome():
+    """
+    Собирает снимок общих для всех страниц данных из базы.
+
+    Все querysets принудительно вычисляются (list), чтобы в кэш попали
+    готовые данные, а не ленивые запросы.
+
+    Returns:
+        dict: site_settings, menu_pages, analytics_scripts, nav_categories
+              и version — метка времени сборки снимка.
+    """
+    from knowledge_base.models import Category as KBCategory
+    from news.models import NewsCategory
+    from portfolio.models import PortfolioCategory
+    from services.models import ServiceCategory
+
+    from .models import AnalyticsScript, Page, SiteSettings
+
+    return {
+        "version": time.time_ns(),
+        "site_settings": SiteSettings.objects.filter(is_active=True).first(),
+        "menu_pages": list(
+            Page.objects.filter(show_in_menu=True, is_active=True).order_by("order")
+        ),
+        "analytics_scripts": list(
+            AnalyticsScript.objects.filter(is_active=True).order_by("position")
+        ),
+        "nav_categories": {
+            "news": list(NewsCategory.objects.filter(is_active=True)),
+            "portfolio": list(PortfolioCategory.objects.filter(is_active=True)),
+            "services": list(ServiceCategory.objects.filter(is_active=True)),
+            "knowledge_base": list(KBCategory.objects.all()),
+        },
+    }
+
+
+def get_site_chrome():
+    """
+    Возвращает снимок обвязки сайта: одно обращение к кэшу на запрос
+    (снимок и версии тегов читаются вместе, повторные вызовы — из кэша
+    запроса), сборка из БД только при отсутствии снимка или изменении
+    зависимостей.
+    """
+    return memoize(
+        SITE_CHROME_CACHE_KEY,
+        lambda: get_or_set_tagged(
+            SITE_CHROME_CACHE_KEY, build_site_chrome, SITE_CHROME_DEPENDENCIES, SITE_CHROME_TIMEOUT
+        ),
+        SITE_CHROME_DEPENDENCIES,
+    )
@@ -21,6 +21,8 @@ from .models import Page
 # Импорт моделей из других приложений
 from news.models import News, NewsCategory
 from portfolio.models import Portfolio, PortfolioCategory
+from services.models import Service, ServiceCategory
+from knowledge_base.models import Article, Category as KnowledgeBaseCategory
 
 
 class PageSitemap(Sitemap):
@@ -195,6 +197,79 @@ class PortfolioCategorySitemap(Sitemap):
 
 
 
+class ServiceSitemap(Sitemap):
+    """
+    Sitemap для услуг.
+
+    Включает лендинги всех активных услуг.
+    """
+    changefreq = "monthly"
+    priority = 0.9
+
+    def items(self):
+        return Service.objects.filter(is_active=True)
+
+    def lastmod(self, obj):
+        return obj.updated_at
+
+    def location(self, item):
+        return reverse("services:detail", kwargs={"slug": item.slug})
+
+
+
+class ServiceCategorySitemap(Sitemap):
+    """
+    Sitemap для категорий услуг.
+    """
+    changefreq = "monthly"
+    priority = 0.7
+
+    def items(self):
+        return ServiceCategory.objects.filter(is_active=True)
+
+    def location(self, item):
+        return reverse("services:category", kwargs={"category_slug": item.slug})
+
+
+
+class KnowledgeBaseArticleSitemap(Sitemap):
+    """
+    Sitemap для статей базы знаний.
+
+    Включает все опубликованные статьи.
+    """
+    changefreq = "monthly"
+    priority = 0.6
+
+    def items(self):
+        return Article.objects.filter(is_published=True)
+
+    def lastmod(self, obj):
+        return obj.updated_at
+
+    def location(self, item):
+        return reverse("knowledge_base:article", kwargs={"slug": item.slug})
+
+
+
+class KnowledgeBaseCategorySitemap(Sitemap):
+    """
+    Sitemap для категорий базы знаний.
+    """
+    changefreq = "monthly"
+    priority = 0.5
+
+    def items(self):
+        return KnowledgeBaseCategory.objects.filter(is_published=True)
+
+    def lastmod(self, obj):
+        return obj.updated_at
+
+    def location(self, item):
+        return reverse("knowledge_base:category", kwargs={"slug": item.slug})
+
+
+
 class StaticViewSitemap(Sitemap):
     """
     Sitemap для статических URL (представлений без модели).
@@ -218,7 +293,14 @@ class StaticViewSitemap(Sitemap):
         Returns:
             list: Список строк с именами маршрутов
         """
-        return ["main:home", "news:list", "portfolio:list", "reviews:list"]
+        return [
+            "main:home",
+            "news:list",
+            "portfolio:list",
+            "reviews:list",
+            "services:list",
+            "knowledge_base:index",
+        ]
 
     def location(self, item):
         """
@@ -232,3 +314,17 @@ class StaticViewSitemap(Sitemap):
         """
         return reverse(item)
 
+
+# Все карты сайта: /sitemap.xml и экспорт статических страниц (main/static_export.py)
+SITEMAPS = {
+    "pages": PageSitemap,
+    "news": NewsSitemap,
+    "news_categories": NewsCategorySitemap,
+    "portfolio": PortfolioSitemap,
+    "portfolio_categories": PortfolioCategorySitemap,
+    "services": ServiceSitemap,
+    "service_categories": ServiceCategorySitemap,
+    "knowledge_base": KnowledgeBaseArticleSitemap,
+    "knowledge_base_categories": KnowledgeBaseCategorySitemap,
+    "static": StaticViewSitemap,
+}
@@ -0,0 +1,125 @@
+"""
+Модуль slug_registry.py приложения main
+
+Реестр известных slug для детальных страниц (отрицательный кэш).
+
+Боты перебирают несуществующие адреса, и каждый такой запрос выполнял
+тяжелый запрос к БД (у новостей — с Count/Avg по комментариям и событиям)
+и писал строку в лог. Декоратор known_slug_required(Model) проверяет slug
+по множеству всех slug модели и отвечает 404 без обращения к БД.
+
+Множество хранится в общем кэше (get_or_set_tagged) и в памяти процесса;
+сохранение и удаление объектов меняют версию тега модели
+(main/cache_tags.py, сигналы в main/signals.py), и при следующей проверке
+реестр перестраивается. Неактивные объекты в реестре есть — для них
+представление по-прежнему решает само (например, сотрудники видят
+неактивные услуги).
+
+Вместо строки лога на каждый промах (в представлении и "Not Found" от
+django.request — фильтр skip_slug_registry_misses в LOGGING) раз в
+SLUG_MISS_LOG_INTERVAL секунд пишется одна сводка: сколько промахов по
+каждой модели и примеры slug.
+
+Использование:
+    @known_slug_required(News)
+    def news_detail(request, slug): ...
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404
+
+from .cache_tags import get_or_set_tagged, get_tag_versions
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_KEY_PREFIX = "known_slugs:"
+
+# Сколько примеров slug показывать в сводке по модели
+MISS_EXAMPLES = 5
+
+# Метка модели -> (версия тега, frozenset slug) в памяти процесса
+_local = {}
+_local_lock = threading.Lock()
+
+# Промахи с последней сводки
+_misses = Counter()
+_miss_examples = defaultdict(list)
+_miss_lock = threading.Lock()
+_last_report = time.monotonic()
+
+
+def known_slugs(model):
+    """Множество всех slug модели (актуальное по версии тега модели)."""
+    label = model._meta.label_lower
+    [(_, version)] = get_tag_versions([label])
+    cached = _local.get(label)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    slugs = get_or_set_tagged(
+        REGISTRY_KEY_PREFIX + label,
+        lambda: frozenset(model._default_manager.order_by().values_list("slug", flat=True)),
+        depends_on=[model],
+    )
+    # Версия прочитана до построения: если данные успели измениться,
+    # следующая проверка увидит новую версию и перечитает реестр
+    with _local_lock:
+        _local[label] = (version, slugs)
+    return slugs
+
+
+def slug_exists(model, slug):
+    return slug in known_slugs(model)
+
+
+def note_missing(model, slug):
+    """Учитывает запрос несуществующего объекта; сводка — не чаще SLUG_MISS_LOG_INTERVAL."""
+    global _last_report
+    label = model._meta.label_lower
+    interval = getattr(settings, "SLUG_MISS_LOG_INTERVAL", 60)
+    with _miss_lock:
+        _misses[label] += 1
+        examples = _miss_examples[label]
+        if len(examples) < MISS_EXAMPLES and slug not in examples:
+            examples.append(slug)
+        now = time.monotonic()
+        if now - _last_report < interval:
+            return
+        elapsed = now - _last_report
+        report = [(label, count, _miss_examples[label]) for label, count in _misses.most_common()]
+        _misses.clear()
+        _miss_examples.clear()
+        _last_report = now
+    logger.warning(
+        "Запросы несуществующих объектов за %d с: %s",
+        elapsed,
+        "; ".join("%s — %d (%s)" % (label, count, ", ".join(examples)) for label, count, examples in report),
+    )
+
+
+def known_slug_required(model):
+    """
+    Декоратор детального представления с параметром slug: неизвестный slug —
+    404 без запросов к БД. Ставится над conditional_view, чтобы и проверка
+    валидаторов не обращалась к БД.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            slug = kwargs.get("slug")
+            if slug is not None and not slug_exists(model, slug):
+                note_missing(model, slug)
+                # Отметка для фильтра логгера django.request (без строки "Not Found")
+                request.slug_registry_miss = True
+                raise Http404("No %s matches the given query." % model._meta.object_name)
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,306 @@
+"""
+Модуль static_export.py приложения main
+
+Экспорт публичных страниц в статические HTML-файлы.
+
+Все URL из карт сайта (main/sitemaps.py -> SITEMAPS: страницы, новости,
+портфолио, услуги, база знаний, их категории и разделы) рендерятся так,
+как их видит анонимный посетитель, и записываются в STATIC_EXPORT_ROOT:
+"/news/slug/" -> "news/slug/index.html" рядом с index.html.gz и (если
+установлен пакет brotli) index.html.br. Каталог отдается nginx
+(try_files + gzip_static/brotli_static) или whitenoise без вызова Django.
+
+Обновление инкрементальное. В manifest.json для каждого URL хранятся
+версии тегов моделей, прочитанных при рендере (main/cache_tags.py), —
+тех же зависимостей, что у кэша страниц. Перерисовываются только страницы,
+у которых изменилась версия хотя бы одного тега; файлы URL, исчезнувших
+из карт сайта, удаляются. Неизменившийся HTML не перезаписывается.
+Страницы с POST-формами (CSRF-токен, капча) не экспортируются — им нужна
+сессия посетителя, и их по-прежнему отдает Django.
+
+Полная пересборка рендерит страницы пачками в пуле процессов
+(ProcessPoolExecutor), по одному Django-клиенту на процесс.
+
+Запуск:
+    python manage.py export_static_site [--full] [--workers N]
+    STATIC_EXPORT_ENABLED=True — обновление после изменения контента (main/tasks.py)
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client
+
+from .cache_tags import get_tag_versions, record_dependencies, tracked_tags
+from .page_cache import service_render
+from .sitemaps import SITEMAPS
+from .view_counters import uncounted_views
+
+try:
+    import brotli
+except ImportError:  # необязательная зависимость: без нее пишутся только .gz
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Сколько URL рендерит процесс пула за одно задание
+BATCH_SIZE = 50
+
+# Блокировка от одновременных экспортов (команда и фоновая задача)
+LOCK_KEY = "static_export:lock"
+LOCK_TIMEOUT = 60 * 60
+
+# Признак формы, которой нужна сессия посетителя
+CSRF_FIELD = b'name="csrfmiddlewaretoken"'
+
+# Отметка о запланированном обновлении (объединяет изменения за STATIC_EXPORT_DELAY)
+SCHEDULED_KEY = "static_export:scheduled"
+
+
+def export_root():
+    return Path(getattr(settings, "STATIC_EXPORT_ROOT", Path(settings.BASE_DIR) / "static_export"))
+
+
+def export_paths():
+    """Пути всех страниц из карт сайта (без повторов, в порядке карт)."""
+    paths = {}
+    for sitemap_class in SITEMAPS.values():
+        sitemap = sitemap_class()
+        for item in sitemap.items():
+            paths.setdefault(sitemap.location(item), None)
+    return list(paths)
+
+
+def html_path(path):
+    """Относительный путь файла для URL: "/news/a/" -> "news/a/index.html"."""
+    relative = path.lstrip("/")
+    if not relative or relative.endswith("/"):
+        relative += "index.html"
+    return relative
+
+
+def _write_atomic(target, data):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(".%s.tmp%s" % (target.name, os.getpid()))
+    tmp.write_bytes(data)
+    os.replace(tmp, target)
+
+
+def _write_variants(root, relative, content):
+    """Пишет HTML и предсжатые варианты; возвращает список относительных путей."""
+    files = [relative]
+    _write_atomic(root / relative, content)
+    _write_atomic(root / (relative + ".gz"), gzip.compress(content, 9, mtime=0))
+    files.append(relative + ".gz")
+    if brotli is not None:
+        _write_atomic(root / (relative + ".br"), brotli.compress(content))
+        files.append(relative + ".br")
+    return files
+
+
+def _remove_files(root, files):
+    for relative in files:
+        try:
+            (root / relative).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+    connections.close_all()
+
+
+def render_batch(batch, root, host, secure):
+    """
+    Рендерит пачку URL и записывает изменившиеся файлы.
+
+    Args:
+        batch (list): пары (path, sha256 прошлого экспорта или None)
+        root (str): каталог экспорта
+
+    Returns:
+        list: словари {path, status, stamp, sha256, files, written}
+    """
+    root = Path(root)
+    client = Client(HTTP_HOST=host, secure=secure)
+    all_tags = tracked_tags()
+    results = []
+    # Служебный рендер: без кэша страниц, без потоковых ответов и без учета просмотров
+    # (флаги контекста, а не override_settings: настройки общие для всех потоков процесса)
+    with service_render(), uncounted_views():
+        for path, previous_sha in batch:
+            client.cookies.clear()
+            # Версии читаются до рендера: изменение во время рендера
+            # оставит страницу устаревшей и она перерисуется в следующий раз
+            versions = dict(get_tag_versions(all_tags))
+            with record_dependencies() as tags:
+                response = client.get(path)
+            result = {"path": path, "status": response.status_code, "written": False}
+            if response.status_code != 200 or response.streaming:
+                results.append(result)
+                continue
+            content = response.content
+            result["stamp"] = sorted([tag, versions.get(tag)] for tag in tags)
+            if CSRF_FIELD in content:
+                result["dynamic"] = True
+                results.append(result)
+                continue
+            sha = hashlib.sha256(content).hexdigest()
+            relative = html_path(path)
+            if sha != previous_sha or not (root / relative).exists():
+                result["files"] = _write_variants(root, relative, content)
+                result["written"] = True
+            result["sha256"] = sha
+            results.append(result)
+    return results
+
+
+def _load_manifest(root, host, secure):
+    try:
+        manifest = json.loads((root / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("origin") != [host, secure]:
+        return {}
+    return manifest.get("pages", {})
+
+
+def _is_affected(entry, versions):
+    if entry is None:
+        return True
+    return any(versions.get(tag) != version for tag, version in entry["stamp"])
+
+
+def export_site(root=None, full=False, workers=None, host=None, secure=None, log=None):
+    """
+    Обновляет статический экспорт.
+
+    Args:
+        root (Path | None): каталог экспорта (STATIC_EXPORT_ROOT)
+        full (bool): перерисовать все страницы, не сверяя версии тегов
+        workers (int | None): число процессов (1 — без пула),
+            по умолчанию STATIC_EXPORT_WORKERS или число CPU
+        log (callable | None): функция вывода прогресса
+
+    Returns:
+        dict | None: счетчики rendered/written/unchanged/dynamic/skipped/removed/failed
+        или None, если экспорт уже выполняется
+    """
+    root = Path(root) if root else export_root()
+    host = host or settings.STATIC_EXPORT_HOST
+    secure = getattr(settings, "STATIC_EXPORT_HTTPS", False) if secure is None else secure
+    if workers is None:
+        workers = getattr(settings, "STATIC_EXPORT_WORKERS", None) or os.cpu_count() or 1
+    log = log or logger.info
+
+    if not cache.add(LOCK_KEY, os.getpid(), LOCK_TIMEOUT):
+        return None
+    try:
+        root.mkdir(parents=True, exist_ok=True)
+        pages = _load_manifest(root, host, secure)
+        versions = dict(get_tag_versions(tracked_tags()))
+        paths = export_paths()
+        stats = dict.fromkeys(("rendered", "written", "unchanged", "dynamic", "skipped", "removed", "failed"), 0)
+
+        # Страницы, исчезнувшие из карт сайта
+        for path in set(pages) - set(paths):
+            _remove_files(root, pages.pop(path)["files"])
+            stats["removed"] += 1
+
+        queue = []
+        for path in paths:
+            entry = pages.get(path)
+            if full or _is_affected(entry, versions):
+                queue.append((path, entry["sha256"] if entry else None))
+            else:
+                stats["skipped"] += 1
+        log("Страниц: %d, к рендеру: %d" % (len(paths), len(queue)))
+
+        batches = [queue[i:i + BATCH_SIZE] for i in range(0, len(queue), BATCH_SIZE)]
+        if workers > 1 and len(batches) > 1:
+            # Дочерние процессы не должны унаследовать открытые соединения с БД
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                render = partial(render_batch, root=str(root), host=host, secure=secure)
+                results = pool.map(render, batches)
+                _apply_results(root, pages, results, stats, log)
+        else:
+            results = (render_batch(batch, str(root), host, secure) for batch in batches)
+            _apply_results(root, pages, results, stats, log)
+
+        _write_atomic(
+            root / MANIFEST_NAME,
+            json.dumps(
+                {"version": MANIFEST_VERSION, "origin": [host, secure], "pages": pages},
+                ensure_ascii=False,
+                sort_keys=True,
+            ).encode(),
+        )
+        return stats
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _apply_results(root, pages, results, stats, log):
+    for batch_results in results:
+        for result in batch_results:
+            path = result["path"]
+            stats["rendered"] += 1
+            if "stamp" not in result:
+                # Страница больше не отдается (404, редирект) — старые файлы убираем
+                stats["failed"] += 1
+                log("Пропущена %s: HTTP %s" % (path, result["status"]))
+                entry = pages.pop(path, None)
+                if entry:
+                    _remove_files(root, entry["files"])
+                continue
+            if result.get("dynamic"):
+                # Форма с CSRF: страницу отдает Django, повторная проверка — при изменении зависимостей
+                entry = pages.get(path)
+                if entry:
+                    _remove_files(root, entry["files"])
+                pages[path] = {"stamp": result["stamp"], "sha256": None, "files": []}
+                stats["dynamic"] += 1
+                continue
+            files = result.get("files") or pages.get(path, {}).get("files", [])
+            pages[path] = {"stamp": result["stamp"], "sha256": result["sha256"], "files": files}
+            stats["written" if result["written"] else "unchanged"] += 1
+
+
+def schedule_export():
+    """
+    Планирует инкрементальное обновление экспорта после изменения контента.
+    Изменения за STATIC_EXPORT_DELAY секунд объединяются в одно обновление.
+    """
+    if not getattr(settings, "STATIC_EXPORT_ENABLED", False):
+        return
+    delay = getattr(settings, "STATIC_EXPORT_DELAY", 60)
+    if not cache.add(SCHEDULED_KEY, 1, delay):
+        return
+
+    from .tasks import export_static_site_task
+
+    try:
+        export_static_site_task.apply_async(countdown=delay)
+    except Exception as exc:
+        # Без фолбэка в потоке: экспорт рендерит весь сайт и не должен идти
+        # внутри воркера, который обслуживает посетителей
+        logger.warning(
+            f"Не удалось отправить задачу в Celery ({exc}), статический экспорт не обновлен: "
+            "запустите python manage.py export_static_site"
+        )
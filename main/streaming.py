@@ -0,0 +1,164 @@
+"""
+Модуль streaming.py приложения main
+
+Потоковый рендер тяжелых страниц (StreamingHttpResponse).
+
+Детальная новость с сотнями событий дня, список отзывов без пагинации и
+тикет с длинной перепиской собирали весь HTML в памяти и только потом
+отдавали первый байт. render_streaming() рендерит шаблон генератором:
+<head> и шапка уходят клиенту сразу, а тело страницы — частями по мере
+рендера. Браузер начинает загружать стили и скрипты, пока сервер еще
+выбирает события из базы.
+
+Генератор раскрывает только {% extends %} и {% block %}, чтобы дойти до
+узлов верхнего уровня страницы; каждый из них ({% if %}, {% for %},
+{% include %} и т.д.) рендерит сам Django (render_annotated), поэтому
+результат совпадает с render() байт в байт. Части копятся до
+STREAMING_CHUNK_SIZE символов; перед блоками из FLUSH_BLOCKS и перед
+каждым циклом верхнего уровня накопленное отправляется сразу.
+
+Совместимость с middleware:
+- CSRF: токен запрашивается до ответа, поэтому CsrfViewMiddleware успевает
+  выставить cookie, хотя форма рендерится уже после process_response;
+- сообщения: хранилище помечается прочитанным до ответа (MessageMiddleware
+  сохраняет его раньше, чем шаблон выведет сообщения);
+- сжатие: CompressionMiddleware сжимает поток gzip с flush после каждой
+  части (main/compression.py);
+- кэш страниц: ответ, который записывается в кэш страниц, рендерится как
+  обычно — потоковые ответы не кэшируются.
+
+STREAMING_RESPONSES_ENABLED = False возвращает обычный render().
+
+Сравнение TTFB и пиковой памяти: python manage.py bench_streaming
+"""
+
+from django.conf import settings
+from django.contrib import messages
+from django.http import StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import render
+from django.template.base import TextNode
+from django.template.context import make_context
+from django.template.defaulttags import ForNode
+from django.template.loader import get_template
+from django.template.loader_tags import BLOCK_CONTEXT_KEY, BlockContext, BlockNode, ExtendsNode
+
+from .page_cache import is_service_render
+from .request_cache import request_scope
+
+# Блоки, перед которыми накопленный HTML отправляется сразу
+FLUSH_BLOCKS = ("content",)
+
+# Маркер принудительной отправки накопленных частей
+_FLUSH = object()
+
+
+def is_enabled():
+    return getattr(settings, "STREAMING_RESPONSES_ENABLED", True)
+
+
+def should_stream(request):
+    """Потоковый ответ, если он не записывается в кэш страниц."""
+    return (
+        is_enabled()
+        and not is_service_render()
+        and not getattr(request, "_page_cache_recording", False)
+    )
+
+
+def render_streaming(request, template_name, context=None, content_type=None, status=None):
+    """Как django.shortcuts.render, но с потоковым рендером (или обычным, см. should_stream)."""
+    if not should_stream(request):
+        return render(request, template_name, context, content_type, status)
+
+    context = context or {}
+    # Шаблон загружается сразу: ошибка шаблона — обычный ответ 500, а не оборванный поток
+    template = get_template(template_name).template
+    get_token(request)
+    if "messages" not in context:
+        list(messages.get_messages(request))
+    return StreamingHttpResponse(
+        stream_template(template, context, request), content_type=content_type, status=status
+    )
+
+
+def stream_template(template, context, request=None):
+    """Генератор частей HTML шаблона (django.template.base.Template)."""
+    chunk_size = getattr(settings, "STREAMING_CHUNK_SIZE", 16 * 1024)
+    # Кэш уровня запроса закрыт вместе с middleware — у потока своя область
+    with request_scope():
+        context = make_context(context, request, autoescape=template.engine.autoescape)
+        with context.render_context.push_state(template), context.bind_template(template):
+            context.template_name = template.name
+            yield from _chunks(_iter_template(template, context), chunk_size)
+
+
+def _chunks(parts, chunk_size):
+    buffer, size = [], 0
+    for part in parts:
+        if part is not _FLUSH:
+            buffer.append(part)
+            size += len(part)
+        if buffer and (part is _FLUSH or size >= chunk_size):
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def _iter_template(template, context):
+    """Template._render: с {% extends %} — рендер родителя с блоками потомка."""
+    for node in template.nodelist:
+        if not isinstance(node, TextNode):
+            if isinstance(node, ExtendsNode):
+                yield from _iter_extends(node, context)
+                return
+            break
+    yield from _iter_nodes(template.nodelist, context)
+
+
+def _iter_extends(node, context):
+    """Повторяет ExtendsNode.render."""
+    parent = node.get_parent(context)
+    if BLOCK_CONTEXT_KEY not in context.render_context:
+        context.render_context[BLOCK_CONTEXT_KEY] = BlockContext()
+    block_context = context.render_context[BLOCK_CONTEXT_KEY]
+    block_context.add_blocks(node.blocks)
+    for parent_node in parent.nodelist:
+        if not isinstance(parent_node, TextNode):
+            if not isinstance(parent_node, ExtendsNode):
+                block_context.add_blocks({n.name: n for n in parent.nodelist.get_nodes_by_type(BlockNode)})
+            break
+    with context.render_context.push_state(parent, isolated_context=False):
+        yield from _iter_template(parent, context)
+
+
+def _iter_nodes(nodelist, context):
+    for node in nodelist:
+        if isinstance(node, BlockNode):
+            if node.name in FLUSH_BLOCKS:
+                yield _FLUSH
+            yield from _iter_block(node, context)
+        else:
+            if isinstance(node, ForNode):
+                yield _FLUSH
+            yield node.render_annotated(context)
+
+
+def _iter_block(node, context):
+    """Повторяет BlockNode.render (переопределение блока потомком, block.super)."""
+    block_context = context.render_context.get(BLOCK_CONTEXT_KEY)
+    with context.push():
+        if block_context is None:
+            context["block"] = node
+            yield from _iter_nodes(node.nodelist, context)
+            return
+        push = block = block_context.pop(node.name)
+        if block is None:
+            block = node
+        block = type(node)(block.name, block.nodelist)
+        block.context = context
+        context["block"] = block
+        yield from _iter_nodes(block.nodelist, context)
+        if push is not None:
+            block_context.push(node.name, push)
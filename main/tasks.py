@@ -0,0 +1,53 @@
+import logging
+
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name="static_export.update", ignore_result=True)
+def export_static_site_task():
+    """
+    Фоновая задача: инкрементальное обновление статического экспорта страниц
+    (см. main/static_export.py). Выполняется в одном процессе — рабочие
+    процессы Celery не могут запускать пул; полную пересборку делает
+    команда export_static_site.
+    """
+    from .static_export import SCHEDULED_KEY, export_site, schedule_export
+    from django.core.cache import cache
+
+    stats = export_site(workers=1)
+    if stats is None:
+        # Экспорт уже идет: изменения могли не попасть в него — повторяем позже
+        cache.delete(SCHEDULED_KEY)
+        schedule_export()
+        return
+    logger.info(f"Статический экспорт обновлен: {stats}")
+
+
+@shared_task(name="images.derivatives", ignore_result=True)
+def build_image_derivatives_task(name):
+    """
+    Фоновая задача: производные WebP/AVIF нескольких ширин для загруженного
+    изображения (см. main/responsive_images.py).
+    """
+    from .responsive_images import build_derivatives
+
+    manifest = build_derivatives(name)
+    if manifest:
+        logger.info(f"Производные изображения {name}: {manifest['sources']}")
+
+
+@shared_task(name="images.og", ignore_result=True)
+def build_og_image_task(label, pk):
+    """
+    Фоновая задача: изображение Open Graph объекта в PNG и WebP
+    (см. main/og_utils.py).
+    """
+    from django.apps import apps
+
+    from .og_utils import build_og_image
+
+    instance = apps.get_model(label)._default_manager.filter(pk=pk).first()
+    if instance is not None and build_og_image(instance):
+        logger.info(f"OG-изображение {label} {pk} нарисовано")
@@ -0,0 +1,43 @@
+from django import template
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from main.deferred import FRAGMENTS, fragment_url, is_enabled, render_fragment
+
+register = template.Library()
+
+TRIGGERS = {"revealed", "load"}
+
+
+@register.simple_tag
+def deferred(name, trigger="revealed", **params):
+    """
+    Отложенный фрагмент (см. main/deferred.py).
+
+    Использование:
+        {% load deferred %}
+        {% deferred "latest_news" %}
+        {% deferred "related_news" slug=news.slug trigger="load" %}
+
+    Выводит заглушку, которую HTMX заменяет блоком с /fragments/<name>/,
+    когда она появляется на экране (revealed) или сразу после загрузки
+    страницы (load). При DEFERRED_FRAGMENTS_ENABLED = False блок
+    рендерится на месте.
+    """
+    if name not in FRAGMENTS:
+        raise template.TemplateSyntaxError('"deferred": неизвестный фрагмент %r' % name)
+    if trigger not in TRIGGERS:
+        raise template.TemplateSyntaxError('"deferred": trigger должен быть "revealed" или "load"')
+    if not is_enabled():
+        return mark_safe(render_fragment(name, params))
+    fragment = FRAGMENTS[name]
+    return format_html(
+        # hx-target и hx-push-url задаются явно: блок может стоять внутри
+        # элемента, от которого они наследуются (#news-results)
+        '<div class="deferred-fragment {}" style="min-height: {}px" aria-busy="true" '
+        'hx-get="{}" hx-trigger="{}" hx-target="this" hx-swap="outerHTML" hx-push-url="false"></div>',
+        fragment.placeholder_class,
+        fragment.min_height,
+        fragment_url(name, params),
+        trigger,
+    )
@@ -0,0 +1,28 @@
+from urllib.parse import urlencode
+
+from django import template
+from django.urls import reverse
+
+from main.og_utils import is_enabled, og_image_url as prerendered_url, og_text, theme
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def og_image_url(context, obj):
+    """
+    Абсолютный URL изображения Open Graph объекта (см. main/og_utils.py).
+
+    Использование:
+        {% load og_images %}
+        {% block og_image %}{% og_image_url news %}{% endblock %}
+
+    Пока заранее нарисованного файла нет, выводится URL представления
+    og_image с заголовком и подзаголовком объекта.
+    """
+    request = context.get("request")
+    url = prerendered_url(obj) if is_enabled() else None
+    if url is None:
+        title, subtitle = og_text(obj)
+        url = "%s?%s" % (reverse("main:og_image"), urlencode({"title": title, "subtitle": subtitle, "theme": theme()}))
+    return request.build_absolute_uri(url) if request is not None else url
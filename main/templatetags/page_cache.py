@@ -0,0 +1,27 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from main.page_cache import HOLE_MARKER, hole_template_name
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def page_hole(context, name):
+    """
+    Персональная часть страницы, не попадающая в кэш страниц.
+
+    Использование:
+        {% load page_cache %}
+        {% page_hole "cart_badge" %}
+
+    При записи страницы в кэш выводит метку, вместо которой при отдаче
+    подставляется templates/includes/holes/<name>.html (см. main/page_cache.py).
+    В остальных случаях сразу рендерит этот шаблон с текущим контекстом.
+    """
+    request = context.get("request")
+    if request is not None and getattr(request, "_page_cache_recording", False):
+        return mark_safe(HOLE_MARKER % name)
+    hole = context.template.engine.get_template(hole_template_name(name))
+    with context.push():
+        return mark_safe(hole.render(context))
@@ -0,0 +1,40 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+
+from main.responsive_images import MIME_TYPES, get_manifest, is_enabled, srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, alt="", sizes="100vw", **attrs):
+    """
+    Адаптивное изображение (см. main/responsive_images.py).
+
+    Использование:
+        {% load responsive_images %}
+        {% responsive_image news.image alt=news.title sizes="(max-width: 768px) 100vw, 33vw" class="w-100" loading="lazy" %}
+
+    Выводит <picture> с <source> AVIF/WebP (srcset по готовым ширинам и
+    sizes) и <img> с оригиналом как запасным вариантом. Остальные
+    именованные аргументы становятся атрибутами <img>. Пока производные
+    не построены, выводится только <img>.
+    """
+    if not image:
+        return ""
+    attrs = {"src": image.url, "alt": alt, **attrs}
+    manifest = get_manifest(image.name) if is_enabled() else None
+    if not manifest:
+        return format_html("<img{}>", flatatt(attrs))
+
+    if manifest.get("width"):
+        attrs.setdefault("width", manifest["width"])
+        attrs.setdefault("height", manifest["height"])
+    attrs.setdefault("decoding", "async")
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}">',
+        ((MIME_TYPES[fmt], srcset(image.name, manifest, fmt), sizes) for fmt in manifest["sources"]),
+    )
+    return format_html('<picture class="responsive-picture">{}<img{}></picture>', sources, flatatt(attrs))
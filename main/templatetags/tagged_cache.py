@@ -0,0 +1,84 @@
+import time
+
+from django import template
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from main.cache_tags import get_tag_versions, get_tagged, set_tagged, tags_for
+
+register = template.Library()
+
+# Маркер промаха (None — допустимое значение в кэше)
+_MISSING = object()
+
+
+class TaggedCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, fragment_name, vary_on, depends_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.depends_on = depends_on
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        if timeout is not None:
+            try:
+                timeout = int(timeout)
+            except (ValueError, TypeError):
+                raise template.TemplateSyntaxError(
+                    '"cache_tagged": время жизни должно быть целым числом: %r' % timeout
+                )
+        depends_on = [dependency.resolve(context) for dependency in self.depends_on]
+        key = make_template_fragment_key(
+            self.fragment_name, [var.resolve(context) for var in self.vary_on]
+        )
+        value = get_tagged(key, depends_on, _MISSING)
+        if value is _MISSING:
+            # Версии читаются до рендера: изменения во время рендера не потеряются
+            versions = get_tag_versions(tags_for(*depends_on))
+            started = time.monotonic()
+            value = self.nodelist.render(context)
+            # Время рендера фрагмента — для инспектора кэша (TwoTierCache)
+            record_compute = getattr(cache, "record_compute", None)
+            if record_compute is not None:
+                record_compute(key, time.monotonic() - started)
+            set_tagged(key, value, depends_on, timeout, versions)
+        return value
+
+
+@register.tag("cache_tagged")
+def do_cache_tagged(parser, token):
+    """
+    Кэширует фрагмент шаблона до изменения моделей, от которых он зависит.
+
+    Использование:
+        {% load tagged_cache %}
+        {% cache_tagged [timeout] [fragment_name] [var1] ... depends_on "app.Model" [...] %}
+            ... содержимое ...
+        {% endcache_tagged %}
+
+    Версии тегов моделей меняются сигналами (main/cache_tags.py), поэтому
+    фрагмент обновляется сразу после сохранения, а timeout лишь ограничивает
+    срок хранения (None — без ограничения).
+    """
+    nodelist = parser.parse(("endcache_tagged",))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if "depends_on" not in bits:
+        raise template.TemplateSyntaxError(
+            "'%r' требует список моделей после depends_on." % bits[0]
+        )
+    split = bits.index("depends_on")
+    head, dependencies = bits[1:split], bits[split + 1:]
+    if len(head) < 2 or not dependencies:
+        raise template.TemplateSyntaxError(
+            "'%r' принимает timeout, имя фрагмента и хотя бы одну модель." % bits[0]
+        )
+    return TaggedCacheNode(
+        nodelist,
+        parser.compile_filter(head[0]),
+        head[1],
+        [parser.compile_filter(var) for var in head[2:]],
+        [parser.compile_filter(dependency) for dependency in dependencies],
+    )
@@ -0,0 +1,22 @@
+from django import template
+
+from main.thumbnails import thumbnail_url as build_thumbnail_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_url(image, width, height=0):
+    """
+    URL миниатюры (см. main/thumbnails.py).
+
+    Использование:
+        {% load thumbnails %}
+        <img src="{% thumbnail_url obj.image 100 100 %}">
+
+    Обе стороны заданы — обрезка по центру, высота 0 — пропорционально.
+    Для пустого поля возвращается пустая строка.
+    """
+    if not image:
+        return ""
+    return build_thumbnail_url(image, int(width), int(height))
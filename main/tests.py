@@ -1,3 +1,1313 @@
-from django.test import TestCase
+import tempfile
+from pathlib import Path
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from .cache_tags import get_or_set_tagged
+from .header_resolver import resolve_header
+from .lazy_context import get_usage_report, lazy_context, reset_usage_report
+from .models import Page
+from .site_chrome import get_site_chrome
+
+
+class SiteChromeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_snapshot_is_cached_and_read_without_queries(self):
+        Page.objects.create(title="О нас", slug="o-nas")
+        first = get_site_chrome()
+        self.assertEqual([p.slug for p in first["menu_pages"]], ["o-nas"])
+
+        with self.assertNumQueries(0):
+            second = get_site_chrome()
+        self.assertEqual(second["version"], first["version"])
+
+    def test_snapshot_rebuilt_after_menu_page_change(self):
+        first = get_site_chrome()
+        Page.objects.create(title="Контакты", slug="kontakty")
+
+        second = get_site_chrome()
+        self.assertNotEqual(second["version"], first["version"])
+        self.assertEqual([p.slug for p in second["menu_pages"]], ["kontakty"])
+
+
+class HeaderResolverTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_page_header_resolved_from_index_without_queries(self):
+        Page.objects.create(title="О нас", slug="o-nas", meta_description="Кто мы")
+        resolve_header("/page/o-nas/")
+
+        with self.assertNumQueries(0):
+            header = resolve_header("/page/o-nas/")
+        self.assertEqual(header, ("О нас", "Кто мы", None))
+
+    def test_index_updated_after_page_save(self):
+        page = Page.objects.create(title="Старый", slug="about")
+        self.assertEqual(resolve_header("/page/about/")[0], "Старый")
+
+        page.meta_title = "Новый"
+        page.save()
+        self.assertEqual(resolve_header("/page/about/")[0], "Новый")
+
+    def test_section_defaults_for_unknown_slug(self):
+        self.assertEqual(
+            resolve_header("/news/unknown-slug/"),
+            ("Новости и Статьи", "Актуальные события и обновления", None),
+        )
+
+
+class LazyContextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_usage_report()
+
+    def test_processors_do_not_query_until_key_is_read(self):
+        from news.context_processors import latest_news
+
+        request = RequestFactory().get("/")
+        with self.assertNumQueries(0):
+            context = latest_news(request)
+        with self.assertNumQueries(1):
+            self.assertEqual(list(context["latest_news"]), [])
+        # Повторный рендер в том же запросе использует вычисленное значение
+        with self.assertNumQueries(0):
+            self.assertEqual(len(latest_news(request)["latest_news"]), 0)
+
+    @override_settings(CONTEXT_USAGE_TRACKING=True)
+    def test_usage_report_lists_unused_keys(self):
+        request = RequestFactory().get("/")
+        context = lazy_context(request, used=lambda: [1], unused=lambda: [2])
+        self.assertEqual(len(context["used"]), 1)
+
+        report = get_usage_report()["-"]
+        self.assertEqual(report["requests"], 1)
+        self.assertEqual(report["unused"], ["unused"])
+        self.assertIn("used", report["touched"])
+
+
+class TwoTierCacheTests(TestCase):
+    def make_cache(self, name, path):
+        from mysite.cache_backends import TwoTierCache
+
+        return TwoTierCache(name, {
+            "OPTIONS": {
+                "POLL_INTERVAL": 0,
+                "L2": {"BACKEND": "mysite.cache_backends.SQLiteCache", "LOCATION": path},
+            },
+        })
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = str(Path(tmp.name) / "cache.sqlite3")
+        # Два экземпляра с разными L1 имитируют два воркера
+        self.worker_a = self.make_cache("worker-a-%s" % self._testMethodName, path)
+        self.worker_b = self.make_cache("worker-b-%s" % self._testMethodName, path)
+
+    def test_value_shared_through_l2(self):
+        self.worker_a.set("latest_news", [1, 2, 3])
+        self.assertEqual(self.worker_b.get("latest_news"), [1, 2, 3])
+        self.assertEqual(self.worker_b.get("latest_news"), [1, 2, 3])
+
+        stats = self.worker_b.get_stats()
+        self.assertEqual(stats["l2_hits"], 1)
+        self.assertEqual(stats["l1_hits"], 1)
+
+    def test_delete_and_set_are_broadcast_to_other_l1(self):
+        self.worker_a.set("fragment", "old")
+        self.assertEqual(self.worker_b.get("fragment"), "old")
+
+        self.worker_a.set("fragment", "new")
+        self.assertEqual(self.worker_b.get("fragment"), "new")
+
+        self.worker_a.delete("fragment")
+        self.assertIsNone(self.worker_b.get("fragment"))
+        self.assertGreaterEqual(self.worker_b.get_stats()["invalidations_received"], 2)
+
+    def test_add_respects_shared_value(self):
+        self.assertTrue(self.worker_a.add("lock", 1))
+        self.assertFalse(self.worker_b.add("lock", 2))
+        self.assertEqual(self.worker_b.get("lock"), 1)
+
+    def test_key_group(self):
+        from mysite.cache_backends import key_group
+
+        self.assertEqual(key_group("page:0123abcd"), "page")
+        self.assertEqual(key_group("og_image_" + "a" * 32), "og_image")
+        self.assertEqual(key_group("template.cache.homepage_news." + "b" * 32), "template.cache.homepage_news")
+        self.assertEqual(key_group("latest_news"), "latest_news")
+
+    def test_group_stats_and_entries(self):
+        self.worker_a.set("page:1", "x" * 1000)
+        self.worker_a.set("page:2", "y")
+        self.worker_a.get("page:1")
+        self.worker_a.get("page:missing")
+        self.worker_a.record_compute("page:1", 0.25)
+
+        page = self.worker_a.get_group_stats()["page"]
+        self.assertEqual((page["hits"], page["misses"], page["sets"]), (1, 1, 2))
+        self.assertEqual(page["compute_ms"], 250)
+        # Размер записи — по pickle, уже сохраненному в L1
+        self.assertGreater(page["set_bytes"], 1000)
+
+        sizes = {key: size for key, group, size, _ in self.worker_a.entries()}
+        self.assertGreater(sizes["page:1"], 1000)
+
+    def test_collect_stats_reads_other_processes_from_l2(self):
+        # Счетчики другого воркера, сохраненные им в L2
+        other = {"pid": 999999, "updated": 0, "levels": {}, "groups": {"page": {"hits": 5}}}
+        self.worker_a.l2.set("cache_stats:%s:999999" % self.worker_a.name, other, 60)
+
+        pids = [snapshot["pid"] for snapshot in self.worker_a.collect_stats()]
+        self.assertIn(999999, pids)
+        self.assertEqual(len(pids), 2)
+
+    def test_delete_group_purges_l2_and_other_l1(self):
+        self.worker_a.set("page:1", "a")
+        self.worker_a.set("page:2", "b")
+        self.worker_a.set("latest_news", [1])
+        self.assertEqual(self.worker_b.get("page:1"), "a")
+
+        self.assertEqual(self.worker_a.delete_group("page"), 2)
+        self.assertIsNone(self.worker_b.get("page:1"))
+        self.assertIsNone(self.worker_a.get("page:2"))
+        self.assertEqual(self.worker_b.get("latest_news"), [1])
+
+
+class CacheTagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_value_recomputed_after_dependency_saved(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(get_or_set_tagged("pages", build, ["main.Page"]), 1)
+        self.assertEqual(get_or_set_tagged("pages", build, ["main.Page"]), 1)
+
+        Page.objects.create(title="Новая", slug="new")
+        self.assertEqual(get_or_set_tagged("pages", build, ["main.Page"]), 2)
+
+    def test_views_counter_update_does_not_invalidate(self):
+        from .signals import bump_model_cache_tag
+
+        get_or_set_tagged("pages", lambda: "cached", [Page])
+        bump_model_cache_tag(sender=Page, update_fields={"views"})
+        self.assertEqual(get_or_set_tagged("pages", lambda: "fresh", [Page]), "cached")
+
+    def test_value_built_before_commit_invalidated_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Page.objects.create(title="Новая", slug="new")
+            # Параллельный запрос собрал значение до фиксации транзакции
+            get_or_set_tagged("pages", lambda: "stale", [Page])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_or_set_tagged("pages", lambda: "fresh", [Page]), "fresh")
+
+    def test_template_fragment_invalidated_by_tag(self):
+        from django.template import Context, Template
+
+        tpl = Template(
+            '{% load tagged_cache %}'
+            '{% cache_tagged 600 pages_block depends_on "main.Page" %}{{ value }}{% endcache_tagged %}'
+        )
+        self.assertEqual(tpl.render(Context({"value": "old"})), "old")
+        self.assertEqual(tpl.render(Context({"value": "new"})), "old")
+
+        Page.objects.create(title="Новая", slug="new")
+        self.assertEqual(tpl.render(Context({"value": "new"})), "new")
+
+
+class AnonymousPageCacheTests(TestCase):
+    def setUp(self):
+        from datetime import date
+
+        from news.models import News, NewsCategory
+
+        cache.clear()
+        category = NewsCategory.objects.create(name="Акции", slug="promotions")
+        self.news = News.objects.create(
+            title="Первая новость", slug="first-news", category=category,
+            news_date=date(2026, 7, 29), content="<p>Текст</p>",
+        )
+
+    def test_second_request_served_from_cache_and_counts_view(self):
+        url = "/news/first-news/"
+        miss = self.client.get(url)
+        self.assertEqual(miss["X-Page-Cache"], "MISS")
+
+        with self.assertNumQueries(1):  # только UPDATE счетчика просмотров
+            response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "HIT")
+        # Промах и попадание различаются для прокси одинаково
+        for vary in ("Cookie", "HX-Request"):
+            self.assertIn(vary, miss["Vary"])
+            self.assertIn(vary, response["Vary"])
+        self.assertContains(response, "Первая новость")
+        self.assertNotContains(response, "<!--page-")
+        self.news.refresh_from_db()
+        self.assertEqual(self.news.views, 2)
+
+    def test_page_invalidated_when_rendered_object_changes(self):
+        url = "/news/first-news/"
+        self.client.get(url)
+        self.news.title = "Новый заголовок"
+        self.news.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "MISS")
+        self.assertContains(response, "Новый заголовок")
+
+    def test_empty_list_invalidated_by_first_object(self):
+        from knowledge_base.models import Article, Category
+
+        category = Category.objects.create(title="Раздел", slug="section", content="<p>Текст</p>")
+        url = "/knowledge-base/category/section/"
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)["X-Page-Cache"], "HIT")
+        Article.objects.create(category=category, title="Первая статья", slug="first", content="<p>Текст</p>")
+
+        response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "MISS")
+        self.assertContains(response, "Первая статья")
+
+    def test_cart_hole_filled_per_visitor(self):
+        from services.models import Service
+
+        service = Service.objects.create(
+            title="Услуга", slug="service", price_type="fixed", price_fixed=1000
+        )
+        url = "/news/first-news/"
+        self.client.get(url)
+
+        session = self.client.session
+        session["cart"] = {
+            "service_%s" % service.pk: {"item_type": "service", "item_id": str(service.pk), "quantity": 3}
+        }
+        session.save()
+        response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "HIT")
+        self.assertRegex(response.content.decode(), r'id="header-cart-badge"[^>]*>\s*3')
+
+    def test_authenticated_users_bypass_cache(self):
+        from django.contrib.auth import get_user_model
+
+        user = get_user_model().objects.create_user(username="u", password="p")
+        self.client.force_login(user)
+        self.client.get("/news/first-news/")
+        self.assertFalse(self.client.get("/news/first-news/").has_header("X-Page-Cache"))
+
+
+@override_settings(PAGE_CACHE_ENABLED=False)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        from datetime import date
+
+        from news.models import News, NewsCategory
+
+        cache.clear()
+        category = NewsCategory.objects.create(name="Акции", slug="promotions")
+        self.news = News.objects.create(
+            title="Первая новость", slug="first-news", category=category,
+            news_date=date(2026, 7, 29), content="<p>Текст</p>",
+        )
+
+    def test_matching_etag_returns_304_and_counts_view(self):
+        url = "/news/first-news/"
+        response = self.client.get(url)
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.news.refresh_from_db()
+        self.assertEqual(self.news.views, 2)
+
+    def test_etag_changes_when_object_saved(self):
+        url = "/news/first-news/"
+        etag = self.client.get(url)["ETag"]
+        self.news.title = "Новый заголовок"
+        self.news.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_etag_changes_with_season(self):
+        from unittest import mock
+
+        url = "/news/first-news/"
+        with mock.patch("main.conditional.season_theme", return_value={"current_season": "summer"}):
+            etag = self.client.get(url)["ETag"]
+        with mock.patch("main.conditional.season_theme", return_value={"current_season": "autumn"}):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    @override_settings(PAGE_CACHE_ENABLED=True)
+    def test_page_cache_hit_answers_304(self):
+        url = "/news/first-news/"
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        from .single_flight import reset_stats
+
+        cache.clear()
+        reset_stats()
+
+    def test_concurrent_misses_compute_once(self):
+        import threading
+        import time
+
+        from .single_flight import get_or_compute, get_stats
+
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return "value"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_compute("sf", build, 60)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["value"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(get_stats()["sf"]["compute"], 1)
+
+    def test_stale_value_served_while_refreshing(self):
+        import time
+
+        from .single_flight import get_or_compute, get_stats
+
+        get_or_compute("sf", lambda: "old", 0, stale_ttl=60)  # сразу устаревает
+        self.assertEqual(get_or_compute("sf", lambda: "new", 60, stale_ttl=60), "old")
+
+        deadline = time.monotonic() + 2
+        while get_or_compute("sf", lambda: "newer", 60) != "new" and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(get_or_compute("sf", lambda: "newer", 60), "new")
+        stats = get_stats()["sf"]
+        self.assertEqual((stats["stale"], stats["refresh"], stats["compute"]), (1, 1, 1))
+
+
+class StaticExportTests(TestCase):
+    def setUp(self):
+        from datetime import date
+
+        from news.models import News, NewsCategory
+
+        import shutil
+
+        cache.clear()
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        category = NewsCategory.objects.create(name="Акции", slug="promotions")
+        self.news = News.objects.create(
+            title="Первая новость", slug="first-news", category=category,
+            news_date=date(2026, 7, 29), content="<p>Текст</p>",
+        )
+
+    def export(self):
+        from .static_export import export_site
+
+        return export_site(root=self.root, workers=1, host="testserver", log=lambda message: None)
+
+    def test_pages_written_with_compressed_variant_without_counting_views(self):
+        self.export()
+        page = self.root / "news" / "first-news" / "index.html"
+        self.assertIn("Первая новость", page.read_text(encoding="utf-8"))
+        self.assertTrue((self.root / "news" / "first-news" / "index.html.gz").exists())
+        self.news.refresh_from_db()
+        self.assertEqual(self.news.views, 0)
+
+    def test_only_affected_pages_rerendered(self):
+        first = self.export()
+        self.assertEqual(self.export()["rendered"], 0)
+
+        self.news.title = "Новый заголовок"
+        self.news.save()
+        stats = self.export()
+        self.assertGreater(stats["written"], 0)
+        self.assertIn(
+            "Новый заголовок",
+            (self.root / "news" / "first-news" / "index.html").read_text(encoding="utf-8"),
+        )
+
+        self.news.delete()
+        stats = self.export()
+        self.assertEqual(stats["removed"], 1)
+        self.assertFalse((self.root / "news" / "first-news" / "index.html").exists())
+        self.assertGreater(first["written"], 0)
+
+    def test_export_bypass_is_per_request_not_settings(self):
+        from unittest import mock
+
+        from django.conf import settings
+
+        from .page_cache import service_render
+
+        with service_render():
+            self.assertFalse(self.client.get("/news/first-news/").has_header("X-Page-Cache"))
+            self.assertTrue(settings.PAGE_CACHE_ENABLED)
+        self.assertEqual(self.client.get("/news/first-news/")["X-Page-Cache"], "MISS")
+
+        # Без брокера экспорт не запускается в процессе веб-сервера
+        from .static_export import SCHEDULED_KEY, schedule_export
+
+        cache.delete(SCHEDULED_KEY)
+        with override_settings(STATIC_EXPORT_ENABLED=True), \
+                mock.patch("main.tasks.export_static_site_task.apply_async", side_effect=OSError), \
+                mock.patch("threading.Timer") as timer, mock.patch("threading.Thread") as thread:
+            schedule_export()
+        timer.assert_not_called()
+        thread.assert_not_called()
+
+
+class CacheWarmupTests(TestCase):
+    def setUp(self):
+        from datetime import date
+
+        from news.models import News, NewsCategory
+
+        cache.clear()
+        category = NewsCategory.objects.create(name="Акции", slug="promotions")
+        self.news = News.objects.create(
+            title="Первая новость", slug="first-news", category=category,
+            news_date=date(2026, 7, 29), content="<p>Текст</p>",
+        )
+
+    def test_home_first_details_last_and_pages_cached(self):
+        from .cache_warmup import warm_up
+        from .page_cache import get_page, page_cache_key
+
+        results = warm_up(workers=1, host="testserver", log=lambda message: None)
+        paths = [result["path"] for result in results]
+        self.assertEqual(paths[0], "/")
+        self.assertGreater(paths.index("/news/first-news/"), paths.index("/news/"))
+        self.assertTrue(all(result["status"] == 200 for result in results))
+
+        request = RequestFactory().get("/news/first-news/")
+        self.assertIsNotNone(get_page(page_cache_key(request)))
+        self.news.refresh_from_db()
+        self.assertEqual(self.news.views, 0)
+
+
+class RequestCacheTests(TestCase):
+    def setUp(self):
+        Page.objects.create(title="О нас", slug="o-nas")
+
+    def test_object_fetched_once_per_scope_and_by_pk(self):
+        from .request_cache import get_object, request_scope
+
+        with request_scope() as store:
+            with self.assertNumQueries(1):
+                page = get_object(Page, slug="o-nas")
+                self.assertIs(get_object(Page, slug="o-nas"), page)
+                self.assertIs(get_object(Page, pk=page.pk), page)
+        self.assertEqual(store.hits, 2)
+
+    def test_saved_model_is_forgotten(self):
+        from .request_cache import get_object, request_scope
+
+        with request_scope():
+            page = get_object(Page, slug="o-nas")
+            Page.objects.create(title="Контакты", slug="kontakty")
+            with self.assertNumQueries(1):
+                self.assertIsNot(get_object(Page, slug="o-nas"), page)
+
+    def test_no_memoization_outside_scope(self):
+        from .request_cache import get_object
+
+        with self.assertNumQueries(2):
+            get_object(Page, slug="o-nas")
+            get_object(Page, slug="o-nas")
+
+
+class CacheInspectorTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+
+        self.staff = get_user_model().objects.create_user("staff", password="x", is_staff=True)
+        self.client.force_login(self.staff)
+
+    def test_report_page_and_tag_reset(self):
+        from .cache_tags import get_tag_versions
+
+        response = self.client.get("/admin/dashboard/cache/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("groups", response.context["report"])
+
+        before = dict(get_tag_versions(["main.page"]))["main.page"]
+        response = self.client.post("/admin/dashboard/cache/", {"action": "bump_tag", "tag": "main.page"})
+        self.assertRedirects(response, "/admin/dashboard/cache/", fetch_redirect_response=False)
+        self.assertNotEqual(dict(get_tag_versions(["main.page"]))["main.page"], before)
+
+    def test_unknown_tag_is_rejected(self):
+        response = self.client.post(
+            "/admin/dashboard/cache/", {"action": "bump_tag", "tag": "auth.user"}, follow=True
+        )
+        self.assertContains(response, "Неизвестный тег кэша")
+
+
+class SlugRegistryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_unknown_slug_rejected_without_queries(self):
+        self.client.get("/page/about/")  # реестр построен
+        with self.assertNumQueries(0):
+            response = self.client.get("/page/no-such-page/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_registry_follows_save_and_delete(self):
+        from .slug_registry import slug_exists
+
+        self.assertFalse(slug_exists(Page, "new-page"))
+        page = Page.objects.create(title="Новая", slug="new-page", content="<p>Текст</p>")
+        self.assertTrue(slug_exists(Page, "new-page"))
+        self.assertEqual(self.client.get("/page/new-page/").status_code, 200)
+        page.delete()
+        self.assertFalse(slug_exists(Page, "new-page"))
+
+    @override_settings(SLUG_MISS_LOG_INTERVAL=0)
+    def test_misses_logged_as_summary(self):
+        with self.assertLogs("main.slug_registry", "WARNING") as logs:
+            self.client.get("/page/bot-probe/")
+        self.assertIn("main.page — 1 (bot-probe)", logs.output[0])
+
+
+class CacheSerializationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_pack_compresses_only_large_values(self):
+        from .cache_serialization import pack, unpack
+
+        small, large = ["a"] * 3, ["текст"] * 2000
+        self.assertEqual(pack(small)[:1], b"p")
+        self.assertEqual(pack(large)[:1], b"z")
+        self.assertEqual(unpack(pack(large)), large)
+
+    def test_latest_news_cached_as_projection(self):
+        from datetime import date
+
+        from news.models import DailyEvent, News, NewsCategory
+        from news.views import get_latest_news
+
+        category = NewsCategory.objects.create(name="Акции", slug="promotions")
+        news = News.objects.create(
+            title="Первая новость", slug="first-news", category=category,
+            news_date=date(2026, 7, 29), content="<p>%s</p>" % ("Длинный текст " * 500),
+        )
+        DailyEvent.objects.create(news=news, title="Событие", description="<p>Описание</p>", event_type="page")
+        get_latest_news()
+
+        with self.assertNumQueries(0):
+            [latest] = get_latest_news()
+            self.assertEqual(
+                (latest.title, latest.category.name, latest.events_count, latest.get_absolute_url()),
+                ("Первая новость", "Акции", 1, "/news/first-news/"),
+            )
+        # Непроецированное поле догружается из БД, а не теряется
+        with self.assertNumQueries(1):
+            self.assertIn("Длинный текст", latest.content)
+        groups = cache.get_group_stats()
+        self.assertLess(groups["latest_news"]["stored_bytes"], groups["latest_news"]["original_bytes"])
+
+    def test_home_page_reads_only_projected_portfolio_fields(self):
+        from unittest import mock
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from portfolio.models import Portfolio, PortfolioCategory
+        from portfolio.views import get_latest_portfolio
+
+        category = PortfolioCategory.objects.create(name="Сайты", slug="sites", description="-")
+        with mock.patch("main.signals.schedule_og_image"), self.captureOnCommitCallbacks(execute=True):
+            for i in range(3):
+                Portfolio.objects.create(
+                    title=f"Работа {i}", slug=f"work-{i}", category=category, meta_description=f"Описание {i}",
+                )
+        get_latest_portfolio()
+        with override_settings(PAGE_CACHE_ENABLED=False):
+            # Фрагмент главной рендерится из проекции в кэше: поля работ не догружаются по одной
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/")
+            self.assertFalse([q for q in queries if 'FROM "portfolio_portfolio" WHERE' in q["sql"]])
+            self.assertContains(response, "Описание 2")
+            with self.assertNumQueries(0):
+                self.client.get("/")
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_negotiation(self):
+        from . import compression
+
+        self.assertEqual(compression.negotiate("gzip, deflate"), "gzip")
+        self.assertIsNone(compression.negotiate("gzip;q=0, identity"))
+        self.assertEqual(compression.negotiate("br;q=0, gzip"), "gzip")
+        self.assertEqual(compression.negotiate("br", shared=False), None)
+
+    def test_shared_page_compressed_once(self):
+        import gzip
+        from unittest import mock
+
+        from . import compression
+
+        self.client.get("/", HTTP_ACCEPT_ENCODING="gzip")
+        with mock.patch.object(compression, "compress_shared", wraps=compression.compress_shared) as compress:
+            first = self.client.get("/", HTTP_ACCEPT_ENCODING="gzip")
+            second = self.client.get("/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(first["Content-Encoding"], "gzip")
+        self.assertEqual(first.content, second.content)
+        self.assertLessEqual(compress.call_count, 1)
+        self.assertIn(b"<html", gzip.decompress(second.content))
+        self.assertIn("Accept-Encoding", second["Vary"])
+
+    def test_dynamic_response_uses_padded_gzip_and_media_is_skipped(self):
+        import gzip
+
+        from django.http import HttpResponse
+
+        from .middleware import CompressionMiddleware
+
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip, br")
+        html = HttpResponse("<p>персональная страница</p>" * 50)
+        response = CompressionMiddleware(lambda r: html)(request)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertTrue(response.content[3] & gzip.FNAME)
+
+        image = HttpResponse(b"\x89PNG" + b"0" * 500, content_type="image/png")
+        self.assertFalse(CompressionMiddleware(lambda r: image)(request).has_header("Content-Encoding"))
+
+
+class HtmlMinifyTests(TestCase):
+    def test_minify_keeps_whitespace_sensitive_blocks(self):
+        from .html_minify import minify
+
+        html = (
+            "<div>\n    <!-- комментарий -->\n    <p>Текст   с  пробелами</p>\n</div>\n"
+            "<pre>  код\n    с отступом</pre>\n<textarea>\n  значение</textarea>\n"
+            "<script>\n  var a = 1;  // <!-- не комментарий -->\n</script>\n<!--page-hole:cart-->"
+        )
+        result = minify(html)
+        self.assertNotIn("комментарий -->\n", result.split("<script>")[0])
+        self.assertIn("<div>\n<p>Текст с пробелами</p>\n</div>", result)
+        self.assertIn("<pre>  код\n    с отступом</pre>", result)
+        self.assertIn("<textarea>\n  значение</textarea>", result)
+        self.assertIn("var a = 1;  // <!-- не комментарий -->", result)
+        self.assertIn("<!--page-hole:cart-->", result)
+
+    def test_template_source_keeps_comments_with_template_tags(self):
+        from .html_minify import minify_template_source
+
+        source = "<ul>\n    <!-- {% if x %} -->\n    <!-- просто комментарий -->\n    <li>{{ x }}</li>\n</ul>\n"
+        self.assertEqual(minify_template_source(source), "<ul>\n<!-- {% if x %} -->\n<li>{{ x }}</li>\n</ul>\n")
+
+    def test_rendered_pages_have_no_template_comments(self):
+        content = self.client.get("/").content.decode()
+        self.assertNotIn("<!-- Установка кодировки", content)
+        self.assertNotIn("\n    <meta", content)
+
+
+class PreloadTests(TestCase):
+    def setUp(self):
+        from .preload import preload_links
+
+        cache.clear()
+        preload_links.cache_clear()
+        self.addCleanup(preload_links.cache_clear)
+
+    def test_base_template_assets(self):
+        from .preload import template_assets
+
+        paths = template_assets("base.html")
+        self.assertIn("css/style.css", paths)
+        self.assertIn("js/script.js", paths)
+        # Адрес в коде регистрации service worker — не ресурс страницы
+        self.assertNotIn("sw.js", paths)
+        # hero.html подключает стили категорий только на части страниц ({% if %})
+        self.assertNotIn("css/category-bl.css", paths)
+
+    def test_manifest_names_and_early_hints(self):
+        from unittest import mock
+
+        from django.contrib.staticfiles.storage import staticfiles_storage
+
+        def hashed(path):
+            name, ext = path.rsplit(".", 1)
+            return "/static/%s.abc123.%s" % (name, ext)
+
+        hints = []
+        with mock.patch.object(staticfiles_storage, "url", side_effect=hashed):
+            response = self.client.get("/", HTTP_ACCEPT="text/html", **{"wsgi.early_hints": hints.append})
+        self.assertIn("</static/css/style.abc123.css>; rel=preload; as=style", response["Link"])
+        self.assertEqual(len(hints), 1)
+        self.assertIn(("Link", "</static/js/script.abc123.js>; rel=preload; as=script"), hints[0])
+
+    def test_htmx_and_non_html_requests_are_skipped(self):
+        hints = []
+        response = self.client.get(
+            "/", HTTP_ACCEPT="text/html", HTTP_HX_REQUEST="true", **{"wsgi.early_hints": hints.append}
+        )
+        self.assertFalse(response.has_header("Link"))
+        self.assertEqual(hints, [])
+
+
+class HtmxPartialTests(TestCase):
+    def setUp(self):
+        from datetime import date
+
+        from news.models import News, NewsCategory
+
+        cache.clear()
+        category = NewsCategory.objects.create(name="Акции", slug="promotions")
+        News.objects.create(
+            title="Первая новость", slug="first-news", category=category,
+            news_date=date(2026, 7, 29), content="<p>Текст</p>",
+        )
+
+    def test_list_views_return_results_block(self):
+        for url, block_id in (
+            ("/news/", "news-results"),
+            ("/services/", "services-results"),
+            ("/portfolio/", "portfolio-results"),
+        ):
+            with self.subTest(url=url):
+                partial = self.client.get(url + "?sort=title", HTTP_HX_REQUEST="true")
+                content = partial.content.decode()
+                self.assertTrue(content.startswith('<div id="%s"' % block_id))
+                self.assertNotIn("<html", content)
+                self.assertIn("HX-Request", partial["Vary"])
+
+    def test_full_and_partial_variants_cached_separately(self):
+        full = self.client.get("/news/?page=1")
+        partial = self.client.get("/news/?page=1", HTTP_HX_REQUEST="true")
+        cached_full = self.client.get("/news/?page=1")
+        cached_partial = self.client.get("/news/?page=1", HTTP_HX_REQUEST="true")
+        self.assertIn(b"first-news", partial.content)
+        self.assertEqual(cached_full["X-Page-Cache"], "HIT")
+        self.assertEqual(cached_full.content, full.content)
+        self.assertEqual(cached_partial.content, partial.content)
+        self.assertNotEqual(full["ETag"], partial["ETag"])
+
+    def test_history_restore_gets_full_page(self):
+        response = self.client.get(
+            "/news/?page=1", HTTP_HX_REQUEST="true", HTTP_HX_HISTORY_RESTORE_REQUEST="true"
+        )
+        self.assertIn(b"<html", response.content)
+
+
+class DeferredFragmentTests(TestCase):
+    def setUp(self):
+        from datetime import date
+
+        from news.models import News, NewsCategory
+
+        cache.clear()
+        category = NewsCategory.objects.create(name="Акции", slug="promotions")
+        for day, slug in ((29, "first-news"), (30, "second-news")):
+            News.objects.create(
+                title=slug, slug=slug, category=category, news_date=date(2026, 7, day), content="<p>Текст</p>",
+            )
+
+    def test_page_ships_placeholders(self):
+        content = self.client.get("/news/first-news/").content.decode()
+        self.assertIn('hx-get="/fragments/latest_news/"', content)
+        self.assertIn('hx-get="/fragments/related_news/?slug=first-news"', content)
+        self.assertNotIn("sidebar-header", content)
+
+    def test_fragment_endpoint_is_cacheable(self):
+        response = self.client.get("/fragments/related_news/?slug=first-news&extra=1")
+        self.assertContains(response, "/news/second-news/")
+        self.assertIn("public", response["Cache-Control"])
+
+        with self.assertNumQueries(0):
+            cached = self.client.get("/fragments/related_news/?slug=first-news", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(self.client.get("/fragments/related_news/?slug=missing").status_code, 404)
+
+    def test_news_category_counts_are_deferred(self):
+        content = self.client.get("/news/category/promotions/").content.decode()
+        self.assertIn('hx-get="/fragments/news_categories/?current=promotions"', content)
+        self.assertIn('hx-target="this"', content)
+
+        fragment = self.client.get("/fragments/news_categories/?current=promotions").content.decode()
+        self.assertInHTML('<span class="badge rounded-pill badge-cat ms-1">2</span>', fragment, count=2)
+        self.assertIn("btn-primary", fragment.split("/news/category/promotions/")[1])
+
+    @override_settings(DEFERRED_FRAGMENTS_ENABLED=False)
+    def test_disabled_renders_inline(self):
+        content = self.client.get("/news/first-news/").content.decode()
+        self.assertIn("sidebar-header", content)
+        self.assertNotIn("/fragments/", content)
+
+
+class StreamingResponseTests(TestCase):
+    def setUp(self):
+        from datetime import date
+
+        from django.contrib.auth import get_user_model
+
+        from news.models import DailyEvent, News, NewsCategory
+
+        cache.clear()
+        category = NewsCategory.objects.create(name="Акции", slug="promotions")
+        news = News.objects.create(
+            title="День", slug="day", category=category, news_date=date(2026, 8, 1), content="<p>Текст</p>",
+        )
+        DailyEvent.objects.bulk_create(
+            DailyEvent(news=news, event_type="other", title=f"Событие {i}", description="<p>-</p>", order=i)
+            for i in range(30)
+        )
+        self.user = get_user_model().objects.create_user(username="reader", password="p")
+
+    def test_uncached_page_is_streamed(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/news/day/")
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode()
+        self.assertIn("Событие 29", content)
+        self.assertTrue(content.rstrip().endswith("</html>"))
+        # Токен формы комментария выдан до начала потока
+        self.assertIn("csrftoken", response.cookies)
+
+    def test_page_cache_miss_renders_buffered(self):
+        response = self.client.get("/news/day/")
+        self.assertFalse(response.streaming)
+        self.assertEqual(response["X-Page-Cache"], "MISS")
+
+    def test_gzip_stream_flushes_head_first(self):
+        import zlib
+
+        self.client.force_login(self.user)
+        response = self.client.get("/news/day/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        chunks = list(response.streaming_content)
+        decompressor = zlib.decompressobj(31)
+        self.assertIn("</head>", decompressor.decompress(chunks[0]).decode())
+        html = (decompressor.decompress(b"".join(chunks[1:])) + decompressor.flush()).decode()
+        self.assertIn("Событие 29", html)
+
+    def test_stream_matches_buffered_render(self):
+        from django.template import Context, Engine
+
+        from .streaming import stream_template
+
+        engine = Engine(loaders=[("django.template.loaders.locmem.Loader", {
+            "base.html": "<head>{% block title %}База{% endblock %}</head>{% block content %}{% endblock %}",
+            "page.html": (
+                "{% extends 'base.html' %}{% block title %}{{ block.super }}: стр{% endblock %}"
+                "{% block content %}{% for row in rows %}{% for cell in row %}"
+                "[{{ forloop.parentloop.counter }}.{{ forloop.counter }}{% if forloop.last %}!{% endif %}]"
+                "{% endfor %}{% empty %}нет{% endfor %}"
+                "{% for key, value in pairs %}{{ key }}={{ value }};{% endfor %}"
+                "{% if missing.attr %}да{% elif rows %}строки{% else %}нет{% endif %}{% endblock %}"
+            ),
+        })])
+        template = engine.get_template("page.html")
+        data = {"rows": [["a", "b"], ["c"]], "pairs": [("x", 1), ("y", 2)]}
+        streamed = "".join(stream_template(template, data))
+        self.assertEqual(streamed, template.render(Context(data)))
+        self.assertIn("[1.1][1.2!][2.1!]", streamed)
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        (Path(self.media.name) / "news").mkdir()
+        (Path(self.media.name) / "news" / "foto_2026-01-15_14-30-45.jpg").write_bytes(b"0123456789" * 30)
+        (Path(self.media.name) / "logo.png").write_bytes(b"logo")
+        self.settings_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_timestamped_file_is_immutable_with_strong_etag(self):
+        from .media_serving import serve_file
+
+        request = RequestFactory().get("/media/news/foto_2026-01-15_14-30-45.jpg")
+        response = serve_file(request, "news/foto_2026-01-15_14-30-45.jpg", self.media.name)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789" * 30)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertFalse(response["ETag"].startswith("W/"))
+
+        request = RequestFactory().get("/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(serve_file(request, "news/foto_2026-01-15_14-30-45.jpg", self.media.name).status_code, 304)
+
+        response = serve_file(RequestFactory().get("/"), "logo.png", self.media.name)
+        self.assertNotIn("immutable", response["Cache-Control"])
+
+    def test_range_request(self):
+        from .media_serving import serve_file
+
+        request = RequestFactory().get("/", HTTP_RANGE="bytes=5-14")
+        response = serve_file(request, "news/foto_2026-01-15_14-30-45.jpg", self.media.name)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 5-14/300")
+        self.assertEqual(b"".join(response.streaming_content), b"5678901234")
+
+        request = RequestFactory().get("/", HTTP_RANGE="bytes=400-")
+        self.assertEqual(serve_file(request, "logo.png", self.media.name).status_code, 416)
+
+    @override_settings(MEDIA_SERVING_MODE="x-accel")
+    def test_accel_redirect_hands_file_to_proxy(self):
+        from django.http import Http404
+
+        from .media_serving import serve_file
+
+        response = serve_file(RequestFactory().get("/"), "logo.png", self.media.name, "/protected/media/")
+        self.assertEqual(response["X-Accel-Redirect"], "/protected/media/logo.png")
+        self.assertEqual(response.content, b"")
+        with self.assertRaises(Http404):
+            serve_file(RequestFactory().get("/"), "../../etc/passwd", self.media.name)
+
+
+class ResponsiveImageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media.name, RESPONSIVE_IMAGE_FORMATS=("webp",))
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        from .responsive_images import available_formats
+
+        available_formats.cache_clear()
+        self.addCleanup(available_formats.cache_clear)
+
+    def _jpeg(self, width=800, height=400):
+        import io
+
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (width, height), "navy").save(buffer, "JPEG")
+        return buffer.getvalue()
+
+    def test_derivatives_and_srcset(self):
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        from django.db.models.fields.files import FieldFile
+        from django.template import Context, Template
+
+        from news.models import News
+
+        from .responsive_images import build_derivatives
+
+        name = default_storage.save("news/images/day_2026-01-15_14-30-45.jpg", ContentFile(self._jpeg()))
+        image = FieldFile(None, News._meta.get_field("image"), name)
+        template = Template("{% load responsive_images %}{% responsive_image image alt='День' sizes='50vw' %}")
+
+        html = template.render(Context({"image": image}))
+        self.assertNotIn("<picture", html)
+
+        manifest = build_derivatives(name)
+        self.assertEqual(manifest["sources"], {"webp": [320, 640, 800]})
+        # Производные лежат рядом с файлом хранилища: blobs/<ab>/<cd>/<хеш>.w320.webp
+        derivative = name.rsplit("/", 1)[0] + ".w320.webp"
+        self.assertTrue(default_storage.exists(derivative))
+
+        html = template.render(Context({"image": image}))
+        self.assertIn(f'<source type="image/webp" srcset="/media/{derivative} 320w', html)
+        self.assertIn('sizes="50vw"', html)
+        self.assertIn(f'src="/media/{name}"', html)
+        self.assertTrue(name.endswith("/day_2026-01-15_14-30-45.jpg"))
+        self.assertIn('width="800"', html)
+
+    def test_derivatives_of_upload_outside_blobs_keep_their_names(self):
+        from django.core.files.storage import default_storage
+
+        from .models import MediaBlob
+        from .responsive_images import build_derivatives, derivative_name, get_manifest, srcset
+
+        # Загрузка, сохраненная до хранилища по хешу
+        name = "news/images/foto_2024-01-15_14-30-45.jpg"
+        (Path(self.media.name) / "news" / "images").mkdir(parents=True)
+        (Path(self.media.name) / name).write_bytes(self._jpeg())
+
+        build_derivatives(name)
+        self.assertTrue((Path(self.media.name) / derivative_name(name, 640, "webp")).exists())
+        self.assertFalse((Path(self.media.name) / "blobs").exists())
+        self.assertFalse(MediaBlob.objects.exists())
+        for url in srcset(name, get_manifest(name), "webp").split(", "):
+            path = url.split()[0].removeprefix("/media/")
+            self.assertTrue(default_storage.exists(path), path)
+
+    def test_upload_schedules_derivatives_after_commit(self):
+        from unittest import mock
+
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        from news.models import News, NewsCategory
+
+        category = NewsCategory.objects.create(name="Акции", slug="promotions")
+        with mock.patch("main.signals.schedule_derivatives") as schedule, mock.patch("main.signals.schedule_og_image"):
+            with self.captureOnCommitCallbacks(execute=True):
+                news = News.objects.create(
+                    title="Фото", slug="photo", category=category, content="<p>-</p>",
+                    image=SimpleUploadedFile("photo.jpg", self._jpeg(), content_type="image/jpeg"),
+                )
+            schedule.assert_called_once_with(news.image.name)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                news.save()
+            schedule.assert_called_once()
+
+    def test_built_derivatives_invalidate_owner_and_are_found_on_disk(self):
+        from unittest import mock
+
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        from news.models import News, NewsCategory
+
+        from .cache_tags import get_tag_versions
+        from .responsive_images import MANIFEST_PREFIX, build_derivatives, get_manifest
+
+        category = NewsCategory.objects.create(name="Акции", slug="promotions")
+        with mock.patch("main.signals.schedule_derivatives"), mock.patch("main.signals.schedule_og_image"):
+            news = News.objects.create(
+                title="Фото", slug="photo", category=category, content="<p>-</p>",
+                image=SimpleUploadedFile("photo.jpg", self._jpeg(), content_type="image/jpeg"),
+            )
+        version = get_tag_versions(["news.news"])
+        build_derivatives(news.image.name)
+        # Страницы с <img> без <picture> устаревают
+        self.assertNotEqual(get_tag_versions(["news.news"]), version)
+
+        # Без манифеста в кэше ширины берутся с диска, включая ширину оригинала
+        cache.delete(MANIFEST_PREFIX + news.image.name)
+        self.assertEqual(get_manifest(news.image.name)["sources"], {"webp": [320, 640, 800]})
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        from PIL import Image
+
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.thumbs = tempfile.TemporaryDirectory()
+        self.addCleanup(self.thumbs.cleanup)
+        (Path(self.media.name) / "news").mkdir()
+        Image.new("RGB", (800, 400), "red").save(Path(self.media.name) / "news" / "foto.jpg")
+        self.settings_override = override_settings(MEDIA_ROOT=self.media.name, THUMBNAIL_ROOT=Path(self.thumbs.name))
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        cache.delete("thumbnails:prune")
+
+    def test_thumbnail_is_generated_once_and_served_from_disk(self):
+        from unittest import mock
+
+        from PIL import Image
+
+        from . import thumbnails
+
+        url = thumbnails.thumbnail_url("news/foto.jpg", 100, 100)
+        with mock.patch.object(thumbnails, "generate", wraps=thumbnails.generate) as generate:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Type"], "image/webp")
+            self.client.get(url)
+        self.assertEqual(generate.call_count, 1)
+
+        files = list(Path(self.thumbs.name).glob("*/*/*.webp"))
+        self.assertEqual(len(files), 1)
+        with Image.open(files[0]) as image:
+            self.assertEqual(image.size, (100, 100))
+
+    def test_bad_signature_and_oversize_are_rejected(self):
+        from .thumbnails import sign, thumbnail_url
+
+        url = thumbnail_url("news/foto.jpg", 100, 100)
+        self.assertEqual(self.client.get(url.replace("100x100", "101x100")).status_code, 404)
+        self.assertEqual(self.client.get(f"/media/thumb/{sign('news/foto.jpg', 9000, 0)}/9000x0/news/foto.jpg").status_code, 404)
+        self.assertFalse(any(Path(self.thumbs.name).iterdir()))
+        self.assertEqual(thumbnail_url("icons/logo.svg", 100, 100), "/media/icons/logo.svg")
+
+    def test_prune_removes_least_recently_used(self):
+        import os
+
+        from .thumbnails import prune
+
+        for index in range(4):
+            path = Path(self.thumbs.name) / "aa" / "bb" / f"{index}.webp"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (1000 + index, 1000))
+        self.assertEqual(prune(max_bytes=300), 2)
+        remaining = sorted(path.name for path in Path(self.thumbs.name).glob("*/*/*.webp"))
+        self.assertEqual(remaining, ["2.webp", "3.webp"])
+
+
+class MediaStorageTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def _upload(self, title, content=b"icon-bytes"):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        from news.models import NewsCategory
+
+        return NewsCategory.objects.create(
+            name=title, slug=title.lower(), logo=SimpleUploadedFile("logo.png", content, content_type="image/png")
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        from unittest import mock
+
+        from .media_serving import serve_file
+        from .media_storage import blob_path
+        from .models import MediaBlob
+
+        with mock.patch("main.signals.schedule_derivatives"):
+            first = self._upload("First")
+            second = self._upload("Second")
+        self.assertNotEqual(first.logo.name, second.logo.name)
+        self.assertEqual(blob_path(first.logo.name), blob_path(second.logo.name))
+        self.assertTrue(first.logo.name.startswith("blobs/"))
+        self.assertEqual(first.logo.read(), b"icon-bytes")
+        self.assertEqual(len(list(Path(self.media.name).rglob("*.png"))), 1)
+        self.assertEqual(MediaBlob.objects.get().refcount, 2)
+
+        # Маршрут media/ передает serve_file путь из URL с читаемым именем
+        response = serve_file(RequestFactory().get(first.logo.url), first.logo.name, self.media.name)
+        self.assertEqual(b"".join(response.streaming_content), b"icon-bytes")
+        self.assertIn("immutable", response["Cache-Control"])
+
+    def test_file_is_removed_with_last_reference(self):
+        from unittest import mock
+
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        from .models import MediaBlob
+
+        with mock.patch("main.signals.schedule_derivatives"):
+            first = self._upload("First")
+            second = self._upload("Second")
+        path = Path(first.logo.path)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(path.exists())
+        self.assertEqual(MediaBlob.objects.get().refcount, 1)
+
+        # Замена загрузки освобождает прежний файл
+        with mock.patch("main.signals.schedule_derivatives"), self.captureOnCommitCallbacks(execute=True):
+            second.logo = SimpleUploadedFile("new.png", b"other-bytes", content_type="image/png")
+            second.save()
+        self.assertFalse(path.exists())
+        self.assertEqual(list(MediaBlob.objects.values_list("refcount", flat=True)), [1])
+
+    def test_dedupe_keeps_old_paths_until_pruned(self):
+        from io import StringIO
+        from unittest import mock
+
+        from django.core.management import call_command
+
+        from news.models import NewsCategory
+
+        from .cache_tags import get_tag_versions
+        from .models import MediaBlob
+
+        root = Path(self.media.name)
+        (root / "news").mkdir()
+        for name in ("a.png", "b.png"):
+            (root / "news" / name).write_bytes(b"same-bytes")
+        with mock.patch("main.signals.schedule_derivatives"), mock.patch("main.signals.schedule_og_image"):
+            first = NewsCategory.objects.create(name="A", slug="a", logo="news/a.png")
+            NewsCategory.objects.create(name="B", slug="b", logo="news/b.png")
+        version = get_tag_versions(["news.newscategory"])
+
+        with mock.patch("main.management.commands.dedupe_media.schedule_export") as export:
+            call_command("dedupe_media", stdout=StringIO())
+        first.refresh_from_db()
+        self.assertTrue(first.logo.name.startswith("blobs/"))
+        self.assertEqual(MediaBlob.objects.get().refcount, 2)
+        # Кэши и экспорт со старыми URL обновляются, а сами старые URL пока работают
+        self.assertNotEqual(get_tag_versions(["news.newscategory"]), version)
+        export.assert_called_once()
+        self.assertEqual((root / "news" / "a.png").read_bytes(), b"same-bytes")
+        self.assertEqual((root / "news" / "b.png").stat().st_ino, Path(first.logo.path).stat().st_ino)
+
+        call_command("dedupe_media", "--prune-old", stdout=StringIO())
+        self.assertEqual(list((root / "news").iterdir()), [])
+        self.assertEqual(first.logo.read(), b"same-bytes")
+
+
+class OgImageTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media.name, OG_IMAGE_FORMATS=("png", "webp"))
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_save_renders_files_and_replaces_old_version(self):
+        from unittest import mock
+
+        from .models import Page
+        from .og_utils import og_image_url, og_name
+
+        with mock.patch("main.signals.schedule_og_image") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                page = Page.objects.create(title="О нас", slug="o-nas", content="<p>Команда студии</p>")
+            schedule.assert_any_call("main.Page", page.pk)
+        self.assertIsNone(og_image_url(page))
+
+        from .tasks import build_og_image_task
+
+        build_og_image_task("main.Page", page.pk)
+        first = og_name(page)
+        self.assertEqual(og_image_url(page), "/media/" + first)
+        self.assertTrue((Path(self.media.name) / og_name(page, "webp")).exists())
+
+        page.title = "Контакты"
+        build_og_image_task("main.Page", page.pk)  # объект в БД не изменился — файл тот же
+        page.save()
+        build_og_image_task("main.Page", page.pk)
+        files = sorted(path.name for path in (Path(self.media.name) / "og" / "main.page").iterdir())
+        self.assertEqual(len(files), 2)
+        self.assertNotIn(first.rsplit("/", 1)[1], files)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            page.delete()
+        self.assertFalse(any((Path(self.media.name) / "og" / "main.page").iterdir()))
+
+    def test_template_tag_falls_back_to_dynamic_view(self):
+        from django.template import Context, Template
+
+        from .models import Page
+
+        page = Page(pk=1, title="О нас", slug="o-nas", content="<p>Команда студии</p>")
+        html = Template("{% load og_images %}{% og_image_url page %}").render(
+            Context({"page": page, "request": RequestFactory().get("/")})
+        )
+        self.assertTrue(html.startswith("http://testserver/og-image/?title="))
+        self.assertIn("subtitle=", html)
@@ -0,0 +1,171 @@
+"""
+Модуль thumbnails.py приложения main
+
+Миниатюры произвольного размера по подписанным URL с кэшем на диске.
+
+Корзине, избранному и превью админки нужны маленькие картинки своих
+размеров, а отдавались оригиналы. URL вида
+
+    /media/thumb/<подпись>/<ширина>x<высота>/<путь в MEDIA_ROOT>
+
+строит thumbnail_url() (или тег {% thumbnail_url %}). При первом
+запросе Pillow делает миниатюру WebP (обе стороны заданы — обрезка по
+центру, одна сторона 0 — пропорционально) и кладет ее в THUMBNAIL_ROOT
+по пути из хеша: <ab>/<cd>/<хеш>.webp. Повторные запросы отдаются с
+диска или через прокси (main/media_serving.py, префикс
+THUMBNAIL_ACCEL_REDIRECT_PREFIX).
+
+Защита от перегрузки ресайзом:
+- подпись — HMAC от SECRET_KEY по пути и размеру; URL с чужим размером
+  или путем получает 404 без открытия файла;
+- размеры не больше THUMBNAIL_MAX_SIZE;
+- кэш ограничен THUMBNAIL_CACHE_MAX_BYTES: не чаще раза в
+  THUMBNAIL_PRUNE_INTERVAL секунд давно не запрошенные миниатюры
+  (время доступа обновляется при каждой выдаче) удаляются, пока кэш не
+  уменьшится до 90% лимита.
+
+Хеш включает время изменения оригинала: замененный файл получает новую
+миниатюру, а старая уходит из кэша по LRU.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .media_serving import is_immutable, resolve_path, serve_file
+from .responsive_images import is_processable
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_SALT = "main.thumbnails"
+PRUNE_KEY = "thumbnails:prune"
+
+
+def thumbnail_root():
+    return Path(getattr(settings, "THUMBNAIL_ROOT", Path(settings.BASE_DIR) / "cache" / "thumbnails"))
+
+
+def sign(path, width, height):
+    return salted_hmac(SIGNATURE_SALT, "%dx%d/%s" % (width, height, path), algorithm="sha256").hexdigest()[:20]
+
+
+def thumbnail_url(image, width, height=0):
+    """
+    URL миниатюры файла из MEDIA_ROOT (FieldFile или имя). SVG и GIF не
+    уменьшаются — для них возвращается URL оригинала.
+    """
+    name = getattr(image, "name", image)
+    if not name:
+        return ""
+    if not is_processable(name):
+        return image.url if hasattr(image, "url") else settings.MEDIA_URL + name
+    return reverse(
+        "thumbnail",
+        kwargs={"signature": sign(name, width, height), "width": width, "height": height, "path": name},
+    )
+
+
+def cache_name(path, width, height, mtime_ns):
+    digest = hashlib.sha1(("%s:%dx%d:%d" % (path, width, height, mtime_ns)).encode()).hexdigest()
+    return "%s/%s/%s.webp" % (digest[:2], digest[2:4], digest)
+
+
+def generate(source, target, width, height):
+    """Миниатюра WebP; запись атомарная — параллельные запросы не видят половину файла."""
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("P", "LA") else "RGB")
+        if width and height:
+            image = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+        else:
+            image.thumbnail((width or image.width, height or image.height), Image.Resampling.LANCZOS)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                image.save(out, "WEBP", quality=getattr(settings, "THUMBNAIL_QUALITY", 80))
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+def prune(max_bytes=None):
+    """
+    Удаляет давно не запрошенные миниатюры, пока кэш больше 90% лимита.
+
+    Returns:
+        int: число удаленных файлов
+    """
+    max_bytes = max_bytes or getattr(settings, "THUMBNAIL_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+    entries = []
+    total = 0
+    for path in thumbnail_root().glob("*/*/*.webp"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_atime, stat.st_size, path))
+        total += stat.st_size
+    if total <= max_bytes:
+        return 0
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes * 0.9:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    logger.info(f"Кэш миниатюр: удалено {removed}, осталось {total // 1024} КБ")
+    return removed
+
+
+def maybe_prune():
+    """Запускает prune() в фоне не чаще раза в THUMBNAIL_PRUNE_INTERVAL секунд."""
+    if cache.add(PRUNE_KEY, 1, getattr(settings, "THUMBNAIL_PRUNE_INTERVAL", 300)):
+        threading.Thread(target=prune, daemon=True).start()
+
+
+def serve_thumbnail(request, signature, width, height, path):
+    """Представление /media/thumb/<подпись>/<w>x<h>/<путь>."""
+    if not constant_time_compare(signature, sign(path, width, height)):
+        raise Http404("Миниатюра не найдена")
+    max_size = getattr(settings, "THUMBNAIL_MAX_SIZE", 2000)
+    if not (width or height) or width > max_size or height > max_size or not is_processable(path):
+        raise Http404("Миниатюра не найдена")
+
+    path, source = resolve_path(settings.MEDIA_ROOT, path)
+    name = cache_name(path, width, height, source.stat().st_mtime_ns)
+    target = thumbnail_root() / name
+    try:
+        # LRU: время доступа, а не изменения — ETag миниатюры не меняется
+        os.utime(target, (time.time(), target.stat().st_mtime))
+    except FileNotFoundError:
+        try:
+            generate(source, target, width, height)
+        except (OSError, ValueError) as exc:
+            logger.warning(f"Миниатюра {path} {width}x{height} не построена: {exc}")
+            raise Http404("Миниатюра не найдена")
+        maybe_prune()
+
+    return serve_file(
+        request,
+        name,
+        document_root=thumbnail_root(),
+        accel_prefix=getattr(settings, "THUMBNAIL_ACCEL_REDIRECT_PREFIX", "/protected/thumbnails/"),
+        immutable=is_immutable(path),
+    )
@@ -38,4 +38,6 @@ urlpatterns = [
     path("search/", views.global_search, name="search"),
     path("health/", views.health_check, name="health"),
     path("og-image/", views.og_image_view, name="og_image"),
+    # Отложенные фрагменты страниц (боковые блоки, связанные новости), см. main/deferred.py
+    path("fragments/<slug:name>/", views.deferred_fragment, name="deferred_fragment"),
 ]
@@ -0,0 +1,64 @@
+"""
+Модуль view_counters.py приложения main
+
+Счетчики просмотров для ответов, которые отдаются без вызова представления
+(кэш страниц). Представления деталей сами увеличивают `views`; при ответе
+из кэша то же делает count_view() по имени URL и его параметрам — одним
+UPDATE ... SET views = views + 1 без загрузки объекта.
+
+Служебный рендер страниц (статический экспорт) просмотры не учитывает:
+внутри uncounted_views() views_counted() возвращает False.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.db.models import F
+
+# Имя URL -> (модель, дополнительные условия, как в представлении)
+VIEW_COUNTERS = {
+    "news:detail": ("news.News", {"is_active": True}),
+    "portfolio:detail": ("portfolio.Portfolio", {"is_active": True}),
+    "services:detail": ("services.Service", {"is_active": True}),
+    "knowledge_base:article": ("knowledge_base.Article", {"is_published": True}),
+}
+
+_counting = ContextVar("count_views", default=True)
+
+
+@contextmanager
+def uncounted_views():
+    """Отключает учет просмотров для страниц, отрендеренных внутри блока."""
+    token = _counting.set(False)
+    try:
+        yield
+    finally:
+        _counting.reset(token)
+
+
+def views_counted():
+    """Учитываются ли сейчас просмотры страниц."""
+    return _counting.get()
+
+
+def count_view(view_name, kwargs):
+    """
+    Увеличивает счетчик просмотров объекта страницы, если для URL он ведется.
+
+    Args:
+        view_name (str): полное имя URL ("news:detail")
+        kwargs (dict): параметры URL (ожидается slug)
+
+    Returns:
+        bool: был ли учтен просмотр
+    """
+    counter = VIEW_COUNTERS.get(view_name)
+    if counter is None or "slug" not in kwargs or not views_counted():
+        return False
+    model_label, filters = counter
+    model = apps.get_model(model_label)
+    # update() не отправляет сигналы и не сбрасывает кэш
+    return bool(
+        model.objects.filter(slug=kwargs["slug"], **filters).update(views=F("views") + 1)
+    )
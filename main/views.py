@@ -8,7 +8,7 @@
 # Импорт функций для работы с шаблонами и перенаправлениями
 from django.shortcuts import render, get_object_or_404, redirect
 # Импорт моделей приложения main
-from .models import Page, SiteSettings
+from .models import Page
 # Импорт формы обратной связи
 from .forms import ContactForm
 # Импорт системы сообщений Django
@@ -27,6 +27,12 @@ from django.contrib.auth import get_user_model
 # Импорт функции агрегации Sum для подсчета сумм
 from django.db.models import Sum, Q
 from django.contrib.admin.views.decorators import staff_member_required
+# Условные GET-запросы (ETag / Last-Modified)
+from .conditional import conditional_view
+from .slug_registry import known_slug_required
+# Кэш уровня запроса и снимок обвязки сайта
+from . import request_cache
+from .site_chrome import get_site_chrome
 
 # Получение модели пользователя (может быть кастомная модель)
 User = get_user_model()
@@ -69,13 +75,18 @@ def home(request):
 
     # Получаем данные для динамических блоков
     from services.models import Service
+    from portfolio.views import get_latest_portfolio
+    from reviews.views import get_latest_reviews
+    from django.utils.functional import SimpleLazyObject
     
     context = {
         "stats": stats,
         "popular_services": Service.objects.filter(is_active=True, is_popular=True)[:4],
-        "latest_portfolio": Portfolio.objects.filter(is_active=True).order_by("-created_at")[:3],
+        # Те же списки, что в контекстных процессорах: один раз за запрос
+        # и только если фрагмент главной не взят из кэша
+        "latest_portfolio": SimpleLazyObject(get_latest_portfolio),
         "recent_news": News.objects.filter(is_active=True).order_by("-created_at")[:3],
-        "recent_reviews": Review.objects.filter(status="approved").order_by("-created_at")[:3],
+        "recent_reviews": SimpleLazyObject(get_latest_reviews),
     }
     
     return render(request, "main/home.html", context)
@@ -133,6 +144,11 @@ def global_search(request):
         "results": results
     })
 
+# Страница контактов с формой и капчей всегда рендерится заново
+@known_slug_required(Page)
+@conditional_view(
+    lambda request, slug: None if slug == "kontakty" else Page.objects.filter(slug=slug, is_active=True)
+)
 def page_detail(request, slug):
     """
     Представление для отображения статической страницы.
@@ -160,7 +176,8 @@ def page_detail(request, slug):
     # Получение страницы из базы данных по slug
     # get_object_or_404: если страница не найдена, возвращает HTTP 404
     # is_active=True: только активные страницы
-    page = get_object_or_404(Page, slug=slug, is_active=True)
+    # (запоминается в кэше запроса — main/request_cache.py)
+    page = request_cache.get_object_or_404(Page, slug=slug, is_active=True)
     
     # Инициализация переменной для формы (None по умолчанию)
     form = None
@@ -174,8 +191,9 @@ def page_detail(request, slug):
             
             # Валидация формы
             if form.is_valid():
-                # Получение настроек сайта для определения email получателя
-                site_settings = SiteSettings.objects.filter(is_active=True).first()
+                # Настройки сайта для определения email получателя
+                # (тот же снимок, что у контекстного процессора main_context)
+                site_settings = get_site_chrome()["site_settings"]
                 
                 # Определение email получателя:
                 # Если в настройках сайта указан email - используем его,
@@ -380,6 +398,75 @@ def admin_dashboard(request):
     
     return render(request, "main/admin_dashboard.html", context)
 
+@staff_member_required
+def context_usage_report(request):
+    """
+    Отчет (JSON) об использовании ключей контекстных процессоров:
+    какие ключи предоставлены и какие шаблоны их прочитали, по namespace URL.
+    Параметр ?reset=1 очищает накопленные данные.
+    """
+    from django.http import JsonResponse
+    from .lazy_context import get_usage_report, reset_usage_report, tracking_enabled
+
+    report = get_usage_report()
+    if request.GET.get("reset"):
+        reset_usage_report()
+    return JsonResponse(
+        {"enabled": tracking_enabled(), "namespaces": report},
+        json_dumps_params={"ensure_ascii": False, "indent": 2},
+    )
+
+@staff_member_required
+def single_flight_report(request):
+    """
+    Счетчики путей single_flight (JSON) текущего процесса: попадания,
+    устаревшие значения, фоновые обновления, вычисления и ожидания.
+    Параметр ?reset=1 обнуляет счетчики.
+    """
+    import os
+    from django.http import JsonResponse
+    from .single_flight import get_stats, reset_stats
+
+    stats = get_stats()
+    if request.GET.get("reset"):
+        reset_stats()
+    return JsonResponse(
+        {"pid": os.getpid(), "values": stats},
+        json_dumps_params={"ensure_ascii": False, "indent": 2},
+    )
+
+@staff_member_required
+def cache_inspector(request):
+    """
+    Инспектор кэша в админке: попадания, промахи, размер и время вычисления
+    по группам ключей, крупнейшие ключи, версии тегов моделей.
+    POST: очистка группы ключей, смена версии тега, сброс счетчиков.
+    """
+    from django.contrib import messages
+    from django.shortcuts import redirect
+    from . import cache_inspector as inspector
+
+    if request.method == "POST":
+        action = request.POST.get("action")
+        if action == "purge_group" and inspector.is_available():
+            group = request.POST.get("group", "")
+            removed = inspector.purge_group(group)
+            messages.success(request, f"Группа «{group}»: удалено ключей — {removed}")
+        elif action == "bump_tag":
+            tag = request.POST.get("tag", "")
+            try:
+                inspector.purge_tag(tag)
+            except ValueError as exc:
+                messages.error(request, str(exc))
+            else:
+                messages.success(request, f"Значения, зависящие от {tag}, помечены устаревшими")
+        elif action == "reset_stats" and inspector.is_available():
+            inspector.reset_stats()
+            messages.success(request, "Счетчики кэша обнулены")
+        return redirect("cache_inspector")
+
+    return render(request, "main/cache_inspector.html", {"report": inspector.build_report()})
+
 def health_check(request):
     """Проверка работоспособности."""
     from django.http import HttpResponse
@@ -389,3 +476,28 @@ def og_image_view(request):
     """Обертка для генерации OG-изображений."""
     from .og_utils import generate_og_image
     return generate_og_image(request)
+
+
+def deferred_fragment(request, name):
+    """
+    Отложенный фрагмент страницы (см. main/deferred.py): общий для всех
+    посетителей HTML из кэша с ETag и Cache-Control: public.
+    """
+    import hashlib
+
+    from django.http import Http404, HttpResponse
+    from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+    from .deferred import FRAGMENTS, render_fragment
+
+    if name not in FRAGMENTS:
+        raise Http404("Неизвестный фрагмент")
+    content = render_fragment(name, request.GET)
+    etag = quote_etag(hashlib.md5(content.encode()).hexdigest())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content)
+        # Одинаков для всех: сжимается один раз (main/compression.py)
+        response.compress_shared = True
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=getattr(settings, "DEFERRED_FRAGMENT_MAX_AGE", 60))
+    return response
@@ -0,0 +1,636 @@
+"""
+Двухуровневый кэш с общей инвалидацией между воркерами.
+
+LocMemCache хранит данные внутри одного процесса: у каждого воркера gunicorn
+своя копия `latest_news`, статистики админки, OG-изображений и фрагментов
+шаблонов, а `cache.delete()` из сигналов очищает только воркер, который
+обработал сохранение.
+
+Включает:
+- SQLiteCache: общий кэш в файле SQLite (работает без Redis)
+- TwoTierCache: L1 в памяти процесса (LocMemCache) + общий L2
+  (SQLiteCache или любой бэкенд Django, например RedisCache)
+
+Каждая запись/удаление через TwoTierCache попадает в журнал инвалидаций
+(таблица SQLite или Redis Stream). Процессы читают журнал не чаще
+POLL_INTERVAL секунд и удаляют измененные ключи из своего L1, поэтому
+устаревание данных в других воркерах ограничено этим интервалом.
+Истечение срока жизни записи в L2 не рассылается — его ограничивает
+L1_TIMEOUT.
+
+Для инспектора кэша в админке TwoTierCache считает по группам ключей
+(key_group: "page", "og_image", "latest_news"...) попадания, промахи,
+записи и их размер, время вычисления значений; процессы периодически
+сохраняют свои счетчики в L2 (STATS_FLUSH_INTERVAL), а collect_stats()
+собирает их со всех воркеров. entries() и delete_group() работают с
+содержимым L2.
+
+Пример настройки: см. mysite/settings.py -> CACHES
+"""
+
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.module_loading import import_string
+
+# Маркер записи журнала «очистить кэш целиком»
+CLEAR_ALL = "*"
+# Маркер промаха (None — допустимое значение в кэше)
+_MISSING = object()
+
+# Ключи L2 со счетчиками процессов: cache_stats:<имя набора>:<pid>
+STATS_KEY_PREFIX = "cache_stats:"
+# Хвост ключа-хеша: og_image_<md5>
+_HASH_SUFFIX_RE = re.compile(r"[_.][0-9a-f]{16,}$")
+
+
+def key_group(key):
+    """
+    Группа ключа для статистики: часть до первого ":" ("page:<md5>" -> "page"),
+    имя фрагмента шаблона ("template.cache.<имя>.<md5>"), ключ без хеша
+    ("og_image_<md5>" -> "og_image") или сам ключ ("latest_news").
+    """
+    if ":" in key:
+        return key.split(":", 1)[0]
+    if key.startswith("template.cache."):
+        return ".".join(key.split(".")[:3])
+    return _HASH_SUFFIX_RE.sub("", key)
+
+
+def _raw_key(key, key_prefix, version):
+    """Функция ключа для уровней: ключ уже собран TwoTierCache."""
+    return key
+
+
+@contextmanager
+def _transaction(conn):
+    """Транзакция с блокировкой на запись с самого начала (BEGIN IMMEDIATE)."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _connect(path):
+    """Открывает соединение с файлом SQLite в режиме WAL."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class _SQLiteConnectionMixin:
+    """Соединение на процесс и поток; после fork открывается новое."""
+
+    schema = ()
+
+    def _get_connection(self):
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.conn = _connect(self._path)
+            for statement in self.schema:
+                local.conn.execute(statement)
+            local.pid = os.getpid()
+        return local.conn
+
+
+class SQLiteCache(_SQLiteConnectionMixin, BaseCache):
+    """
+    Кэш в файле SQLite, общий для всех процессов на сервере.
+
+    LOCATION — путь к файлу. Поддерживаются стандартные MAX_ENTRIES и
+    CULL_FREQUENCY: при переполнении удаляются просроченные записи, затем
+    1/CULL_FREQUENCY самых старых.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    schema = (
+        "CREATE TABLE IF NOT EXISTS cache_entries ("
+        " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)",
+        "CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires)",
+    )
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = str(location)
+        self._local = threading.local()
+
+    def _select(self, conn, key):
+        row = conn.execute(
+            "SELECT value, expires FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and row[1] <= time.time():
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            return None
+        return row
+
+    def _cull(self, conn):
+        count = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        if count < self._max_entries:
+            return
+        conn.execute("DELETE FROM cache_entries WHERE expires <= ?", (time.time(),))
+        count = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        if count >= self._max_entries and self._cull_frequency:
+            conn.execute(
+                "DELETE FROM cache_entries WHERE rowid IN "
+                "(SELECT rowid FROM cache_entries ORDER BY rowid LIMIT ?)",
+                (max(count // self._cull_frequency, 1),),
+            )
+
+    def _write(self, key, value, timeout, only_new):
+        conn = self._get_connection()
+        data = pickle.dumps(value, self.pickle_protocol)
+        expires = self.get_backend_timeout(timeout)
+        with _transaction(conn):
+            if only_new and self._select(conn, key) is not None:
+                return False
+            self._cull(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)",
+                (key, data, expires),
+            )
+        return True
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._write(key, value, timeout, only_new=True)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._write(key, value, timeout, only_new=False)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._select(self._get_connection(), key)
+        return default if row is None else pickle.loads(row[0])
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._get_connection()
+        with _transaction(conn):
+            if self._select(conn, key) is None:
+                return False
+            conn.execute(
+                "UPDATE cache_entries SET expires = ? WHERE key = ?",
+                (self.get_backend_timeout(timeout), key),
+            )
+        return True
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._get_connection().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        return bool(cursor.rowcount)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._select(self._get_connection(), key) is not None
+
+    def clear(self):
+        self._get_connection().execute("DELETE FROM cache_entries")
+
+    def entries(self, prefix=""):
+        """Живые записи: (ключ, размер в байтах, время истечения или None)."""
+        return self._get_connection().execute(
+            "SELECT key, length(value), expires FROM cache_entries"
+            " WHERE key >= ? AND key < ? AND (expires IS NULL OR expires > ?)",
+            (prefix, prefix + "\uffff", time.time()),
+        ).fetchall()
+
+    def delete_many_raw(self, keys):
+        conn = self._get_connection()
+        with _transaction(conn):
+            conn.executemany("DELETE FROM cache_entries WHERE key = ?", [(key,) for key in keys])
+
+
+class SQLiteJournal(_SQLiteConnectionMixin):
+    """Журнал инвалидаций в таблице SQLite (порядковый номер — seq)."""
+
+    schema = (
+        "CREATE TABLE IF NOT EXISTS cache_journal ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL,"
+        " origin TEXT NOT NULL, created REAL NOT NULL)",
+    )
+
+    def __init__(self, location, retention):
+        self._path = str(location)
+        self._local = threading.local()
+        self.retention = retention
+        self._published = 0
+
+    def last_position(self):
+        row = self._get_connection().execute("SELECT MAX(seq) FROM cache_journal").fetchone()
+        return row[0] or 0
+
+    def publish(self, keys, origin):
+        conn = self._get_connection()
+        now = time.time()
+        with _transaction(conn):
+            conn.executemany(
+                "INSERT INTO cache_journal (key, origin, created) VALUES (?, ?, ?)",
+                [(key, origin, now) for key in keys],
+            )
+            self._published += len(keys)
+            if self._published >= 1000:
+                self._published = 0
+                conn.execute("DELETE FROM cache_journal WHERE created < ?", (now - self.retention,))
+
+    def read(self, position):
+        rows = self._get_connection().execute(
+            "SELECT seq, key, origin FROM cache_journal WHERE seq > ? ORDER BY seq", (position,)
+        ).fetchall()
+        if not rows:
+            return position, []
+        return rows[-1][0], [(key, origin) for _, key, origin in rows]
+
+
+class RedisJournal:
+    """Журнал инвалидаций в Redis Stream (позиция — id записи потока)."""
+
+    def __init__(self, location, retention, stream="cache:journal"):
+        import redis
+
+        self._client = redis.Redis.from_url(location)
+        self._stream = stream
+        self.retention = retention
+
+    def last_position(self):
+        entries = self._client.xrevrange(self._stream, count=1)
+        return entries[0][0] if entries else b"0-0"
+
+    def publish(self, keys, origin):
+        min_id = "%d-0" % int((time.time() - self.retention) * 1000)
+        pipe = self._client.pipeline(transaction=False)
+        for key in keys:
+            pipe.xadd(self._stream, {"key": key, "origin": origin}, minid=min_id, approximate=True)
+        pipe.execute()
+
+    def read(self, position):
+        entries = self._client.xread({self._stream: position})
+        if not entries:
+            return position, []
+        items = entries[0][1]
+        return items[-1][0], [
+            (fields[b"key"].decode(), fields[b"origin"].decode()) for _, fields in items
+        ]
+
+
+class _ProcessState:
+    """Общие для всех потоков процесса позиция в журнале и счетчики."""
+
+    def __init__(self, journal):
+        self.lock = threading.Lock()
+        self.origin = uuid.uuid4().hex
+        self.position = journal.last_position()
+        self.last_poll = time.monotonic()
+        self.last_flush = 0
+        # Группа ключей -> hits, misses, sets, set_bytes, deletes, computes, compute_ms,
+        # original_bytes/stored_bytes (компактная сериализация)
+        self.groups = defaultdict(Counter)
+        self.stats = dict.fromkeys(
+            (
+                "l1_hits", "l1_misses", "l2_hits", "l2_misses",
+                "invalidations_sent", "invalidations_received",
+            ),
+            0,
+        )
+
+
+_states = {}
+_states_lock = threading.Lock()
+
+
+class TwoTierCache(BaseCache):
+    """
+    Кэш L1 (память процесса) + L2 (общий для воркеров).
+
+    LOCATION — имя набора (разные имена — независимые L1).
+    OPTIONS:
+        L2: настройки общего уровня в формате CACHES (BACKEND, LOCATION, OPTIONS...)
+        JOURNAL_LOCATION: путь к SQLite или redis:// URL журнала
+            (по умолчанию — файл L2, если L2 — SQLiteCache)
+        L1_TIMEOUT: максимальное время жизни записи в L1, сек (300)
+        L1_MAX_ENTRIES: размер L1 (1000)
+        POLL_INTERVAL: период чтения журнала, сек (0.5)
+        JOURNAL_RETENTION: сколько хранить записи журнала, сек (3600)
+        STATS_FLUSH_INTERVAL: период сохранения счетчиков процесса в L2, сек (10)
+    """
+
+    def __init__(self, location, params):
+        options = dict(params.get("OPTIONS", {}))
+        l2_params = dict(options.pop("L2"))
+        journal_location = options.pop("JOURNAL_LOCATION", None)
+        self.l1_timeout = options.pop("L1_TIMEOUT", 300)
+        l1_max_entries = options.pop("L1_MAX_ENTRIES", 1000)
+        self.poll_interval = options.pop("POLL_INTERVAL", 0.5)
+        retention = options.pop("JOURNAL_RETENTION", 3600)
+        self.stats_flush_interval = options.pop("STATS_FLUSH_INTERVAL", 10)
+        super().__init__({**params, "OPTIONS": options})
+
+        self.name = location or "default"
+        self.l1 = LocMemCache(
+            "two-tier:%s" % self.name,
+            {"KEY_FUNCTION": _raw_key, "OPTIONS": {"MAX_ENTRIES": l1_max_entries}},
+        )
+        l2_backend = import_string(l2_params.pop("BACKEND"))
+        self.l2 = l2_backend(
+            l2_params.pop("LOCATION", ""), {**l2_params, "KEY_FUNCTION": _raw_key}
+        )
+
+        if journal_location is None:
+            if not isinstance(self.l2, SQLiteCache):
+                raise ValueError("TwoTierCache: для L2 %s нужен JOURNAL_LOCATION" % l2_backend)
+            journal_location = self.l2._path
+        if str(journal_location).startswith(("redis://", "rediss://", "unix://")):
+            self.journal = RedisJournal(journal_location, retention)
+        else:
+            self.journal = SQLiteJournal(journal_location, retention)
+
+    @property
+    def _state(self):
+        # Состояние привязано к pid: воркеры после fork получают свое
+        state_key = (self.name, os.getpid())
+        state = _states.get(state_key)
+        if state is None:
+            with _states_lock:
+                state = _states.get(state_key)
+                if state is None:
+                    state = _states[state_key] = _ProcessState(self.journal)
+        return state
+
+    def _poll(self):
+        """Применяет к L1 инвалидации других процессов из журнала."""
+        state = self._state
+        if time.monotonic() - state.last_poll < self.poll_interval:
+            return
+        with state.lock:
+            if time.monotonic() - state.last_poll < self.poll_interval:
+                return
+            state.position, entries = self.journal.read(state.position)
+            state.last_poll = time.monotonic()
+            if state.last_poll - state.last_flush >= self.stats_flush_interval:
+                state.last_flush = state.last_poll
+                self.l2.set(self._stats_key(), self._snapshot(state), 24 * 60 * 60)
+            for key, origin in entries:
+                if origin == state.origin:
+                    continue
+                state.stats["invalidations_received"] += 1
+                if key == CLEAR_ALL:
+                    self.l1.clear()
+                else:
+                    self.l1.delete(key)
+
+    def _publish(self, *keys):
+        state = self._state
+        self.journal.publish(keys, state.origin)
+        with state.lock:
+            state.stats["invalidations_sent"] += len(keys)
+
+    def _count(self, name, key=None, group_field=None, amount=1):
+        state = self._state
+        with state.lock:
+            if name:
+                state.stats[name] += 1
+            if group_field:
+                state.groups[key_group(self._user_key(key))][group_field] += amount
+
+    @staticmethod
+    def _user_key(key):
+        """Ключ без префикса и версии (":1:latest_news" -> "latest_news")."""
+        parts = key.split(":", 2)
+        return parts[2] if len(parts) == 3 and parts[1].isdigit() else key
+
+    def _l1_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return self.l1_timeout if timeout is None else min(timeout, self.l1_timeout)
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._poll()
+        value = self.l1.get(key, _MISSING)
+        if value is not _MISSING:
+            self._count("l1_hits", key, "hits")
+            return value
+        self._count("l1_misses")
+        value = self.l2.get(key, _MISSING)
+        if value is _MISSING:
+            self._count("l2_misses", key, "misses")
+            return default
+        self._count("l2_hits", key, "hits")
+        self.l1.set(key, value, self.l1_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self.l2.set(key, value, self._timeout(timeout))
+        self.l1.set(key, value, self._l1_timeout(timeout))
+        self._publish(key)
+        self._count_set(key)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        if not self.l2.add(key, value, self._timeout(timeout)):
+            return False
+        self.l1.set(key, value, self._l1_timeout(timeout))
+        self._publish(key)
+        self._count_set(key)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        if not self.l2.touch(key, self._timeout(timeout)):
+            return False
+        self.l1.touch(key, self._l1_timeout(timeout))
+        return True
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self.l1.delete(key)
+        deleted = self.l2.delete(key)
+        self._publish(key)
+        self._count(None, key, "deletes")
+        return deleted
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._poll()
+        return self.l1.has_key(key) or self.l2.has_key(key)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = self.l2.incr(key, delta)
+        self.l1.delete(key)
+        self._publish(key)
+        return value
+
+    def clear(self):
+        self.l1.clear()
+        self.l2.clear()
+        self._publish(CLEAR_ALL)
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
+
+    def get_stats(self):
+        """
+        Счетчики попаданий/промахов по уровням для текущего процесса.
+
+        Returns:
+            dict: l1_hits, l1_misses, l2_hits, l2_misses,
+                  invalidations_sent, invalidations_received
+        """
+        state = self._state
+        with state.lock:
+            return dict(state.stats)
+
+    # --- Статистика и содержимое для инспектора кэша ---
+
+    def _count_set(self, key):
+        # Размер — по pickle, который LocMemCache уже сохранил в L1 (тот же протокол,
+        # что и в L2); значение не сериализуется третий раз ради статистики
+        data = self.l1._cache.get(key)
+        state = self._state
+        with state.lock:
+            group = state.groups[key_group(self._user_key(key))]
+            group["sets"] += 1
+            if isinstance(data, bytes):
+                group["set_bytes"] += len(data)
+
+    def record_compute(self, key, seconds, version=None):
+        """Учитывает время вычисления значения ключа (main/single_flight.py)."""
+        key = self.make_and_validate_key(key, version=version)
+        self._count(None, key, "computes")
+        self._count(None, key, "compute_ms", int(seconds * 1000))
+
+    def record_serialization(self, key, original, stored, version=None):
+        """Учитывает размер значения до и после компактной сериализации (main/cache_serialization.py)."""
+        key = self.make_and_validate_key(key, version=version)
+        self._count(None, key, "original_bytes", original)
+        self._count(None, key, "stored_bytes", stored)
+
+    def _stats_key(self):
+        return "%s%s:%d" % (STATS_KEY_PREFIX, self.name, os.getpid())
+
+    def _snapshot(self, state):
+        return {
+            "pid": os.getpid(),
+            "updated": time.time(),
+            "levels": dict(state.stats),
+            "groups": {group: dict(counter) for group, counter in state.groups.items()},
+        }
+
+    def get_group_stats(self):
+        """Счетчики по группам ключей для текущего процесса."""
+        state = self._state
+        with state.lock:
+            return {group: dict(counter) for group, counter in state.groups.items()}
+
+    def collect_stats(self):
+        """
+        Счетчики всех процессов (сохраненные в L2 за последние сутки),
+        для текущего — актуальные.
+
+        Returns:
+            list: словари pid, updated, levels, groups
+        """
+        state = self._state
+        with state.lock:
+            own = self._snapshot(state)
+        snapshots = {own["pid"]: own}
+        prefix = "%s%s:" % (STATS_KEY_PREFIX, self.name)
+        for raw_key, _, _ in self._l2_entries(prefix):
+            snapshot = self.l2.get(raw_key)
+            if snapshot and snapshot["pid"] not in snapshots:
+                snapshots[snapshot["pid"]] = snapshot
+        return sorted(snapshots.values(), key=lambda snapshot: snapshot["pid"])
+
+    def reset_stats(self):
+        """Обнуляет счетчики текущего процесса и удаляет сохраненные счетчики остальных."""
+        state = self._state
+        with state.lock:
+            state.groups.clear()
+            for name in state.stats:
+                state.stats[name] = 0
+        self._l2_delete_raw(
+            [key for key, _, _ in self._l2_entries("%s%s:" % (STATS_KEY_PREFIX, self.name))]
+        )
+
+    def _l2_entries(self, prefix=""):
+        if isinstance(self.l2, SQLiteCache):
+            return self.l2.entries(prefix)
+        if hasattr(self.l2, "_cache"):
+            # RedisCache: SCAN по шаблону и размеры значений одним pipeline
+            client = self.l2._cache.get_client(write=False)
+            keys = list(client.scan_iter(match=prefix + "*", count=1000))
+            pipe = client.pipeline(transaction=False)
+            for key in keys:
+                pipe.strlen(key)
+                pipe.pttl(key)
+            sizes = pipe.execute()
+            return [
+                (
+                    key.decode(),
+                    sizes[2 * i],
+                    time.time() + sizes[2 * i + 1] / 1000 if sizes[2 * i + 1] > 0 else None,
+                )
+                for i, key in enumerate(keys)
+            ]
+        raise NotImplementedError("Просмотр содержимого L2 %s не поддерживается" % type(self.l2))
+
+    def _l2_delete_raw(self, keys):
+        if not keys:
+            return
+        if isinstance(self.l2, SQLiteCache):
+            self.l2.delete_many_raw(keys)
+        else:
+            self.l2.delete_many(keys)
+
+    def entries(self):
+        """
+        Содержимое L2 без служебных счетчиков.
+
+        Returns:
+            list: (ключ без префикса и версии, группа, размер в байтах, истечение)
+        """
+        result = []
+        for raw_key, size, expires in self._l2_entries():
+            if raw_key.startswith(STATS_KEY_PREFIX):
+                continue
+            key = self._user_key(raw_key)
+            result.append((key, key_group(key), size, expires))
+        return result
+
+    def delete_group(self, group):
+        """Удаляет из L2 и всех L1 ключи группы; возвращает их число."""
+        raw_keys = [
+            raw_key
+            for raw_key, _, _ in self._l2_entries()
+            if not raw_key.startswith(STATS_KEY_PREFIX)
+            and key_group(self._user_key(raw_key)) == group
+        ]
+        if raw_keys:
+            self._l2_delete_raw(raw_keys)
+            for raw_key in raw_keys:
+                self.l1.delete(raw_key)
+            self._publish(*raw_keys)
+        return len(raw_keys)
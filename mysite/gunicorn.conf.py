@@ -0,0 +1,32 @@
+"""
+Хуки gunicorn: gunicorn mysite.wsgi -c mysite/gunicorn.conf.py [--bind ... --workers ...]
+
+С переменной окружения CACHE_WARMUP_ON_START=True после запуска
+мастер-процесса в фоне выполняется прогрев кэшей (python manage.py
+warm_cache, main/cache_warmup.py), чтобы первые посетители после деплоя
+не ждали холодных страниц. По умолчанию выключен.
+
+Прогрев идет отдельным процессом, поэтому заполняет только общий L2
+(кэш страниц, фрагменты, latest_news, OG-изображения). L1 в памяти
+воркеров, загрузчики шаблонов и lru_cache каждого воркера остаются
+холодными и заполняются на первых запросах к нему.
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def when_ready(server):
+    # Настройки Django в мастер-процессе не загружаются — прогрев идет отдельной командой
+    if os.environ.get("CACHE_WARMUP_ON_START", "False").lower() not in ("1", "true", "yes", "on"):
+        return
+    server.log.info("Запуск прогрева кэшей (manage.py warm_cache)")
+    subprocess.Popen(
+        [sys.executable, str(BASE_DIR / "manage.py"), "warm_cache"],
+        cwd=BASE_DIR,
+        stdout=subprocess.DEVNULL,
+    )
@@ -122,7 +122,9 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     # Основные middleware
     "django.middleware.security.SecurityMiddleware",  # Безопасность
-    "django.middleware.gzip.GZipMiddleware",  # Сжатие ответов (Ускорение)
+    "main.middleware.RequestCacheMiddleware",  # Кэш уровня запроса
+    "main.middleware.CompressionMiddleware",  # Сжатие ответов brotli/gzip (Ускорение)
+    "main.middleware.EarlyHintsMiddleware",  # Link: preload и 103 Early Hints для статики
     "django.contrib.sessions.middleware.SessionMiddleware",  # Сессии
     "django.middleware.common.CommonMiddleware",  # Общие настройки
     "django.middleware.csrf.CsrfViewMiddleware",  # CSRF
@@ -130,6 +132,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",  # Сообщения
     "django.middleware.clickjacking.XFrameOptionsMiddleware",  # Защита от кликджекинга
     "allauth.account.middleware.AccountMiddleware",  # Allauth
+    "main.middleware.AnonymousPageCacheMiddleware",  # Кэш страниц для анонимов
 ]
 # Подключаем WhiteNoise, если он установлен (обслуживание статики)
 HAS_WHITENOISE = importlib.util.find_spec("whitenoise") is not None
@@ -153,15 +156,26 @@ TEMPLATES = [
                     (
                         "django.template.loaders.cached.Loader",
                         [
-                            "django.template.loaders.filesystem.Loader",
-                            "django.template.loaders.app_directories.Loader",
+                            (
+                                # Минификация HTML при компиляции шаблона (main/html_minify.py)
+                                "main.html_minify.MinifyingLoader",
+                                [
+                                    "django.template.loaders.filesystem.Loader",
+                                    "django.template.loaders.app_directories.Loader",
+                                ],
+                            ),
                         ],
                     ),
                 ]
                 if not DEBUG
                 else [
-                    "django.template.loaders.filesystem.Loader",
-                    "django.template.loaders.app_directories.Loader",
+                    (
+                        "main.html_minify.MinifyingLoader",
+                        [
+                            "django.template.loaders.filesystem.Loader",
+                            "django.template.loaders.app_directories.Loader",
+                        ],
+                    ),
                 ]
             ),
             "context_processors": [
@@ -219,8 +233,8 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")  # Путь к медиа‑фай
 
 # Хранилища (по умолчанию и для staticfiles)
 STORAGES = {
-    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
-    # Хранилище по умолчанию
+    "default": {"BACKEND": "main.media_storage.ContentAddressedStorage"},
+    # Хранилище по умолчанию: загрузки по хешу содержимого без копий (main/media_storage.py)
     "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
     # Хранилище для статических файлов
 }
@@ -237,6 +251,40 @@ WHITENOISE_MANIFEST_STRICT = False
 WHITENOISE_MAX_AGE = 31536000 if not DEBUG else 0
 WHITENOISE_KEEP_ONLY_HASHED_FILES = True
 
+# Отдача media/ и static/ (main/media_serving.py): "django" — FileResponse
+# через sendfile с поддержкой Range, "x-accel" — X-Accel-Redirect (nginx),
+# "x-sendfile" — X-Sendfile (Apache, lighttpd)
+MEDIA_SERVING_MODE = env.str("MEDIA_SERVING_MODE", default="django")
+MEDIA_ACCEL_REDIRECT_PREFIX = "/protected/media/"  # internal location nginx для MEDIA_ROOT
+STATIC_ACCEL_REDIRECT_PREFIX = "/protected/static/"  # internal location nginx для STATIC_ROOT
+MEDIA_CACHE_MAX_AGE = 3600  # max-age файлов без метки времени в имени, сек
+
+# Адаптивные изображения (main/responsive_images.py): производные WebP/AVIF
+# загруженных изображений строит задача Celery, тег {% responsive_image %}
+RESPONSIVE_IMAGES_ENABLED = True
+RESPONSIVE_IMAGE_WIDTHS = (320, 640, 960, 1280, 1920)  # Ширины производных, px
+RESPONSIVE_IMAGE_FORMATS = ("avif", "webp")  # AVIF — если Pillow собран с libavif
+RESPONSIVE_IMAGE_QUALITY = {"avif": 60, "webp": 80}
+RESPONSIVE_IMAGE_PENDING_TIMEOUT = 60  # Повторная проверка производных, пока задача не выполнена, сек
+# FileField с растровыми изображениями (кроме ImageField, они учитываются все)
+RESPONSIVE_IMAGE_EXTRA_FIELDS = ("services.Service.icon", "services.ServiceCategory.icon")
+
+# Миниатюры по подписанным URL /media/thumb/... (main/thumbnails.py)
+THUMBNAIL_ROOT = BASE_DIR / "cache" / "thumbnails"
+THUMBNAIL_MAX_SIZE = 2000  # Максимальная ширина и высота, px
+THUMBNAIL_QUALITY = 80  # Качество WebP
+THUMBNAIL_CACHE_MAX_BYTES = env.int("THUMBNAIL_CACHE_MAX_BYTES", default=512 * 1024 * 1024)
+THUMBNAIL_PRUNE_INTERVAL = 300  # Проверка размера кэша не чаще, сек
+THUMBNAIL_ACCEL_REDIRECT_PREFIX = "/protected/thumbnails/"  # internal location nginx для THUMBNAIL_ROOT
+
+# Изображения Open Graph (main/og_utils.py): рисуются заранее после
+# сохранения объекта и лежат в MEDIA_ROOT/og/
+OG_IMAGES_ENABLED = True
+OG_IMAGE_MODELS = ("news.News", "portfolio.Portfolio", "services.Service", "main.Page", "knowledge_base.Article")
+OG_IMAGE_FORMATS = ("png", "webp")  # Первый формат выводится в og:image
+OG_IMAGE_THEME = "dark"
+OG_IMAGE_FONT = env.str("OG_IMAGE_FONT", default="")  # Путь к TTF с кириллицей; по умолчанию Inter-Bold из статики или DejaVu Sans
+
 # ------------------------------------------------------------
 # Пользовательская модель и Allauth
 # ------------------------------------------------------------
@@ -346,6 +394,12 @@ JAZZMIN_SETTINGS = {
                 "icon": "fas fa-chart-line",
                 "new_window": False,
             },
+            {
+                "name": "Кэш",
+                "url": "/admin/dashboard/cache/",
+                "icon": "fas fa-database",
+                "new_window": False,
+            },
         ]
     },
     "icons": {
@@ -520,6 +574,13 @@ LOGGING = {
             "()": "django.utils.log.CallbackFilter",
             "callback": lambda record: "Broken pipe" not in record.getMessage(),
         },
+        # 404 по неизвестным slug учитываются сводкой main/slug_registry.py
+        "skip_slug_registry_misses": {
+            "()": "django.utils.log.CallbackFilter",
+            "callback": lambda record: not getattr(
+                getattr(record, "request", None), "slug_registry_miss", False
+            ),
+        },
     },
     "formatters": {
         "verbose": {"format": "{levelname} {asctime} {module} {message}", "style": "{"},
@@ -547,6 +608,12 @@ LOGGING = {
             "propagate": False,
         },
         "django.server": {"handlers": ["console"], "level": "INFO", "propagate": False},
+        "django.request": {
+            "handlers": ["console", "file"],
+            "level": "INFO",
+            "filters": ["skip_slug_registry_misses"],
+            "propagate": False,
+        },
         "news": {
             "handlers": ["console", "file"],
             "level": "DEBUG" if DEBUG else "INFO",
@@ -558,12 +625,133 @@ LOGGING = {
 # ------------------------------------------------------------
 # Кеширование
 # ------------------------------------------------------------
+# Двухуровневый кэш (mysite/cache_backends.py): L1 в памяти воркера +
+# общий L2 в SQLite-файле; изменения рассылаются всем воркерам через журнал.
+# Если задан REDIS_CACHE_URL, L2 и журнал хранятся в Redis.
+CACHE_DIR = BASE_DIR / "cache"
+REDIS_CACHE_URL = env.str("REDIS_CACHE_URL", default="")
+
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "BACKEND": "mysite.cache_backends.TwoTierCache",
+        "LOCATION": "default",
+        "TIMEOUT": 300,
+        "OPTIONS": {
+            "L1_TIMEOUT": 300,  # Максимальный срок жизни записи в памяти воркера
+            "POLL_INTERVAL": 0.5,  # Период чтения журнала инвалидаций, сек
+            "L2": (
+                {
+                    "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                    "LOCATION": REDIS_CACHE_URL,
+                }
+                if REDIS_CACHE_URL
+                else {
+                    "BACKEND": "mysite.cache_backends.SQLiteCache",
+                    "LOCATION": env.str(
+                        "CACHE_SQLITE_PATH", default=str(CACHE_DIR / "default.sqlite3")
+                    ),
+                    "OPTIONS": {"MAX_ENTRIES": 5000},
+                }
+            ),
+            **({"JOURNAL_LOCATION": REDIS_CACHE_URL} if REDIS_CACHE_URL else {}),
+        },
     }
 }
 
+# Кэш полных страниц для анонимных посетителей (main/page_cache.py)
+PAGE_CACHE_ENABLED = env.bool("PAGE_CACHE_ENABLED", default=True)
+PAGE_CACHE_TIMEOUT = 600  # Максимальный срок жизни страницы, сек
+# Имена URL, страницы которых кэшируются ("namespace:*" — все URL приложения).
+# Поиск не кэшируется: у него неограниченное число вариантов query string.
+PAGE_CACHE_VIEWS = [
+    "main:home",
+    "news:list",
+    "news:by_category",
+    "news:by_date",
+    "news:detail",
+    "portfolio:*",
+    "services:list",
+    "services:category",
+    "services:detail",
+    "knowledge_base:*",
+]
+# Сжатие ответов (main/compression.py): общие страницы из кэша сжимаются один раз
+# на максимальном уровне (brotli — если установлен пакет brotli), персональные
+# ответы — дешевым gzip
+COMPRESSION_SHARED_BROTLI_QUALITY = 11
+COMPRESSION_SHARED_GZIP_LEVEL = 9
+COMPRESSION_DYNAMIC_GZIP_LEVEL = 4
+# Минификация HTML: шаблоны при компиляции и страницы перед записью в кэш
+# (main/html_minify.py); шаблоны админки не изменяются
+HTML_MINIFY_ENABLED = True
+HTML_MINIFY_EXCLUDE = ("admin/", "jazzmin/")
+# Предзагрузка css/js базовых шаблонов: Link: rel=preload и 103 Early Hints
+# (main/preload.py)
+PRELOAD_ENABLED = True
+PRELOAD_TEMPLATES = ["base.html"]
+# Контекстные процессоры для персональных частей страницы ({% page_hole %})
+PAGE_CACHE_HOLE_CONTEXT_PROCESSORS = ["cart.context_processors.cart"]
+# Контекстные процессоры блока результатов списков для HTMX (main/htmx.py):
+# обвязка сайта не рендерится, поэтому по умолчанию не нужен ни один
+HTMX_PARTIAL_CONTEXT_PROCESSORS = []
+# Отложенные фрагменты (main/deferred.py): боковые блоки и связанные новости
+# загружаются отдельным запросом после основного контента
+DEFERRED_FRAGMENTS_ENABLED = True
+DEFERRED_FRAGMENT_TIMEOUT = 3600  # Срок жизни HTML фрагмента в кэше, сек
+DEFERRED_FRAGMENT_MAX_AGE = 60  # Cache-Control: max-age ответа фрагмента, сек
+
+# Потоковый рендер тяжелых страниц (main/streaming.py): <head> и шапка
+# уходят сразу, тело — частями по мере рендера
+STREAMING_RESPONSES_ENABLED = True
+STREAMING_CHUNK_SIZE = 16 * 1024  # Символов HTML в одной части потока
+
+# Приложения, при изменении моделей которых меняются версии тегов кэша
+# (инвалидация по зависимостям, см. main/cache_tags.py)
+CACHE_TAG_APPS = [
+    "main",
+    "news",
+    "portfolio",
+    "reviews",
+    "logfiles",
+    "accounts",
+    "tickets",
+    "mail",
+    "services",
+    "cart",
+    "favorites",
+    "knowledge_base",
+]
+
+# Компактные значения кэша (main/cache_serialization.py): сжимать zlib
+# упакованные значения больше этого размера (байты)
+CACHE_COMPRESS_THRESHOLD = 1024
+
+# Объединение одновременных пересчетов значений кэша (main/single_flight.py):
+# срок межпроцессной блокировки и сколько ждать чужого вычисления (секунды)
+SINGLE_FLIGHT_LOCK_TIMEOUT = 30
+SINGLE_FLIGHT_WAIT_TIMEOUT = 5
+
+# Реестр известных slug (main/slug_registry.py): период сводки в логе
+# о запросах несуществующих новостей, работ, услуг, страниц и статей (секунды)
+SLUG_MISS_LOG_INTERVAL = 60
+
+# Статический экспорт публичных страниц (main/static_export.py,
+# команда export_static_site). Хост и схема — как у публичного сайта,
+# хост должен входить в ALLOWED_HOSTS
+STATIC_EXPORT_ROOT = BASE_DIR / "static_export"
+STATIC_EXPORT_HOST = env.str("STATIC_EXPORT_HOST", default=domains[0])
+STATIC_EXPORT_HTTPS = env.bool("STATIC_EXPORT_HTTPS", default=False)
+# Число процессов полной пересборки (None — по числу CPU)
+STATIC_EXPORT_WORKERS = None
+# Обновлять экспорт после изменения контента (Celery) и через сколько секунд
+STATIC_EXPORT_ENABLED = env.bool("STATIC_EXPORT_ENABLED", default=False)
+STATIC_EXPORT_DELAY = 60
+
+# Прогрев кэшей после деплоя (main/cache_warmup.py, команда warm_cache): число потоков.
+# Автозапуск после старта gunicorn — mysite/gunicorn.conf.py (env CACHE_WARMUP_ON_START=True,
+# по умолчанию выключен; прогревает только общий L2, не L1 воркеров)
+CACHE_WARMUP_WORKERS = 4
+
 # ------------------------------------------------------------
 # Создание директории для логов (если её нет)
 # ------------------------------------------------------------
@@ -605,6 +793,7 @@ CELERY_TIMEZONE = TIME_ZONE
 # Autodiscover задачи в backup_tasks и других модулях
 CELERY_IMPORTS = [
     "mysite.backup_tasks",
+    "main.tasks",
 ]
 
 # Расписание Celery Beat (периодические задачи)
@@ -639,6 +828,12 @@ BACKUP_MAX_MEDIA_COUNT = 7  # Хранить последние 7 архивов
 # ------------------------------------------------------------
 CART_SESSION_ID = "cart"
 
+# ------------------------------------------------------------
+# Отчет об использовании ключей контекстных процессоров
+# (/admin/dashboard/context-usage/, см. main/lazy_context.py)
+# ------------------------------------------------------------
+CONTEXT_USAGE_TRACKING = env.bool("CONTEXT_USAGE_TRACKING", default=DEBUG)
+
 # ------------------------------------------------------------
 # Настройки TinyMCE
 # ------------------------------------------------------------
@@ -27,48 +27,33 @@ from django.conf.urls.static import static
 # Статические файлы
 from django.http import HttpResponse 
 # HTTP-ответы
-from django.views.static import serve 
-# Сервер статических файлов
+from main.media_serving import serve_file 
+# Отдача медиа и статики (main/media_serving.py)
+from main.thumbnails import serve_thumbnail 
+# Миниатюры по подписанным URL (main/thumbnails.py)
 from django.views.generic import RedirectView 
 # Перенаправление
 from main import views as main_views 
 # Главная страница
-from main.sitemaps import (
-    PageSitemap, 
-    # Карта сайта
-    NewsSitemap, 
-    # Новости
-    NewsCategorySitemap, 
-    # Категории новостей
-    PortfolioSitemap, 
-    # Портфолио
-    PortfolioCategorySitemap, 
-    # Категории портфолио
-    StaticViewSitemap, 
-    # Статические страницы
-)
+from main.sitemaps import SITEMAPS 
+# Карты сайта (страницы, новости, портфолио, услуги, база знаний и их категории)
 
-sitemaps = {
-    "pages": PageSitemap, 
-    # Карта сайта
-    "news": NewsSitemap, 
-    # Новости
-    "news_categories": NewsCategorySitemap, 
-    # Категории новостей
-    "portfolio": PortfolioSitemap, 
-    # Портфолио
-    "portfolio_categories": PortfolioCategorySitemap, 
-    # Категории портфолио
-    "static": StaticViewSitemap, 
-    # Статические страницы
-}
+sitemaps = SITEMAPS
 urlpatterns = [
-    path('media/<path:path>', serve, {'document_root': settings.MEDIA_ROOT}), 
-    # Медиа файлы
-    path('static/<path:path>', serve, {'document_root': settings.STATIC_ROOT}), 
+    path('media/thumb/<str:signature>/<int:width>x<int:height>/<path:path>', serve_thumbnail, name='thumbnail'), 
+    # Миниатюры (генерация один раз, дальше с диска)
+    path('media/<path:path>', serve_file, {'document_root': settings.MEDIA_ROOT, 'accel_prefix': settings.MEDIA_ACCEL_REDIRECT_PREFIX}), 
+    # Медиа файлы (X-Accel-Redirect / X-Sendfile или sendfile с Range)
+    path('static/<path:path>', serve_file, {'document_root': settings.STATIC_ROOT, 'accel_prefix': settings.STATIC_ACCEL_REDIRECT_PREFIX}), 
     # Статические файлы
     path("admin/dashboard/", main_views.admin_dashboard, name="admin_dashboard"), 
     # Админ-панель
+    path("admin/dashboard/context-usage/", main_views.context_usage_report, name="context_usage_report"), 
+    # Отчет об использовании ключей контекста
+    path("admin/dashboard/single-flight/", main_views.single_flight_report, name="single_flight_report"), 
+    # Счетчики объединения пересчетов кэша
+    path("admin/dashboard/cache/", main_views.cache_inspector, name="cache_inspector"), 
+    # Инспектор кэша: статистика групп ключей и очистка
     path('favicon.ico', RedirectView.as_view(url=settings.STATIC_URL + 'images/favicon.ico')), 
     # Фавикон
     path(
@@ -1,17 +1,23 @@
 from django.db.models import Count, Q
+
+from main.lazy_context import lazy_context
+
 from .models import News, NewsCategory
+from .views import get_latest_news
 
 
 def latest_news(request):
     """
     Контекстный процессор для добавления последних новостей на все страницы.
     Использует news_date для правильной сортировки по дате события.
+    Запросы выполняются только при обращении шаблона к ключу.
     """
-    return {
-        "latest_news": News.objects.filter(is_active=True)
-            .select_related("category")
-            .order_by("-news_date", "-created_at")[:3],
-        "news_categories": NewsCategory.objects.filter(is_active=True).annotate(
-            news_count=Count("news", filter=Q(news__is_active=True))
-        ).order_by("order", "name")[:10],
-    }
+    return lazy_context(
+        request,
+        latest_news=get_latest_news,
+        news_categories=lambda: list(
+            NewsCategory.objects.filter(is_active=True).annotate(
+                news_count=Count("news", filter=Q(news__is_active=True))
+            ).order_by("order", "name")[:10]
+        ),
+    )
@@ -8,9 +8,7 @@ register = template.Library()
 @register.filter
 def sum_news_count(categories):
     """Суммирует количество новостей во всех категориях"""
-    if not categories:
-        return 0
-    return categories.aggregate(total=Sum("news_count"))["total"] or 0
+    return sum(category.news_count for category in categories or ())
 
 
 @register.simple_tag(takes_context=True)
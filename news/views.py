@@ -6,25 +6,73 @@ from django.http import Http404
 from .models import News, NewsCategory, DailyEvent
 from collections import OrderedDict
 
+from main.cache_serialization import Projection, get_or_set_projected
+from main.conditional import conditional_view
+from main.htmx import render_list
+from main.slug_registry import known_slug_required, note_missing
+from main.streaming import render_streaming
+from main.view_counters import views_counted
+
 logger = logging.getLogger(__name__)
 
 
+# Поля последних новостей, которые читает боковая колонка (в кэше — только они)
+LATEST_NEWS_PROJECTION = Projection(
+    News,
+    ["title", "slug", "news_date"],
+    related={"category": Projection(NewsCategory, ["name", "slug"])},
+    annotations=["events_count"],
+)
+LATEST_NEWS_DEPENDENCIES = [News, NewsCategory, DailyEvent]
+
+
 def get_latest_news():
-    """Функция для получения последних 3 активных новостей"""
-    from django.core.cache import cache
-    
-    cache_key = "latest_news"
-    latest_news = cache.get(cache_key)
-    
-    if latest_news is None:
-        latest_news = list(
-            News.objects.filter(is_active=True)
-            .select_related("category")
-            .order_by("-news_date", "-created_at")[:3]
+    """Функция для получения последних 3 активных новостей (кэш до изменения новостей)"""
+    from main.request_cache import memoize
+
+    return memoize(
+        "latest_news",
+        lambda: get_or_set_projected(
+            "latest_news",
+            lambda: (
+                News.objects.filter(is_active=True)
+                .select_related("category")
+                .annotate(events_count=Count("events"))
+                .order_by("-news_date", "-created_at")[:3]
+            ),
+            LATEST_NEWS_PROJECTION,
+            depends_on=LATEST_NEWS_DEPENDENCIES,
+            timeout=3600,
+            stale_ttl=600,
+        ),
+        depends_on=LATEST_NEWS_DEPENDENCIES,
+    )
+
+
+def get_related_news(slug):
+    """Связанные новости (того же дня или той же категории) — отложенный фрагмент related_news."""
+    news = get_object_or_404(
+        News.objects.only("pk", "news_date", "category_id"), slug=slug, is_active=True
+    )
+    return list(
+        News.objects.filter(is_active=True)
+        .filter(Q(news_date=news.news_date) | Q(category_id=news.category_id))
+        .exclude(pk=news.pk)
+        .select_related("category")
+        .order_by("-news_date")[:4]
+    )
+
+
+def get_news_categories(**params):
+    """
+    Категории с числом активных новостей — отложенный фрагмент news_categories
+    (параметр current нужен только шаблону).
+    """
+    return list(
+        NewsCategory.objects.filter(is_active=True).annotate(
+            news_count=Count("news", filter=Q(news__is_active=True))
         )
-        cache.set(cache_key, latest_news, 300)  # Кеш на 5 минут
-    
-    return latest_news
+    )
 
 
 def _group_news_by_date(news_page):
@@ -68,20 +116,24 @@ SORT_LABELS = {
 }
 
 
+def _active_news_unless_sorted_by_views(request, *args, **kwargs):
+    """Объекты списка для условного GET (сортировка по просмотрам меняется без updated_at)."""
+    if request.GET.get("sort", "").startswith("views"):
+        return None
+    return News.objects.filter(is_active=True)
+
+
+@conditional_view(_active_news_unless_sorted_by_views, depends_on=["news.DailyEvent"])
 def news_list(request):
     """
     Отображает список всех активных новостей с пагинацией и фильтрами.
     """
     order_field, current_sort = _get_sort_param(request)
     
-    categories = NewsCategory.objects.filter(is_active=True).annotate(
-        news_count=Count("news", filter=Q(news__is_active=True))
-    )
-    
     category_slug = request.GET.get("category")
     selected_category = None
     if category_slug:
-        selected_category = categories.filter(slug=category_slug).first()
+        selected_category = NewsCategory.objects.filter(is_active=True, slug=category_slug).first()
 
     news_queryset = (
         News.objects.filter(is_active=True)
@@ -122,16 +174,15 @@ def news_list(request):
 
     grouped_news = _group_news_by_date(news_list)
 
-    return render(
+    return render_list(
         request,
         "news/list.html",
+        "news/includes/_results.html",
         {
             "news_list": news_list,
             "grouped_news": grouped_news,
-            "categories": categories,
             "selected_category": selected_category,
             "current_category": selected_category,
-            "latest_news": get_latest_news(),
             "current_sort": current_sort,
             "selected_sort_label": selected_sort_label,
             "search_query": search_query,
@@ -147,10 +198,6 @@ def news_by_category(request, category_slug):
     """
     category = get_object_or_404(NewsCategory, slug=category_slug, is_active=True)
     order_field, current_sort = _get_sort_param(request)
-    
-    categories = NewsCategory.objects.filter(is_active=True).annotate(
-        news_count=Count("news", filter=Q(news__is_active=True))
-    )
 
     news_queryset = (
         News.objects.filter(category=category, is_active=True)
@@ -187,16 +234,15 @@ def news_by_category(request, category_slug):
 
     grouped_news = _group_news_by_date(news_list)
 
-    return render(
+    return render_list(
         request,
         "news/list.html",
+        "news/includes/_results.html",
         {
             "news_list": news_list,
             "grouped_news": grouped_news,
-            "categories": categories,
             "selected_category": category,
             "current_category": category,
-            "latest_news": get_latest_news(),
             "current_sort": current_sort,
             "selected_sort_label": selected_sort_label,
             "search_query": search_query,
@@ -229,10 +275,6 @@ def news_by_date(request, year, month, day):
         .order_by(order_field, "-created_at")
     )
 
-    categories = NewsCategory.objects.filter(is_active=True).annotate(
-        news_count=Count("news", filter=Q(news__is_active=True))
-    )
-
     search_query = request.GET.get("q", "").strip()
     if search_query:
         news_queryset = news_queryset.filter(
@@ -257,15 +299,14 @@ def news_by_date(request, year, month, day):
 
     grouped_news = _group_news_by_date(news_list)
 
-    return render(
+    return render_list(
         request,
         "news/list.html",
+        "news/includes/_results.html",
         {
             "news_list": news_list,
             "grouped_news": grouped_news,
-            "categories": categories,
             "target_date": target_date,
-            "latest_news": get_latest_news(),
             "current_sort": current_sort,
             "selected_sort_label": selected_sort_label,
             "search_query": search_query,
@@ -283,13 +324,9 @@ def news_search(request):
     order_field, current_sort = _get_sort_param(request)
     
     category_slug = request.GET.get("category")
-    categories = NewsCategory.objects.filter(is_active=True).annotate(
-        news_count=Count("news", filter=Q(news__is_active=True))
-    )
-    
     selected_category = None
     if category_slug:
-        selected_category = categories.filter(slug=category_slug).first()
+        selected_category = NewsCategory.objects.filter(is_active=True, slug=category_slug).first()
 
     news_queryset = News.objects.filter(is_active=True)
     
@@ -330,17 +367,16 @@ def news_search(request):
     
     grouped_news = _group_news_by_date(news_list)
     
-    return render(
+    return render_list(
         request,
         "news/list.html",
+        "news/includes/_results.html",
         {
             "news_list": news_list,
             "grouped_news": grouped_news,
-            "categories": categories,
             "selected_category": selected_category,
             "current_category": selected_category,
             "search_query": query,
-            "latest_news": get_latest_news(),
             "current_sort": current_sort,
             "selected_sort_label": selected_sort_label,
             "has_active_filters": has_active_filters,
@@ -349,6 +385,11 @@ def news_search(request):
     )
 
 
+@known_slug_required(News)
+@conditional_view(
+    lambda request, slug: News.objects.filter(slug=slug, is_active=True),
+    depends_on=["news.Comment", "news.DailyEvent"],
+)
 def news_detail(request, slug):
     """
     Отображает детальную страницу конкретной новости.
@@ -361,10 +402,7 @@ def news_detail(request, slug):
         news = (
             News.objects
             .select_related("category")
-            .prefetch_related(
-                Prefetch("events", queryset=DailyEvent.objects.order_by("order", "-created_at")),
-                "comments",
-            )
+            .prefetch_related("comments")
             .annotate(
                 total_comments=Count("comments"), 
                 avg_rating=Avg("comments__rating"),
@@ -373,11 +411,13 @@ def news_detail(request, slug):
             .get(slug=slug, is_active=True)
         )
     except News.DoesNotExist:
-        logger.warning(f"Попытка доступа к несуществующей новости: {slug}")
+        # Неактивная новость: в сводку промахов, а не строкой лога на каждый запрос
+        note_missing(News, slug)
         raise Http404("Новость не найдена")
 
     # Увеличиваем счетчик просмотров
-    news.increment_views()
+    if views_counted():
+        news.increment_views()
 
     # Обработка отправки комментария
     if request.method == "POST":
@@ -392,28 +432,20 @@ def news_detail(request, slug):
     else:
         form = CommentForm()
 
-    # Получаем события дня
-    events = news.events.all()
+    # События дня выбираются при рендере: в потоковом ответе шапка страницы
+    # уходит клиенту раньше, чем загрузятся сотни событий
+    events = news.events.order_by("order", "-created_at")
     comments = news.comments.all().order_by("-created_at")
     
-    # Получаем связанные новости (того же дня или той же категории)
-    related_news = (
-        News.objects.filter(is_active=True)
-        .filter(Q(news_date=news.news_date) | Q(category=news.category))
-        .exclude(pk=news.pk)
-        .select_related("category")
-        .order_by("-news_date")[:4]
-    )
-
+    # Связанные новости загружаются отдельным запросом (фрагмент related_news)
     context = {
         "news": news,
         "events": events,
         "events_count": news.events_count,
-        "related_news": related_news,
         "comments": comments,
         "comment_form": form,
         "total_comments": news.total_comments,
         "avg_rating": round(news.avg_rating, 1) if news.avg_rating is not None else 0,
     }
-    return render(request, "news/detail.html", context)
+    return render_streaming(request, "news/detail.html", context)
 
@@ -1,10 +1,8 @@
-from .models import Portfolio
+from main.lazy_context import lazy_context
+
+from .views import get_latest_portfolio
 
 
 def latest_portfolio(request):
-    """Контекстный процессор для добавления последних на все страницы"""
-    return {
-        "latest_portfolio": Portfolio.objects.filter(is_active=True).order_by(
-            "-created_at"
-        )[:3]
-    }
+    """Контекстный процессор для добавления последних работ на все страницы (лениво, с кэшем)"""
+    return lazy_context(request, latest_portfolio=get_latest_portfolio)
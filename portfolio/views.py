@@ -1,19 +1,49 @@
 from django.shortcuts import render, get_object_or_404
 from django.db.models import Count
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+
+from main.cache_serialization import Projection, get_or_set_projected
+from main.conditional import conditional_view
+from main.htmx import render_list
+from main.request_cache import memoize
+from main.slug_registry import known_slug_required
+from main.view_counters import views_counted
+
 from .models import Portfolio, PortfolioCategory
 
 
 
+# Поля последних работ, которые читают главная (main/includes/latest_portfolio.html)
+# и боковая колонка (в кэше — только они; остальные догружались бы запросом на каждую работу)
+LATEST_PORTFOLIO_PROJECTION = Projection(
+    Portfolio,
+    ["title", "slug", "image", "meta_description", "created_at"],
+    related={"category": Projection(PortfolioCategory, ["name", "slug"])},
+)
+
+
 def get_latest_portfolio():
-    """Возвращает последние 3 активные работы для отображения в блоках 'Последние работы'"""
-    return (
+    """
+    Возвращает последние 3 активные работы для блоков 'Последние работы'
+    (кэш до изменения работ; в запросе — один раз для представления и контекстного процессора)
+    """
+    queryset = (
         Portfolio.objects.filter(is_active=True)
         .select_related("category")
         .order_by("-created_at")[:3]
     )
+    # Зависимости берутся из queryset: Portfolio и PortfolioCategory
+    return memoize(
+        "latest_portfolio",
+        lambda: get_or_set_projected(
+            "latest_portfolio", lambda: queryset, LATEST_PORTFOLIO_PROJECTION,
+            depends_on=[queryset], timeout=3600,
+        ),
+        depends_on=[queryset],
+    )
 
 
+@conditional_view(lambda request: Portfolio.objects.filter(is_active=True))
 def portfolio_list(request):
     """
     Отображает полный список работ портфолио с поддержкой пагинации.
@@ -38,13 +68,13 @@ def portfolio_list(request):
     except EmptyPage:
         portfolio_list = paginator.page(paginator.num_pages)
 
-    return render(
+    return render_list(
         request,
         "portfolio/list.html",
+        "portfolio/includes/_results.html",
         {
             "portfolio_list": portfolio_list,
             "categories": categories,
-            "latest_portfolio": get_latest_portfolio(),
         },
     )
 
@@ -75,25 +105,28 @@ def portfolio_by_category(request, category_slug):
     except EmptyPage:
         portfolio_list = paginator.page(paginator.num_pages)
 
-    return render(
+    return render_list(
         request,
         "portfolio/list.html",
+        "portfolio/includes/_results.html",
         {
             "portfolio_list": portfolio_list,
             "categories": categories,
             "current_category": category,
-            "latest_portfolio": get_latest_portfolio(),
         },
     )
 
 
+@known_slug_required(Portfolio)
+@conditional_view(lambda request, slug: Portfolio.objects.filter(slug=slug, is_active=True))
 def portfolio_detail(request, slug):
     """
     Отображает детальную страницу конкретной работы портфолио.
     Включает похожие работы из той же категории.
     """
     portfolio = get_object_or_404(Portfolio, slug=slug, is_active=True)
-    portfolio.increment_views()
+    if views_counted():
+        portfolio.increment_views()
 
     categories = PortfolioCategory.objects.filter(is_active=True).annotate(
         portfolio_count=Count("portfolio")
@@ -1,8 +1,8 @@
-from .models import Review
+from main.lazy_context import lazy_context
+
+from .views import get_latest_reviews
 
 
 def latest_reviews(request):
-    """Контекстный процессор для добавления последних отзывов на все страницы"""
-    return {
-        "latest_reviews": Review.objects.filter(status="approved").order_by("-created_at")[:3]
-    }
+    """Контекстный процессор для добавления последних отзывов на все страницы (лениво, с кэшем)"""
+    return lazy_context(request, latest_reviews=get_latest_reviews)
@@ -1,13 +1,37 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from main.cache_serialization import Projection, get_or_set_projected
+from main.request_cache import memoize
+from main.streaming import render_streaming
+
 from .models import Review
 from .forms import ReviewForm
 
 
+# Поля последних отзывов для главной и боковой колонки (без телефона и email)
+LATEST_REVIEWS_PROJECTION = Projection(Review, ["full_name", "content", "created_at"])
+
+
+def get_latest_reviews():
+    """Последние 3 одобренных отзыва (кэш до изменения отзывов, в запросе — один раз)"""
+    return memoize(
+        "latest_reviews",
+        lambda: get_or_set_projected(
+            "latest_reviews",
+            lambda: Review.objects.filter(status="approved").order_by("-created_at")[:3],
+            LATEST_REVIEWS_PROJECTION,
+            depends_on=[Review],
+            timeout=3600,
+        ),
+        depends_on=[Review],
+    )
+
+
 def reviews_list(request):
     """Отображает список всех одобренных отзывов"""
     reviews = Review.objects.filter(status="approved").order_by("-created_at")
-    return render(request, "reviews/list.html", {"reviews": reviews})
+    # Список без пагинации: потоковый ответ, шапка уходит до выборки отзывов
+    return render_streaming(request, "reviews/list.html", {"reviews": reviews})
 
 
 def create_review(request):
@@ -5,6 +5,8 @@ from django import forms
 from django.db import models
 import csv
 
+from main.thumbnails import thumbnail_url
+
 from .models import (
     Service,
     ServiceOrder,
@@ -416,7 +418,7 @@ class ServiceAdmin(admin.ModelAdmin):
         if obj.icon:
             return format_html(
                 '<img src="{}" style="height: 28px; width: 28px; object-fit: contain; border-radius: 6px; background: rgba(255,255,255,0.05); border: 1px solid rgba(255,255,255,0.1); padding: 2px;" />',
-                obj.icon.url,
+                thumbnail_url(obj.icon, 56),
             )
         return format_html(
             '<span style="color: var(--text-muted); font-size: 14px;">—</span>'
@@ -2,7 +2,12 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView, View
 from django.contrib import messages
 from django.db.models import Q, F, Count
+from django.utils.decorators import method_decorator
 
+from main.conditional import conditional_view
+from main.htmx import HtmxListMixin
+from main.slug_registry import known_slug_required
+from main.view_counters import views_counted
 
 from .models import Service, ServiceCategory, Technology
 
@@ -34,17 +39,9 @@ def _build_service_detail_context(service, form=None, user=None, initial_plan_id
 
     form.fields['selected_plan'].queryset = available_plans
 
-    related_services = Service.objects.none()
-    if service.category:
-        related_services = Service.objects.filter(
-            is_active=True,
-            category=service.category
-        ).exclude(pk=service.pk).order_by('?')[:4]
-
     return {
         'service': service,
         'form': form,
-        'related_services': related_services,
         'related_portfolio': service.related_portfolio.filter(is_active=True),
         'benefits': service.benefits.all().order_by('order'),
         'steps': service.steps.all().order_by('step_number', 'order'),
@@ -54,7 +51,38 @@ def _build_service_detail_context(service, form=None, user=None, initial_plan_id
     }
 
 
-class ServiceListView(ListView):
+# Связанные модели, которые выводятся на лендинге услуги
+SERVICE_DETAIL_DEPENDENCIES = (
+    "services.ServiceCategory",
+    "services.Technology",
+    "services.ServiceBenefit",
+    "services.ServiceStep",
+    "services.ServiceFAQ",
+    "services.ServicePricePlan",
+    "services.PricePlanFeature",
+    "services.Deliverable",
+)
+
+
+def _service_list_lookup(request, *args, **kwargs):
+    """Объекты списка для условного GET (сортировка по просмотрам меняется без updated_at)."""
+    if request.GET.get("sort") == "views_desc":
+        return None
+    return Service.objects.filter(is_active=True)
+
+
+def _service_detail_lookup(request, slug):
+    queryset = Service.objects.filter(slug=slug)
+    if not request.user.is_staff:
+        queryset = queryset.filter(is_active=True)
+    return queryset
+
+
+@method_decorator(
+    conditional_view(_service_list_lookup, depends_on=["services.ServiceCategory", "services.Technology"]),
+    name="get",
+)
+class ServiceListView(HtmxListMixin, ListView):
     """
     Отображает список всех доступных услуг с возможностью фильтрации
     по категории, сложности, ключевым словам и используемым технологиям.
@@ -62,6 +90,7 @@ class ServiceListView(ListView):
     """
     model = Service
     template_name = 'services/list.html'
+    partial_template_name = 'services/includes/_results.html'
     context_object_name = 'services'
     paginate_by = 12
     
@@ -195,6 +224,11 @@ class ServiceListView(ListView):
 
 
 
+# Неизвестный slug отклоняется до проверки валидаторов (без запросов к БД)
+@method_decorator(known_slug_required(Service), name="get")
+@method_decorator(
+    conditional_view(_service_detail_lookup, depends_on=SERVICE_DETAIL_DEPENDENCIES), name="get"
+)
 class ServiceDetailView(DetailView):
     """
     Отображает развернутую информацию об услуге, 
@@ -227,8 +261,9 @@ class ServiceDetailView(DetailView):
         self.object = self.get_object()
         
         # Используем F() для атомарного обновления счетчика минуя состояние гонки
-        Service.objects.filter(pk=self.object.pk).update(views=F('views') + 1)
-        self.object.refresh_from_db(fields=['views'])
+        if views_counted():
+            Service.objects.filter(pk=self.object.pk).update(views=F('views') + 1)
+            self.object.refresh_from_db(fields=['views'])
         
         context = self.get_context_data(object=self.object)
         return self.render_to_response(context)
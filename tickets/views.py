@@ -2,6 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
+from main.streaming import render_streaming
 from .models import Ticket, TicketStatus, TicketMessage
 from .forms import TicketForm, TicketMessageForm
 
@@ -89,8 +90,8 @@ def ticket_detail(request, ticket_id):
         "form": form, # Форма для нового сообщения
     }
 
-    # Рендеринг шаблона с деталями тикета
-    return render(request, "tickets/detail.html", context)
+    # Потоковый рендер: длинная переписка отдается частями
+    return render_streaming(request, "tickets/detail.html", context)
 
 
 # Закрытие тикета